@@ -2,17 +2,21 @@
 AI-powered rainfall data analyzer
 """
 import logging
-from typing import Dict, Any, Optional, List
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 from config.models import models_manager, ModelProvider
 from .deepseek import DeepSeekClient
+from .prompt_data import compact_summary
 
 
 class RainfallAnalyzer:
     """AI-powered rainfall data analyzer with modular model support"""
 
-    def __init__(self, model_name: str = "deepseek-chat"):
+    def __init__(self, model_name: str = "deepseek-chat", use_cache: bool = True, data_versions: Any = None,
+                 on_delta: Optional[Callable[[str], Awaitable[None]]] = None):
         self.model_name = model_name
         self.model_config = models_manager.get_model(model_name)
+        # 传给每次AI请求：是否使用响应缓存、提示所依据的数据文件版本，以及流式输出的回调
+        self.request_options = {'use_cache': use_cache, 'cache_context': data_versions, 'on_delta': on_delta}
         self.logger = logging.getLogger(__name__)
 
         if not self.model_config:
@@ -39,9 +43,9 @@ class RainfallAnalyzer:
 
             # 获取AI分析结果
             if question:
-                analysis = await self.client.answer_question(data_summary, question)
+                analysis = await self.client.answer_question(data_summary, question, **self.request_options)
             else:
-                analysis = await self.client.analyze_rainfall_data(data_summary)
+                analysis = await self.client.analyze_rainfall_data(data_summary, **self.request_options)
 
             if analysis:
                 return {
@@ -72,7 +76,7 @@ class RainfallAnalyzer:
                     "error": "AI client not initialized"
                 }
 
-            summary = await self.client.generate_summary(data_summary)
+            summary = await self.client.generate_summary(data_summary, **self.request_options)
 
             if summary:
                 return {
@@ -114,13 +118,15 @@ class RainfallAnalyzer:
                     "error": "AI client not initialized"
                 }
 
+            # 两个时期平分数据摘要的token预算
+            budget = self.model_config.prompt_token_budget // 2
             comparison_prompt = f"""请比较以下两个时期的降雨量数据：
 
 {period1_name}数据：
-{data1}
+{compact_summary(data1, budget)}
 
 {period2_name}数据：
-{data2}
+{compact_summary(data2, budget)}
 
 请提供详细的比较分析，包括：
 1. 降雨量变化
@@ -132,7 +138,7 @@ class RainfallAnalyzer:
             analysis = await self.client.chat_completion([
                 {"role": "system", "content": "你是专业的气象数据分析师，请提供准确的数据比较分析。"},
                 {"role": "user", "content": comparison_prompt}
-            ])
+            ], **self.request_options)
 
             if analysis:
                 return {
@@ -166,7 +172,7 @@ class RainfallAnalyzer:
 
             trend_prompt = f"""基于以下降雨量历史数据，请分析趋势并做出预测：
 
-{data_summary}
+{compact_summary(data_summary, self.model_config.prompt_token_budget)}
 
 请提供：
 1. 历史趋势分析
@@ -181,7 +187,7 @@ class RainfallAnalyzer:
             prediction = await self.client.chat_completion([
                 {"role": "system", "content": "你是专业的气象预测分析师，请基于数据提供科学的趋势分析和预测。"},
                 {"role": "user", "content": trend_prompt}
-            ])
+            ], **self.request_options)
 
             if prediction:
                 return {
@@ -203,6 +209,58 @@ class RainfallAnalyzer:
                 "error": str(e)
             }
 
+    async def synthesize_analyses(self, station_analyses: Dict[str, str], overview: Dict[str, Any],
+                                  question: str, failed_stations: List[str] = None) -> Dict[str, Any]:
+        """Combine separate per-station analyses into one overall analysis"""
+        try:
+            if not self.client:
+                return {
+                    "success": False,
+                    "error": "AI client not initialized"
+                }
+
+            sections = "\n\n".join(f"【{station}】\n{analysis}" for station, analysis in station_analyses.items())
+            missing = ""
+            if failed_stations:
+                missing = f"\n\n以下站点分析失败，未包含在内：{'、'.join(failed_stations)}"
+
+            synthesis_prompt = f"""以下是各降雨监测站点的单独分析结果，请在此基础上回答问题：
+
+问题：{question}
+
+整体数据概况：
+{compact_summary(overview, self.model_config.prompt_token_budget)}
+
+各站点分析：
+{sections}{missing}
+
+请综合各站点的结论，给出整体分析，重点说明站点之间的共性和差异。"""
+
+            analysis = await self.client.chat_completion([
+                {"role": "system", "content": "你是专业的气象数据分析专家，请综合多个站点的分析结果给出准确的整体结论。"},
+                {"role": "user", "content": synthesis_prompt}
+            ], **self.request_options)
+
+            if analysis:
+                return {
+                    "success": True,
+                    "analysis": analysis,
+                    "model_used": self.model_name,
+                    "stations": list(station_analyses)
+                }
+            else:
+                return {
+                    "success": False,
+                    "error": "Failed to synthesize station analyses"
+                }
+
+        except Exception as e:
+            self.logger.error(f"Error synthesizing analyses: {e}")
+            return {
+                "success": False,
+                "error": str(e)
+            }
+
     async def close(self):
         """Close AI client connections"""
         if self.client:
@@ -215,9 +273,14 @@ class RainfallAnalyzer:
         await self.close()
 
 
-def get_analyzer(model_name: str = None) -> RainfallAnalyzer:
-    """Factory function to get analyzer instance"""
+def get_analyzer(model_name: str = None, use_cache: bool = True, data_versions: Any = None,
+                 on_delta: Optional[Callable[[str], Awaitable[None]]] = None) -> RainfallAnalyzer:
+    """Factory function to get analyzer instance
+
+    With ``on_delta`` every AI request streams its answer and the callback
+    receives the text as it is generated.
+    """
     if model_name is None:
         model_name = "deepseek-chat"
 
-    return RainfallAnalyzer(model_name)
\ No newline at end of file
+    return RainfallAnalyzer(model_name, use_cache=use_cache, data_versions=data_versions, on_delta=on_delta)
\ No newline at end of file
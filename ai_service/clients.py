@@ -0,0 +1,106 @@
+"""
+Shared pooled HTTP clients for AI model APIs
+"""
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, Tuple
+
+import httpx
+
+from config.models import ModelConfig
+from config.settings import settings
+
+try:
+    import h2  # noqa: F401  httpx的HTTP/2支持依赖h2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class HTTPClientRegistry:
+    """Process-wide registry of keep-alive ``httpx.AsyncClient`` instances
+
+    One client is kept per model endpoint (base URL, API key, timeout) and
+    event loop, so every analyzer talking to the same API reuses the same
+    connection pool instead of paying TCP and TLS setup per call. HTTP/2 is
+    used when enabled and the optional ``h2`` package is installed.
+    Clients live until ``aclose`` is awaited on their event loop at
+    shutdown.
+    """
+
+    def __init__(self, max_connections: int = 20, max_keepalive_connections: int = 10,
+                 keepalive_expiry: float = 60.0, http2: bool = True):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.http2 = http2 and HTTP2_AVAILABLE
+        # (事件循环, 接口标识) -> 客户端；连接池绑定创建它的事件循环
+        self._clients: Dict[Tuple[asyncio.AbstractEventLoop, Tuple], httpx.AsyncClient] = {}
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+        if http2 and not HTTP2_AVAILABLE:
+            self.logger.info("h2 package not installed, AI clients use HTTP/1.1 keep-alive")
+
+    @staticmethod
+    def _endpoint(config: ModelConfig) -> Tuple:
+        return config.provider, config.base_url, config.api_key, config.timeout
+
+    def get(self, config: ModelConfig) -> httpx.AsyncClient:
+        """Get the shared client for a model's endpoint on the running event loop"""
+        loop = asyncio.get_running_loop()
+        key = (loop, self._endpoint(config))
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None and not client.is_closed:
+                return client
+
+            # 丢弃已关闭事件循环上的客户端
+            for stale in [k for k in self._clients if k[0].is_closed()]:
+                del self._clients[stale]
+
+            client = httpx.AsyncClient(
+                base_url=config.base_url,
+                timeout=config.timeout,
+                limits=self.limits,
+                http2=self.http2,
+                headers={
+                    "Authorization": f"Bearer {config.api_key}",
+                    "Content-Type": "application/json"
+                }
+            )
+            self._clients[key] = client
+            self.logger.info(f"Created pooled AI client for {config.base_url} ({'HTTP/2' if self.http2 else 'HTTP/1.1'})")
+            return client
+
+    async def aclose(self):
+        """Close the clients of the running event loop (call on shutdown)"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            keys = [k for k in self._clients if k[0] is loop]
+            clients = [self._clients.pop(k) for k in keys]
+        for client in clients:
+            try:
+                await client.aclose()
+            except Exception as e:
+                self.logger.warning(f"Error closing AI client: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the number of open pooled clients"""
+        with self._lock:
+            return {
+                'clients': sum(1 for client in self._clients.values() if not client.is_closed),
+                'max_connections': self.limits.max_connections,
+                'http2': self.http2
+            }
+
+
+# 全局AI客户端注册表，所有分析器共享连接池
+client_registry = HTTPClientRegistry(
+    max_connections=settings.ai_service_config['max_connections'],
+    max_keepalive_connections=settings.ai_service_config['max_keepalive_connections'],
+    keepalive_expiry=settings.ai_service_config['keepalive_expiry'],
+    http2=settings.ai_service_config['http2']
+)
@@ -4,50 +4,127 @@ DeepSeek API client for rainfall data analysis
 import httpx
 import json
 import asyncio
-from typing import Dict, Any, Optional, List
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
 import logging
 from config.models import ModelConfig, ModelProvider
+from .clients import client_registry
+from .prompt_data import compact_summary
+from .response_cache import AIResponseCache, response_cache as shared_response_cache
+from .scheduler import request_scheduler
 
 
 class DeepSeekClient:
     """DeepSeek API client"""
 
-    def __init__(self, config: ModelConfig):
+    def __init__(self, config: ModelConfig, response_cache: Optional[AIResponseCache] = None,
+                 http_client: Optional[httpx.AsyncClient] = None):
         self.config = config
+        self.response_cache = response_cache if response_cache is not None else shared_response_cache
+        # 显式传入的客户端由本实例关闭；默认使用注册表中共享的连接池
+        self._http_client = http_client
         self.logger = logging.getLogger(__name__)
 
         if config.provider != ModelProvider.DEEPSEEK:
             raise ValueError("This client only supports DeepSeek models")
 
-        self.client = httpx.AsyncClient(
-            base_url=config.base_url,
-            timeout=config.timeout,
-            headers={
-                "Authorization": f"Bearer {config.api_key}",
-                "Content-Type": "application/json"
-            }
-        )
-
-    async def chat_completion(self, messages: List[Dict[str, str]], **kwargs) -> Optional[str]:
-        """Send chat completion request to DeepSeek API"""
-        try:
-            payload = {
-                "model": self.config.model_name,
-                "messages": messages,
-                "temperature": kwargs.get("temperature", self.config.temperature),
-                "max_tokens": kwargs.get("max_tokens", self.config.max_tokens),
-                "stream": False
-            }
-
-            self.logger.debug(f"Sending request to DeepSeek API: {payload}")
-
-            response = await self.client.post("/chat/completions", json=payload)
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._http_client is not None:
+            return self._http_client
+        return client_registry.get(self.config)
+
+    def _build_payload(self, messages: List[Dict[str, str]], stream: bool = False, **kwargs) -> Dict[str, Any]:
+        return {
+            "model": self.config.model_name,
+            "messages": messages,
+            "temperature": kwargs.get("temperature", self.config.temperature),
+            "max_tokens": kwargs.get("max_tokens", self.config.max_tokens),
+            "stream": stream
+        }
+
+    async def stream_chat_completion(self, messages: List[Dict[str, str]], **kwargs) -> AsyncIterator[str]:
+        """Stream a chat completion, yielding text deltas as the API sends them
+
+        Reads the server-sent events of a ``"stream": true`` request. HTTP
+        and connection errors are raised to the caller.
+        """
+        payload = self._build_payload(messages, stream=True, **kwargs)
+        self.logger.debug(f"Sending streaming request to DeepSeek API: {payload}")
+
+        async with self.client.stream("POST", "/chat/completions", json=payload) as response:
+            if response.status_code >= 400:
+                # 读取错误响应体，便于记录错误信息
+                await response.aread()
             response.raise_for_status()
 
-            data = response.json()
-            content = data["choices"][0]["message"]["content"]
+            async for line in response.aiter_lines():
+                # 空行分隔事件，冒号开头的是保活注释
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                choices = json.loads(data).get("choices") or [{}]
+                delta = (choices[0].get("delta") or {}).get("content")
+                if delta:
+                    yield delta
+
+    async def chat_completion(self, messages: List[Dict[str, str]], use_cache: bool = True,
+                              cache_context: Any = None,
+                              on_delta: Optional[Callable[[str], Awaitable[None]]] = None,
+                              **kwargs) -> Optional[str]:
+        """Send chat completion request to DeepSeek API
+
+        Identical requests (same model, parameters, messages and
+        ``cache_context``, e.g. data file versions) are answered from the
+        response cache; pass ``use_cache=False`` to always call the API.
+        API calls go through the shared request scheduler, which limits
+        concurrency, retries transient errors and lets overlapping
+        identical requests share one call. With ``on_delta`` the
+        completion is streamed and the callback is awaited with each piece
+        of text as it arrives (a cached response arrives as one piece);
+        the full text is still returned. Streams are retried only until
+        the first piece arrives and are never shared.
+        """
+        try:
+            payload = self._build_payload(messages, **kwargs)
+            request_key = self.response_cache.make_key(
+                payload["model"], messages, payload["temperature"], payload["max_tokens"], cache_context
+            )
+
+            use_cache = use_cache and self.response_cache.enabled
+            if use_cache:
+                # 磁盘读取放到线程中，避免阻塞事件循环
+                cached = await asyncio.to_thread(self.response_cache.get, request_key)
+                if cached is not None:
+                    self.logger.info("Using cached DeepSeek response")
+                    if on_delta is not None:
+                        await on_delta(cached)
+                    return cached
+
+            if on_delta is not None:
+                parts = []
+
+                async def fetch_stream() -> str:
+                    async for delta in self.stream_chat_completion(messages, **kwargs):
+                        parts.append(delta)
+                        await on_delta(delta)
+                    return "".join(parts)
+
+                # 已推送给调用方的文本无法撤回，之后出错不再重试
+                content = await request_scheduler.run(self.config, fetch_stream, can_retry=lambda: not parts)
+            else:
+                async def fetch() -> str:
+                    self.logger.debug(f"Sending request to DeepSeek API: {payload}")
+                    response = await self.client.post("/chat/completions", json=payload)
+                    response.raise_for_status()
+                    return response.json()["choices"][0]["message"]["content"]
+
+                content = await request_scheduler.run(self.config, fetch, key=request_key)
 
             self.logger.info("Successfully received response from DeepSeek API")
+            if use_cache and content:
+                await asyncio.to_thread(self.response_cache.put, request_key, content, payload["model"])
             return content
 
         except httpx.RequestError as e:
@@ -63,7 +140,7 @@ class DeepSeekClient:
             self.logger.error(f"Unexpected error: {e}")
             return None
 
-    async def analyze_rainfall_data(self, data_summary: Dict[str, Any], question: str = None) -> Optional[str]:
+    async def analyze_rainfall_data(self, data_summary: Dict[str, Any], question: str = None, **kwargs) -> Optional[str]:
         """Analyze rainfall data using AI"""
         try:
             # 构建系统提示
@@ -78,8 +155,8 @@ class DeepSeekClient:
 
 请用中文回答，保持专业性和准确性。如果数据不足以支持某些分析，请明确说明。"""
 
-            # 构建用户消息
-            data_str = json.dumps(data_summary, ensure_ascii=False, indent=2)
+            # 构建用户消息，数据摘要按token预算压缩
+            data_str = compact_summary(data_summary, self.config.prompt_token_budget)
 
             if question:
                 user_message = f"""请分析以下降雨量数据并回答问题：
@@ -102,17 +179,17 @@ class DeepSeekClient:
                 {"role": "user", "content": user_message}
             ]
 
-            return await self.chat_completion(messages)
+            return await self.chat_completion(messages, **kwargs)
 
         except Exception as e:
             self.logger.error(f"Error analyzing rainfall data: {e}")
             return None
 
-    async def answer_question(self, data_summary: Dict[str, Any], question: str) -> Optional[str]:
+    async def answer_question(self, data_summary: Dict[str, Any], question: str, **kwargs) -> Optional[str]:
         """Answer specific questions about rainfall data"""
-        return await self.analyze_rainfall_data(data_summary, question)
+        return await self.analyze_rainfall_data(data_summary, question, **kwargs)
 
-    async def generate_summary(self, data_summary: Dict[str, Any]) -> Optional[str]:
+    async def generate_summary(self, data_summary: Dict[str, Any], **kwargs) -> Optional[str]:
         """Generate a summary report of rainfall data"""
         try:
             system_prompt = """你是一个专业的气象数据分析师。请为降雨量数据生成一份简洁但全面的摘要报告。
@@ -126,7 +203,7 @@ class DeepSeekClient:
 
 请使用专业但易懂的语言，用中文回答。"""
 
-            data_str = json.dumps(data_summary, ensure_ascii=False, indent=2)
+            data_str = compact_summary(data_summary, self.config.prompt_token_budget)
 
             user_message = f"""请为以下降雨量数据生成摘要报告：
 
@@ -137,15 +214,16 @@ class DeepSeekClient:
                 {"role": "user", "content": user_message}
             ]
 
-            return await self.chat_completion(messages)
+            return await self.chat_completion(messages, **kwargs)
 
         except Exception as e:
             self.logger.error(f"Error generating summary: {e}")
             return None
 
     async def close(self):
-        """Close the HTTP client"""
-        await self.client.aclose()
+        """Close the HTTP client if owned, the shared pool stays open for other calls"""
+        if self._http_client is not None:
+            await self._http_client.aclose()
 
     async def __aenter__(self):
         return self
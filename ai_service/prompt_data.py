@@ -0,0 +1,229 @@
+"""
+Token-budgeted compaction of data summaries for AI prompts
+"""
+import copy
+import json
+import math
+from typing import Any, Callable, Dict, List
+
+
+# 同一信息的重复表示，提示中只保留一份
+REDUNDANT_KEYS = ('data_overview', 'columns')
+
+# 预算不足时也始终保留的字段
+CORE_KEYS = ('filename', 'total_records', 'total_files', 'date_range', 'basic_statistics', 'rainfall_stats', 'omitted')
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of a prompt fragment
+
+    A conservative heuristic for BPE tokenizers: every non-ASCII
+    character (Chinese text) counts as one token, ASCII text as one
+    token per four characters.
+    """
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return non_ascii + math.ceil((len(text) - non_ascii) / 4)
+
+
+def _round(value: Any) -> Any:
+    """Round floats to the precision that matters for rainfall (mm)"""
+    if isinstance(value, float):
+        if not math.isfinite(value):
+            return None
+        return round(value, 1) if abs(value) >= 100 else round(value, 3)
+    if isinstance(value, dict):
+        return {k: _round(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_round(v) for v in value]
+    return value
+
+
+def _flatten(record: Dict[str, Any], prefix: str = '') -> Dict[str, Any]:
+    flat = {}
+    for key, value in record.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{name}_"))
+        else:
+            flat[name] = value
+    return flat
+
+
+def _table(records: List[Dict[str, Any]], names: List[str] = None) -> Dict[str, Any]:
+    """Encode records as one column header plus value rows"""
+    flat = [_flatten(record) for record in records]
+    columns = []
+    for record in flat:
+        columns.extend(key for key in record if key not in columns)
+    rows = [[record.get(column) for column in columns] for record in flat]
+    if names is not None:
+        columns = ['name'] + columns
+        rows = [[name] + row for name, row in zip(names, rows)]
+    return {'columns': columns, 'rows': rows}
+
+
+def _tabulate(value: Any) -> Any:
+    """Replace repeated record structures with tables"""
+    if isinstance(value, list):
+        if len(value) >= 2 and all(isinstance(v, dict) for v in value):
+            return _table(value)
+        return [_tabulate(v) for v in value]
+    if isinstance(value, dict):
+        if len(value) >= 2 and all(isinstance(v, dict) for v in value.values()):
+            return _table(list(value.values()), list(value.keys()))
+        return {k: _tabulate(v) for k, v in value.items()}
+    return value
+
+
+def encode_summary(data: Dict[str, Any]) -> str:
+    """Serialize a summary as compact JSON with tabular record sets"""
+    return json.dumps(_tabulate(data), ensure_ascii=False, separators=(',', ':'), default=str)
+
+
+def _keep_top_extremes(limit: int) -> Callable[[Dict[str, Any]], bool]:
+    def step(data):
+        events = data.get('extreme_events')
+        if not isinstance(events, list) or len(events) <= limit:
+            return False
+        data['extreme_events'] = events[:limit]
+        data['omitted'].append(f"extreme_events: top {limit} of {len(events)} kept")
+        return True
+    return step
+
+
+def _monthly_totals_only(data) -> bool:
+    monthly = data.get('monthly_analysis')
+    if not isinstance(monthly, dict) or not all(isinstance(v, dict) and 'total' in v for v in monthly.values()):
+        return False
+    data['monthly_analysis'] = {month: stats['total'] for month, stats in monthly.items()}
+    data['omitted'].append("monthly_analysis: totals only")
+    return True
+
+
+def _coarsen_stations(data) -> bool:
+    """Keep only the main per-station figures, rounded to 0.1 mm"""
+    files = data.get('file_summaries')
+    if not isinstance(files, dict) or not all(isinstance(v, dict) for v in files.values()):
+        return False
+
+    coarse = {}
+    for name, summary in files.items():
+        station = {'records': summary.get('records'), 'regions': summary.get('regions')}
+        # 与整体时间范围相同的站点时间范围不再重复
+        if summary.get('date_range') and summary.get('date_range') != data.get('date_range'):
+            station['date_range'] = summary['date_range']
+        rainfall = summary.get('rainfall_summary') or {}
+        for key, digits in (('total', 1), ('mean', 2), ('max', 1)):
+            value = rainfall.get(key)
+            station[key] = round(value, digits) if isinstance(value, float) else value
+        coarse[name] = station
+    if coarse == files:
+        return False
+    data['file_summaries'] = coarse
+    data['omitted'].append("file_summaries: per-station minimum and shared date ranges dropped, values rounded")
+    return True
+
+
+def _station_total(summary: Any) -> float:
+    if not isinstance(summary, dict):
+        return 0
+    if 'total' in summary:
+        return summary['total'] or 0
+    return (summary.get('rainfall_summary') or {}).get('total') or 0
+
+
+def _keep_top_stations(limit: int) -> Callable[[Dict[str, Any]], bool]:
+    def step(data):
+        files = data.get('file_summaries')
+        if not isinstance(files, dict) or len(files) <= limit:
+            return False
+
+        ranked = sorted(files.items(), key=lambda item: _station_total(item[1]), reverse=True)
+        data['file_summaries'] = dict(ranked[:limit])
+        _note_omitted_stations(data, [name for name, _ in ranked[limit:]], f"only the {limit} wettest kept")
+        return True
+    return step
+
+
+def _note_omitted_stations(data: Dict[str, Any], names: List[str], reason: str):
+    """Record omitted stations by name in a single ``omitted`` entry"""
+    # 明确列出被省略的站点，避免模型把部分站点当作全部数据
+    previous = [note for note in data['omitted'] if isinstance(note, dict) and 'stations_omitted' in note]
+    for note in previous:
+        data['omitted'].remove(note)
+        names = note['stations_omitted'] + names
+    data['omitted'].append({'stations_omitted': names, 'count': len(names), 'reason': reason})
+
+
+def _drop(key: str, note: str) -> Callable[[Dict[str, Any]], bool]:
+    def step(data):
+        if key not in data:
+            return False
+        del data[key]
+        data['omitted'].append(note)
+        return True
+    return step
+
+
+# 超出预算时按顺序执行的裁剪步骤：先保留最重要的细节，再逐步改用更粗的时间粒度
+PRUNING_STEPS = [
+    _keep_top_extremes(10),
+    _coarsen_stations,
+    _monthly_totals_only,
+    _keep_top_extremes(5),
+    _drop('regional_analysis', "regional_analysis"),
+    _drop('monthly_analysis', "monthly_analysis (seasonal totals kept)"),
+    _keep_top_extremes(3),
+    _drop('trends', "trends"),
+    # 站点只在粗化后仍超出预算时才整体省略
+    _keep_top_stations(8),
+    _keep_top_stations(5),
+]
+
+
+def compact_summary(summary: Dict[str, Any], token_budget: int) -> str:
+    """Encode a data summary for a prompt within a token budget
+
+    Floats are rounded, duplicated fields dropped and record sets written
+    as tables. While the result is over budget, detail is pruned in order
+    of increasing importance (fewer extreme events, coarser per-station
+    figures and periods, then whole stations) and finally the largest
+    remaining non-core fields are dropped. Pruned parts, including the
+    names of omitted stations, are listed under ``omitted`` so the model
+    knows the data is incomplete.
+    """
+    data = _round(copy.deepcopy(summary))
+    for key in REDUNDANT_KEYS:
+        data.pop(key, None)
+    if 'basic_statistics' in data:
+        # 详细统计已包含基本降雨量统计
+        data.pop('rainfall_stats', None)
+    if isinstance(data.get('extreme_events'), list):
+        # 行号对分析没有意义；按降雨量排序后裁剪时保留最强的事件
+        events = [{k: v for k, v in event.items() if k != 'index'} for event in data['extreme_events']]
+        data['extreme_events'] = sorted(events, key=lambda event: event.get('rainfall') or 0, reverse=True)
+    data['omitted'] = []
+
+    text = encode_summary(data)
+    for step in PRUNING_STEPS:
+        if estimate_tokens(text) <= token_budget:
+            break
+        if step(data):
+            text = encode_summary(data)
+
+    while estimate_tokens(text) > token_budget:
+        optional = [key for key in data if key not in CORE_KEYS]
+        if not optional:
+            break
+        largest = max(optional, key=lambda key: len(encode_summary({key: data[key]})))
+        removed = data.pop(largest)
+        if largest == 'file_summaries' and isinstance(removed, dict):
+            _note_omitted_stations(data, list(removed), "all per-station summaries dropped")
+        else:
+            data['omitted'].append(largest)
+        text = encode_summary(data)
+
+    if not data['omitted']:
+        del data['omitted']
+        text = encode_summary(data)
+    return text
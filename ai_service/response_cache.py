@@ -0,0 +1,262 @@
+"""
+Content-addressed cache of AI chat completion responses
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from config.settings import settings
+
+
+class AIResponseCache:
+    """Two-level (memory + disk) cache of chat completion responses
+
+    A response is stored under the hash of everything that determines
+    it: model, sampling parameters, the full message list and the
+    versions of the data files the prompt was built from. Entries older
+    than ``ttl`` seconds are ignored and deleted on access. The most
+    recent ``max_memory_entries`` responses are also kept in memory; the
+    disk copy (one small JSON file per response) survives restarts.
+
+    The disk tier is bounded by ``max_disk_entries`` and ``max_disk_bytes``
+    with the oldest responses evicted first. The first write scans the
+    cache directory, and every ``sweep_interval`` seconds a sweep deletes
+    expired entries and leftover temporary files.
+    """
+
+    def __init__(self, cache_dir: Optional[Path], ttl: float = 86400.0, max_memory_entries: int = 128,
+                 max_disk_entries: int = 5000, max_disk_bytes: int = 64 * 1024 * 1024,
+                 sweep_interval: float = 3600.0):
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.ttl = ttl
+        self.max_memory_entries = max(0, int(max_memory_entries))
+        self.max_disk_entries = max(0, int(max_disk_entries))
+        self.max_disk_bytes = max(0, int(max_disk_bytes))
+        self.sweep_interval = sweep_interval
+        # 键 -> (写入时间, 响应内容)
+        self._memory: 'OrderedDict[str, tuple]' = OrderedDict()
+        # 磁盘条目索引，按写入时间从旧到新：键 -> (写入时间, 字节数)；首次写入时扫描目录建立
+        self._disk: 'Optional[OrderedDict[str, tuple]]' = None
+        self.disk_bytes = 0
+        self._next_sweep = 0.0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    @staticmethod
+    def make_key(model: str, messages: List[Dict[str, str]], temperature: float,
+                 max_tokens: int, context: Any = None) -> str:
+        """Hash the inputs that determine a completion"""
+        material = json.dumps({
+            'model': model,
+            'temperature': temperature,
+            'max_tokens': max_tokens,
+            'messages': messages,
+            'context': context
+        }, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.blake2b(material.encode('utf-8'), digest_size=20).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        # 按前两位分目录，避免单个目录文件过多
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[str]:
+        """Get a cached response that has not expired"""
+        if not self.enabled:
+            return None
+
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if now - entry[0] <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._memory[key]
+
+        entry = self._read_disk(key, now)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, entry)
+        return entry[1]
+
+    def _read_disk(self, key: str, now: float) -> Optional[tuple]:
+        if self.cache_dir is None:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                record = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Invalid AI cache entry {path.name}: {e}")
+            return None
+
+        if now - record.get('created', 0) > self.ttl:
+            self._delete_files([key])
+            return None
+        return record['created'], record['content']
+
+    def put(self, key: str, content: str, model: str = None):
+        """Store a response in memory and on disk"""
+        if not self.enabled:
+            return
+
+        created = time.time()
+        with self._lock:
+            self._remember(key, (created, content))
+
+        if self.cache_dir is None or self.max_disk_entries == 0:
+            return
+        if created >= self._next_sweep:
+            self.sweep()
+
+        path = self._path(key)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        data = json.dumps({'created': created, 'model': model, 'content': content}, ensure_ascii=False).encode('utf-8')
+        if len(data) > self.max_disk_bytes:
+            return
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            self.logger.warning(f"Failed to write AI cache entry {path.name}: {e}")
+            try:
+                tmp_path.unlink()
+            except OSError:
+                pass
+            return
+
+        with self._lock:
+            self._index_entry(key, created, len(data))
+            evicted = self._over_limit()
+        self._delete_files(evicted)
+
+    def _index_entry(self, key: str, created: float, size: int):
+        if self._disk is None:
+            return
+        previous = self._disk.pop(key, None)
+        if previous is not None:
+            self.disk_bytes -= previous[1]
+        self._disk[key] = (created, size)
+        self.disk_bytes += size
+
+    def _over_limit(self) -> List[str]:
+        """Remove the oldest disk entries beyond the limits from the index"""
+        evicted = []
+        while self._disk and (len(self._disk) > self.max_disk_entries or self.disk_bytes > self.max_disk_bytes):
+            key, (_, size) = self._disk.popitem(last=False)
+            self.disk_bytes -= size
+            evicted.append(key)
+        return evicted
+
+    def _delete_files(self, keys: List[str]):
+        for key in keys:
+            with self._lock:
+                entry = self._disk.pop(key, None) if self._disk is not None else None
+                if entry is not None:
+                    self.disk_bytes -= entry[1]
+            try:
+                self._path(key).unlink()
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                self.logger.warning(f"Failed to delete AI cache entry {key}: {e}")
+
+    def sweep(self) -> int:
+        """Rescan the disk tier, deleting expired entries and enforcing the limits
+
+        Returns the number of entries deleted.
+        """
+        now = time.time()
+        self._next_sweep = now + self.sweep_interval
+        if self.cache_dir is None or not self.cache_dir.exists():
+            with self._lock:
+                self._disk = OrderedDict()
+                self.disk_bytes = 0
+            return 0
+
+        entries = []
+        expired = []
+        for path in self.cache_dir.glob('*/*'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            if path.suffix == '.tmp':
+                # 写入中断留下的临时文件
+                if now - stat.st_mtime > 3600:
+                    expired.append(path)
+            elif path.suffix == '.json':
+                # 文件修改时间即写入时间
+                if now - stat.st_mtime > self.ttl:
+                    expired.append(path)
+                else:
+                    entries.append((stat.st_mtime, path.stem, stat.st_size))
+
+        for path in expired:
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+        with self._lock:
+            self._disk = OrderedDict((key, (created, size)) for created, key, size in sorted(entries))
+            self.disk_bytes = sum(size for _, _, size in entries)
+            evicted = self._over_limit()
+        self._delete_files(evicted)
+
+        removed = len(expired) + len(evicted)
+        if removed:
+            self.logger.info(f"AI response cache sweep removed {removed} files")
+        return removed
+
+    def _remember(self, key: str, entry: tuple):
+        if self.max_memory_entries == 0:
+            return
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get cache counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'memory_entries': len(self._memory),
+                'disk_entries': len(self._disk) if self._disk is not None else None,
+                'disk_bytes': self.disk_bytes if self._disk is not None else None,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else None
+            }
+
+
+# 全局AI响应缓存实例
+response_cache = AIResponseCache(
+    settings.ai_cache_dir,
+    ttl=settings.ai_service_config['response_cache_ttl'],
+    max_memory_entries=settings.ai_service_config['response_cache_entries'],
+    max_disk_entries=settings.ai_service_config['response_cache_disk_entries'],
+    max_disk_bytes=int(settings.ai_service_config['response_cache_max_mb'] * 1024 * 1024)
+)
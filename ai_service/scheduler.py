@@ -0,0 +1,194 @@
+"""
+Scheduling of AI API requests: concurrency limits, retries and coalescing
+"""
+import asyncio
+import email.utils
+import logging
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple, TypeVar
+
+import httpx
+
+from config.models import ModelConfig
+from config.settings import settings
+
+T = TypeVar('T')
+
+# 可重试的HTTP状态码：请求超时、限流和服务端错误
+RETRY_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a ``Retry-After`` header (seconds or HTTP date) into seconds"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when is None:
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def is_retryable(error: Exception) -> bool:
+    """Check whether a failed request is worth retrying"""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in RETRY_STATUS_CODES
+    # 连接失败、超时等传输错误；协议之外的错误（如响应格式）不重试
+    return isinstance(error, httpx.TransportError)
+
+
+class AIRequestScheduler:
+    """Run AI API calls with per-model limits, retries and coalescing
+
+    - At most ``max_concurrency`` requests per model endpoint are sent at
+      once; further calls wait for a free slot instead of tripping the
+      provider's rate limit.
+    - Connection errors, timeouts, 429 and 5xx responses are retried up
+      to the model's ``max_retries`` times with exponential backoff and
+      full jitter. A ``Retry-After`` header overrides the backoff; when
+      it asks for more than ``backoff_max`` seconds the error is raised.
+      The slot is released while waiting.
+    - Calls with the same ``key`` that overlap share one upstream request.
+      The shared request runs as its own task, so a cancelled caller does
+      not cancel it for the others.
+    """
+
+    def __init__(self, max_concurrency: int = 4, backoff_base: float = 0.5, backoff_max: float = 30.0):
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # 信号量和进行中的请求都绑定创建它们的事件循环
+        self._semaphores: Dict[Tuple[asyncio.AbstractEventLoop, Tuple], asyncio.Semaphore] = {}
+        self._inflight: Dict[Tuple[asyncio.AbstractEventLoop, Hashable], asyncio.Task] = {}
+        self._lock = threading.Lock()
+        self.active = 0
+        self.requests = 0
+        self.retries = 0
+        self.coalesced = 0
+        self.failures = 0
+        self.logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def _endpoint(config: ModelConfig) -> Tuple:
+        return config.provider, config.base_url, config.model_name
+
+    def _semaphore(self, loop: asyncio.AbstractEventLoop, config: ModelConfig) -> asyncio.Semaphore:
+        key = (loop, self._endpoint(config))
+        with self._lock:
+            semaphore = self._semaphores.get(key)
+            if semaphore is None:
+                # 丢弃已关闭事件循环上的信号量
+                for stale in [k for k in self._semaphores if k[0].is_closed()]:
+                    del self._semaphores[stale]
+                semaphore = asyncio.Semaphore(self.max_concurrency)
+                self._semaphores[key] = semaphore
+            return semaphore
+
+    def backoff_delay(self, attempt: int, error: Exception) -> Optional[float]:
+        """Get the wait before retry number ``attempt`` (0-based), None to give up"""
+        if isinstance(error, httpx.HTTPStatusError):
+            retry_after = parse_retry_after(error.response.headers.get('Retry-After'))
+            if retry_after is not None:
+                if retry_after > self.backoff_max:
+                    return None
+                # 在服务端要求的等待时间上加少量抖动，避免同时重试
+                return retry_after + random.uniform(0, self.backoff_base)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def run(self, config: ModelConfig, request: Callable[[], Awaitable[T]],
+                  key: Optional[Hashable] = None,
+                  can_retry: Optional[Callable[[], bool]] = None) -> T:
+        """Run ``request`` under the model's limit, retrying transient errors
+
+        ``request`` is called once per attempt. ``key`` identifies
+        requests that may share a result (e.g. the hash of model,
+        parameters and messages); without it the call is never coalesced.
+        ``can_retry`` is checked before each retry, e.g. to stop once a
+        stream has already delivered text. The last error is raised when
+        all attempts fail.
+        """
+        loop = asyncio.get_running_loop()
+        if key is None:
+            return await self._run_with_retries(loop, config, request, can_retry)
+
+        inflight_key = (loop, self._endpoint(config), key)
+        with self._lock:
+            task = self._inflight.get(inflight_key)
+            if task is not None:
+                self.coalesced += 1
+            else:
+                task = loop.create_task(self._run_with_retries(loop, config, request, can_retry))
+                self._inflight[inflight_key] = task
+                task.add_done_callback(lambda done: self._finish(inflight_key, done))
+        return await asyncio.shield(task)
+
+    def _finish(self, inflight_key: Tuple, task: asyncio.Task):
+        with self._lock:
+            if self._inflight.get(inflight_key) is task:
+                del self._inflight[inflight_key]
+        # 所有调用方都已取消时也要取走异常，避免"never retrieved"警告
+        if not task.cancelled():
+            task.exception()
+
+    async def _run_with_retries(self, loop: asyncio.AbstractEventLoop, config: ModelConfig,
+                                request: Callable[[], Awaitable[T]],
+                                can_retry: Optional[Callable[[], bool]]) -> T:
+        semaphore = self._semaphore(loop, config)
+        attempt = 0
+        while True:
+            async with semaphore:
+                with self._lock:
+                    self.active += 1
+                    self.requests += 1
+                try:
+                    return await request()
+                except Exception as e:
+                    error = e
+                finally:
+                    with self._lock:
+                        self.active -= 1
+
+            delay = None
+            if attempt < config.max_retries and is_retryable(error) and (can_retry is None or can_retry()):
+                delay = self.backoff_delay(attempt, error)
+            if delay is None:
+                with self._lock:
+                    self.failures += 1
+                raise error
+
+            attempt += 1
+            with self._lock:
+                self.retries += 1
+            reason = f"HTTP {error.response.status_code}" if isinstance(error, httpx.HTTPStatusError) else type(error).__name__
+            self.logger.warning(f"AI request failed ({reason}), retry {attempt}/{config.max_retries} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get scheduler counters"""
+        with self._lock:
+            return {
+                'max_concurrency': self.max_concurrency,
+                'active': self.active,
+                'inflight': len(self._inflight),
+                'requests': self.requests,
+                'retries': self.retries,
+                'coalesced': self.coalesced,
+                'failures': self.failures
+            }
+
+
+# 全局AI请求调度器，所有分析器共享并发限制
+request_scheduler = AIRequestScheduler(
+    max_concurrency=settings.ai_service_config['max_concurrency'],
+    backoff_base=settings.ai_service_config['retry_backoff_base'],
+    backoff_max=settings.ai_service_config['retry_backoff_max']
+)
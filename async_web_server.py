@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Asyncio-native HTTP/1.1 server for the rainfall web interface
+
+Serves the same /api/* endpoints and static files as web_server.py, but
+runs every request on a single event loop: API handlers await the
+RainfallTools coroutines directly, connections are kept alive between
+requests, and pipelined requests on one connection are answered in order.
+"""
+
+import asyncio
+import json
+import logging
+import sys
+from email.utils import formatdate
+from http import HTTPStatus
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import unquote, urlsplit
+
+# 添加项目路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from config.settings import settings
+from ai_service.clients import client_registry
+from mcp_server.tools import rainfall_tools
+from web_api import web_api
+from web_http import SSE_HEADERS, Response, StaticFiles
+
+
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type'
+}
+
+
+class HTTPRequest:
+    """A parsed HTTP/1.x request"""
+
+    def __init__(self, method: str, target: str, version: str, headers: Dict[str, str], body: bytes = b''):
+        self.method = method
+        self.target = target
+        url = urlsplit(target)
+        self.path = unquote(url.path)
+        self.query = url.query
+        self.version = version
+        self.headers = headers
+        self.body = body
+
+    @property
+    def keep_alive(self) -> bool:
+        connection = self.headers.get('connection', '').lower()
+        if self.version == 'HTTP/1.0':
+            return connection == 'keep-alive'
+        return connection != 'close'
+
+
+class AsyncRainfallWebServer:
+    """HTTP/1.1 server with keep-alive and pipelining on one event loop"""
+
+    def __init__(self, host: str = '', port: int = 8081, static_dir: Path = project_root,
+                 max_connections: int = 256, keepalive_timeout: float = 15.0,
+                 max_body_size: int = 1024 * 1024):
+        self.host = host
+        self.port = port
+        self.static_files = StaticFiles(static_dir)
+        self.max_connections = max_connections
+        self.keepalive_timeout = keepalive_timeout
+        self.max_body_size = max_body_size
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.connections = set()
+        self.logger = logging.getLogger(__name__)
+
+    async def start(self):
+        """开始监听端口"""
+        self.server = await asyncio.start_server(
+            self._handle_connection, self.host or None, self.port, limit=64 * 1024
+        )
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        """停止监听并关闭所有连接"""
+        if self.server is not None:
+            self.server.close()
+        for writer in list(self.connections):
+            writer.close()
+        if self.server is not None:
+            await self.server.wait_closed()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        peer = writer.get_extra_info('peername')
+        client = peer[0] if peer else '-'
+
+        if len(self.connections) >= self.max_connections:
+            writer.write(self._build_response(
+                503, {'Content-Type': 'application/json; charset=utf-8', 'Retry-After': '1'},
+                json.dumps({'error': 'Server busy, please retry later'}).encode('utf-8'), False
+            ))
+            await self._close_writer(writer)
+            self.logger.warning("Connection limit reached, rejected connection with 503")
+            return
+
+        self.connections.add(writer)
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader, writer), self.keepalive_timeout)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except ValueError as e:
+                    # 请求行/头部格式错误、超出大小限制或无法满足的Expect
+                    message = str(e)
+                    status = 413 if 'too large' in message else 417 if 'expectation' in message else 400
+                    writer.write(self._build_response(status, {}, b'', False))
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+
+                stream = None
+                if request.path.startswith('/api/'):
+                    stream = web_api.open_stream(request.method, request.path, request.query, request.body)
+                if stream is not None:
+                    # 流式响应没有长度，发送完毕后关闭连接
+                    await self._send_stream(writer, stream)
+                    self.logger.info(f'{client} - "{request.method} {request.target} {request.version}" 200 (stream)')
+                    break
+
+                status_code, headers, body = await self._route(request)
+                keep_alive = request.keep_alive
+                if request.method == 'HEAD':
+                    headers.setdefault('Content-Length', str(len(body)))
+                    body = b''
+                writer.write(self._build_response(status_code, headers, body, keep_alive))
+                await writer.drain()
+                self.logger.info(f'{client} - "{request.method} {request.target} {request.version}" {status_code} -')
+
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        except Exception as e:
+            self.logger.error(f"Error handling connection: {e}")
+        finally:
+            self.connections.discard(writer)
+            await self._close_writer(writer)
+
+    async def _read_request(self, reader: asyncio.StreamReader,
+                            writer: asyncio.StreamWriter) -> Optional[HTTPRequest]:
+        """Read one request from the stream, None when the client closed the connection
+
+        A client sending ``Expect: 100-continue`` is told to send the body
+        once the headers have been accepted, as BaseHTTPRequestHandler
+        does in threaded mode.
+        """
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+        except asyncio.IncompleteReadError as e:
+            if not e.partial.strip():
+                return None
+            raise
+        except asyncio.LimitOverrunError:
+            raise ValueError('request header too large')
+
+        lines = head.decode('latin-1').split('\r\n')
+        parts = lines[0].split()
+        if len(parts) != 3 or not parts[2].startswith('HTTP/1.'):
+            raise ValueError(f'malformed request line: {lines[0]!r}')
+        method, target, version = parts
+
+        headers = {}
+        for line in lines[1:]:
+            if not line:
+                continue
+            name, sep, value = line.partition(':')
+            if not sep:
+                raise ValueError(f'malformed header: {line!r}')
+            headers[name.strip().lower()] = value.strip()
+
+        body = b''
+        if 'transfer-encoding' in headers:
+            raise ValueError('chunked request bodies are not supported')
+        if 'content-length' in headers:
+            length = int(headers['content-length'])
+            if length < 0:
+                raise ValueError('invalid content length')
+            if length > self.max_body_size:
+                raise ValueError('request body too large')
+            expect = headers.get('expect')
+            if expect is not None:
+                if expect.lower() != '100-continue':
+                    raise ValueError(f'expectation failed: {expect!r}')
+                if version != 'HTTP/1.0':
+                    writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+                    await writer.drain()
+            body = await reader.readexactly(length)
+
+        return HTTPRequest(method.upper(), target, version, headers, body)
+
+    async def _route(self, request: HTTPRequest) -> Response:
+        """Dispatch a request to the API or static files"""
+        if request.method == 'OPTIONS':
+            return 200, {}, b''
+
+        if request.path.startswith('/api/'):
+            if request.method not in ('GET', 'HEAD', 'POST'):
+                return 405, {'Allow': 'GET, HEAD, POST, OPTIONS'}, b''
+            return await web_api.handle_http(
+                request.method, request.path, request.query, request.body, request.headers
+            )
+
+        if request.method in ('GET', 'HEAD'):
+            # 文件状态检查和读取属于阻塞I/O
+            return await asyncio.get_running_loop().run_in_executor(
+                None, self.static_files.respond, request.path, request.headers
+            )
+
+        return 405, {'Allow': 'GET, HEAD, POST, OPTIONS'}, b''
+
+    async def _send_stream(self, writer: asyncio.StreamWriter, stream):
+        """Send a Server-Sent Events response chunk by chunk"""
+        try:
+            writer.write(self._build_head(200, dict(SSE_HEADERS), False))
+            async for chunk in stream:
+                writer.write(chunk)
+                await writer.drain()
+        finally:
+            # 客户端断开时关闭事件流，取消仍在进行的分析
+            await stream.aclose()
+
+    @staticmethod
+    def _build_head(status_code: int, headers: Dict[str, str], keep_alive: bool) -> bytes:
+        status = HTTPStatus(status_code)
+        lines = [f"HTTP/1.1 {status.value} {status.phrase}"]
+        all_headers = {
+            'Server': 'RainfallAsyncHTTP/1.0',
+            'Date': formatdate(usegmt=True),
+            **CORS_HEADERS,
+            **headers
+        }
+        all_headers['Connection'] = 'keep-alive' if keep_alive else 'close'
+        lines.extend(f"{name}: {value}" for name, value in all_headers.items())
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+    @classmethod
+    def _build_response(cls, status_code: int, headers: Dict[str, str], body: bytes, keep_alive: bool) -> bytes:
+        headers = {'Content-Length': str(len(body)), **headers}
+        return cls._build_head(status_code, headers, keep_alive) + body
+
+    @staticmethod
+    async def _close_writer(writer: asyncio.StreamWriter):
+        try:
+            writer.close()
+            await writer.wait_closed()
+        except Exception:
+            pass
+
+
+def start_async_web_server(port=None):
+    """启动asyncio Web服务器"""
+    # 设置日志
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+
+    logger = logging.getLogger(__name__)
+    web_config = settings.web_config
+    port = port or web_config['port']
+
+    async def run():
+        server = AsyncRainfallWebServer(
+            port=port,
+            max_connections=web_config['max_connections'],
+            keepalive_timeout=web_config['keepalive_timeout']
+        )
+        await server.start()
+        # 后台监控数据目录，状态接口直接读取内存中的文件统计
+        rainfall_tools.start_watching()
+
+        logger.info(f"🌐 Web服务器启动成功! (asyncio模式)")
+        logger.info(f"📍 访问地址: http://localhost:{port}")
+        logger.info(f"📍 局域网访问: http://[您的IP地址]:{port}")
+        logger.info(f"📁 服务目录: {project_root}")
+        logger.info("按 Ctrl+C 停止服务器")
+
+        try:
+            await server.serve_forever()
+        finally:
+            rainfall_tools.stop_watching()
+            await server.close()
+            # 关闭共享的AI客户端连接池
+            await client_registry.aclose()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        logger.info("服务器已停止")
+    except Exception as e:
+        logger.error(f"服务器启动失败: {e}")
+
+
+if __name__ == "__main__":
+    # Windows环境优化
+    if sys.platform == "win32":
+        asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
+
+    start_async_web_server()
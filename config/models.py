@@ -22,6 +22,8 @@ class ModelConfig(BaseModel):
     max_retries: int = 3
     temperature: float = 0.7
     max_tokens: int = 2000
+    # 提示中数据摘要部分的token预算
+    prompt_token_budget: int = 1500
 
 
 class ModelsManager:
@@ -44,7 +46,8 @@ class ModelsManager:
             timeout=deepseek_config.get('timeout', 60),
             max_retries=deepseek_config.get('max_retries', 3),
             temperature=0.3,
-            max_tokens=2000
+            max_tokens=2000,
+            prompt_token_budget=settings.ai_service_config['prompt_token_budget']
         )
 
     def get_model(self, model_name: str = "deepseek-chat") -> Optional[ModelConfig]:
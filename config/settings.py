@@ -11,10 +11,15 @@ class Settings:
     def __init__(self, config_file: Optional[str] = None):
         self.base_dir = Path(__file__).parent.parent
         self.data_dir = self.base_dir / "data"
+        self.snapshot_dir = self.base_dir / "cache" / "snapshots"
+        self.ai_cache_dir = self.base_dir / "cache" / "ai_responses"
         self.config_file = config_file or self.base_dir / "deepseekkey.txt"
 
         self.ai_config = self._load_ai_config()
         self.server_config = self._get_server_config()
+        self.data_config = self._get_data_config()
+        self.web_config = self._get_web_config()
+        self.ai_service_config = self._get_ai_service_config()
 
     def _load_ai_config(self) -> Dict[str, Any]:
         """Load AI model configuration from deepseekkey.txt"""
@@ -75,6 +80,74 @@ class Settings:
             'debug': False
         }
 
+    def _get_web_config(self) -> Dict[str, Any]:
+        """Get web interface server configuration"""
+        return {
+            'port': 8081,
+            # 服务器模式：asyncio（单事件循环，默认）或 threaded（线程池）
+            'mode': os.environ.get('RAINFALL_WEB_MODE', 'asyncio'),
+            # asyncio模式下的最大并发连接数和keep-alive空闲超时（秒，threaded模式下为读取请求的超时）
+            'max_connections': int(os.environ.get('RAINFALL_WEB_MAX_CONNECTIONS', 256)),
+            'keepalive_timeout': float(os.environ.get('RAINFALL_WEB_KEEPALIVE', 15)),
+            # threaded模式下并发处理请求的线程数
+            'max_workers': int(os.environ.get('RAINFALL_WEB_WORKERS', 16)),
+            # threaded模式下等待处理的请求上限，超出时直接返回503
+            'max_queue': int(os.environ.get('RAINFALL_WEB_QUEUE', 64))
+        }
+
+    def _get_data_config(self) -> Dict[str, Any]:
+        """Get data loading configuration"""
+        return {
+            # 多文件并行加载的线程数，可通过环境变量覆盖
+            'load_workers': int(os.environ.get('RAINFALL_LOAD_WORKERS', min(8, os.cpu_count() or 1))),
+            # 工具调用中CPU密集计算（查询、统计摘要）使用的线程数
+            'compute_workers': int(os.environ.get('RAINFALL_COMPUTE_WORKERS', min(4, os.cpu_count() or 1))),
+            # 数据集缓存的内存预算（MB，0表示不限制，包括日期索引、地区索引和汇总表；已淘汰数据集保留的地区索引不计入）、
+            # 淘汰策略（lru/lfu）和常驻站点（逗号分隔）
+            'cache_max_mb': float(os.environ.get('RAINFALL_CACHE_MAX_MB', 1024)),
+            'cache_policy': os.environ.get('RAINFALL_CACHE_POLICY', 'lru').lower(),
+            'pinned_datasets': [
+                name.strip() for name in os.environ.get('RAINFALL_PINNED_DATASETS', '').split(',') if name.strip()
+            ],
+            # 数据目录变化检测的轮询间隔（秒）；安装watchdog时由文件系统事件即时触发
+            'watch_interval': float(os.environ.get('RAINFALL_WATCH_INTERVAL', 2.0)),
+            # 数据文件变化后是否在后台重新加载已缓存的数据集
+            'rewarm_on_change': os.environ.get('RAINFALL_REWARM_ON_CHANGE', '1').lower() not in ('0', 'false', 'no'),
+            # 工具结果缓存：条目数上限、总大小上限（MB）和有效期（秒），条目数或有效期为0时关闭
+            'result_cache_entries': int(os.environ.get('RAINFALL_RESULT_CACHE_ENTRIES', 256)),
+            'result_cache_max_mb': float(os.environ.get('RAINFALL_RESULT_CACHE_MAX_MB', 32)),
+            'result_cache_ttl': float(os.environ.get('RAINFALL_RESULT_CACHE_TTL', 300)),
+            # 超过此记录数时百分位数改用近似草图计算
+            'exact_quantile_limit': int(os.environ.get('RAINFALL_EXACT_QUANTILE_LIMIT', 5_000_000))
+        }
+
+    def _get_ai_service_config(self) -> Dict[str, Any]:
+        """Get AI request handling configuration"""
+        return {
+            # 相同模型、参数、消息和数据版本的AI响应缓存有效期（秒，0表示关闭）
+            'response_cache_ttl': float(os.environ.get('RAINFALL_AI_CACHE_TTL', 24 * 3600)),
+            # 内存中保留的最近响应数，其余从磁盘缓存读取
+            'response_cache_entries': int(os.environ.get('RAINFALL_AI_CACHE_ENTRIES', 128)),
+            # 磁盘缓存的条目数和容量上限（MB），超出时淘汰最早写入的响应
+            'response_cache_disk_entries': int(os.environ.get('RAINFALL_AI_CACHE_DISK_ENTRIES', 5000)),
+            'response_cache_max_mb': float(os.environ.get('RAINFALL_AI_CACHE_MAX_MB', 64)),
+            # 提示中数据摘要的token预算，超出时裁剪细节（极端事件、月度数据等）
+            'prompt_token_budget': int(os.environ.get('RAINFALL_AI_PROMPT_TOKENS', 1500)),
+            # 共享AI客户端的连接池上限和空闲连接保持时间（秒）
+            'max_connections': int(os.environ.get('RAINFALL_AI_MAX_CONNECTIONS', 20)),
+            'max_keepalive_connections': int(os.environ.get('RAINFALL_AI_MAX_KEEPALIVE', 10)),
+            'keepalive_expiry': float(os.environ.get('RAINFALL_AI_KEEPALIVE_EXPIRY', 60)),
+            # 安装h2包时使用HTTP/2，多个并发请求复用同一连接
+            'http2': os.environ.get('RAINFALL_AI_HTTP2', '1').lower() not in ('0', 'false', 'no'),
+            # 每个模型同时发往API的请求数上限，超出的请求排队等待
+            'max_concurrency': int(os.environ.get('RAINFALL_AI_MAX_CONCURRENCY', 4)),
+            # 失败重试的指数退避基数和最长等待时间（秒），重试次数见deepseekkey.txt的max_retries
+            'retry_backoff_base': float(os.environ.get('RAINFALL_AI_BACKOFF_BASE', 0.5)),
+            'retry_backoff_max': float(os.environ.get('RAINFALL_AI_BACKOFF_MAX', 30)),
+            # 全数据分站点（map_reduce）分析时同时进行的站点分析数
+            'map_concurrency': int(os.environ.get('RAINFALL_AI_MAP_CONCURRENCY', 4))
+        }
+
     @property
     def deepseek_config(self) -> Dict[str, Any]:
         """Get DeepSeek API configuration"""
@@ -0,0 +1,187 @@
+"""
+Mergeable aggregates for combining rainfall statistics across data files
+"""
+import math
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+class QuantileSketch:
+    """KLL-style quantile sketch with bounded memory
+
+    Values are kept in levels where an item on level ``h`` stands for
+    ``2**h`` original values. When a level outgrows its capacity it is
+    sorted and every other item is promoted to the next level. While no
+    compaction has happened the sketch holds every value and quantiles
+    are exact. Compaction offsets alternate deterministically so the same
+    input always yields the same result.
+    """
+
+    def __init__(self, k: int = 512):
+        self.k = max(8, int(k))
+        self.levels: List[np.ndarray] = [np.empty(0)]
+        self.count = 0
+        self._compactions = 0
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def update(self, values) -> 'QuantileSketch':
+        """Add a batch of values, ignoring NaN"""
+        values = np.asarray(values, dtype='float64').ravel()
+        values = values[~np.isnan(values)]
+        if len(values):
+            self.levels[0] = np.concatenate([self.levels[0], values])
+            self.count += len(values)
+            self._compress()
+        return self
+
+    def merge(self, other: 'QuantileSketch') -> 'QuantileSketch':
+        """Combine two sketches into a new one"""
+        merged = QuantileSketch(min(self.k, other.k))
+        depth = max(len(self.levels), len(other.levels))
+        merged.levels = [
+            np.concatenate([
+                self.levels[h] if h < len(self.levels) else np.empty(0),
+                other.levels[h] if h < len(other.levels) else np.empty(0)
+            ])
+            for h in range(depth)
+        ]
+        merged.count = self.count + other.count
+        merged._compactions = self._compactions + other._compactions
+        merged._compress()
+        return merged
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # 奇数个元素时保留一个在当前层，其余两两压缩
+                keep = items[:len(items) % 2]
+                pairs = items[len(keep):]
+                offset = self._compactions % 2
+                self._compactions += 1
+                self.levels[level] = keep
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], pairs[offset::2]])
+            level += 1
+
+    @property
+    def nbytes(self) -> int:
+        return int(sum(level.nbytes for level in self.levels))
+
+    @property
+    def is_exact(self) -> bool:
+        return len(self.levels) == 1
+
+    def quantiles(self, qs) -> np.ndarray:
+        """Estimate several quantiles at once, linear interpolation when exact"""
+        qs = np.asarray(qs, dtype='float64')
+        if self.count == 0:
+            return np.full(qs.shape, np.nan)
+        if self.is_exact:
+            return np.quantile(self.levels[0], qs)
+
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(lvl), 2 ** h, dtype='float64') for h, lvl in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        items = items[order]
+        cumulative = np.cumsum(weights[order])
+        targets = qs * cumulative[-1]
+        positions = np.minimum(np.searchsorted(cumulative, targets, side='left'), len(items) - 1)
+        return items[positions]
+
+    def quantile(self, q: float) -> float:
+        return float(self.quantiles([q])[0])
+
+
+class RainfallAggregate:
+    """Mergeable summary of a set of rainfall values
+
+    Holds count, sum, centered sum of squares, min, max and a quantile
+    sketch. Aggregates from different files combine associatively, so a
+    combined summary only needs one aggregate per file instead of every
+    value. The centered sum of squares (merged with Chan's formula) is
+    used rather than a raw sum of squares to keep the variance stable.
+    """
+
+    def __init__(self, sketch_k: int = 512):
+        self.count = 0
+        self.total = 0.0
+        self.m2 = 0.0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self.sketch = QuantileSketch(sketch_k)
+
+    @property
+    def nbytes(self) -> int:
+        return self.sketch.nbytes
+
+    @classmethod
+    def from_values(cls, values, sketch_k: int = 512) -> 'RainfallAggregate':
+        """Build an aggregate from an array of values, ignoring NaN"""
+        values = np.asarray(values, dtype='float64').ravel()
+        values = values[~np.isnan(values)]
+        aggregate = cls(sketch_k)
+        if len(values):
+            aggregate.count = int(len(values))
+            aggregate.total = float(values.sum())
+            aggregate.m2 = float(((values - values.mean()) ** 2).sum())
+            aggregate.minimum = float(values.min())
+            aggregate.maximum = float(values.max())
+            aggregate.sketch.update(values)
+        return aggregate
+
+    def merge(self, other: 'RainfallAggregate') -> 'RainfallAggregate':
+        """Combine two aggregates into a new one"""
+        merged = RainfallAggregate(min(self.sketch.k, other.sketch.k))
+        merged.count = self.count + other.count
+        merged.total = self.total + other.total
+        if self.count and other.count:
+            delta = other.mean - self.mean
+            merged.m2 = self.m2 + other.m2 + delta * delta * self.count * other.count / merged.count
+        else:
+            merged.m2 = self.m2 + other.m2
+        merged.minimum = min(self.minimum, other.minimum)
+        merged.maximum = max(self.maximum, other.maximum)
+        merged.sketch = self.sketch.merge(other.sketch)
+        return merged
+
+    @classmethod
+    def combine(cls, aggregates) -> 'RainfallAggregate':
+        """Merge any number of aggregates"""
+        result = cls()
+        for aggregate in aggregates:
+            result = result.merge(aggregate)
+        return result
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else math.nan
+
+    @property
+    def std(self) -> float:
+        """Sample standard deviation (ddof=1), matching pandas"""
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else math.nan
+
+    @property
+    def median(self) -> float:
+        return self.sketch.quantile(0.5)
+
+    def to_stats(self) -> Optional[Dict[str, Any]]:
+        """Convert to the rainfall_stats dict used in summaries"""
+        if not self.count:
+            return None
+        return {
+            'total': float(self.total),
+            'mean': float(self.mean),
+            'median': float(self.median),
+            'min': float(self.minimum),
+            'max': float(self.maximum),
+            'std': float(self.std)
+        }
@@ -0,0 +1,181 @@
+"""
+Memory-bounded cache for loaded rainfall datasets
+"""
+import itertools
+import logging
+import threading
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+import pandas as pd
+
+
+class DatasetCache(MutableMapping):
+    """Dict-like cache of DataFrames with a byte budget
+
+    Each frame is weighed once with ``memory_usage(deep=True)`` when it is
+    stored, and the structures derived from it while it is cached (date
+    index, rollups, region postings) are added with ``add_derived``. When
+    the total exceeds ``max_bytes``, unpinned entries are
+    evicted by least-recent ('lru') or least-frequent ('lfu', ties broken
+    by recency) use. A frame larger than the whole budget is still kept
+    while it is the only unpinned entry. Only ``lookup`` counts hits and
+    misses and updates usage; plain mapping access does not.
+    """
+
+    POLICIES = ('lru', 'lfu')
+
+    def __init__(self, max_bytes: Optional[int] = None, policy: str = 'lru',
+                 pinned: Iterable[str] = (), on_evict: Optional[Callable[[str], None]] = None):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown cache policy: {policy}")
+        self.max_bytes = max_bytes if max_bytes and max_bytes > 0 else None
+        self.policy = policy
+        self.pinned = set(pinned)
+        self.on_evict = on_evict
+        # 按最近使用顺序排列，最久未使用的在前
+        self._entries: 'OrderedDict[str, pd.DataFrame]' = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._uses: Dict[str, int] = {}
+        self._last_used: Dict[str, int] = {}
+        self._clock = itertools.count()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.RLock()
+        self.logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def measure(df: pd.DataFrame) -> int:
+        """Bytes held by a frame, including string contents"""
+        return int(df.memory_usage(index=True, deep=True).sum())
+
+    def lookup(self, key: str) -> Optional[pd.DataFrame]:
+        """Get a cached frame, recording a hit or miss"""
+        with self._lock:
+            df = self._entries.get(key)
+            if df is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touch(key)
+            return df
+
+    def _touch(self, key: str):
+        self._entries.move_to_end(key)
+        self._uses[key] = self._uses.get(key, 0) + 1
+        self._last_used[key] = next(self._clock)
+
+    def __getitem__(self, key: str) -> pd.DataFrame:
+        return self._entries[key]
+
+    def __setitem__(self, key: str, df: pd.DataFrame):
+        size = self.measure(df)
+        with self._lock:
+            if key in self._entries:
+                self.total_bytes -= self._sizes[key]
+            self._entries[key] = df
+            self._sizes[key] = size
+            self.total_bytes += size
+            self._uses[key] = 0
+            self._last_used[key] = next(self._clock)
+            self._entries.move_to_end(key)
+            evicted = self._evict_over_budget(protect=key)
+        self._notify(evicted)
+
+    def add_derived(self, key: str, nbytes: int):
+        """Add the size of structures built for a cached frame to its entry"""
+        with self._lock:
+            if key not in self._entries:
+                return
+            self._sizes[key] += nbytes
+            self.total_bytes += nbytes
+            evicted = self._evict_over_budget(protect=key)
+        self._notify(evicted)
+
+    def _notify(self, evicted):
+        # 在锁外回调，回调中可以安全地访问缓存
+        for key in evicted:
+            self.logger.info(f"Evicted {key} from dataset cache")
+            if self.on_evict:
+                self.on_evict(key)
+
+    def _evict_over_budget(self, protect: str):
+        evicted = []
+        if self.max_bytes is None:
+            return evicted
+
+        while self.total_bytes > self.max_bytes:
+            candidates = [k for k in self._entries if k != protect and k not in self.pinned]
+            if not candidates:
+                break
+            if self.policy == 'lfu':
+                victim = min(candidates, key=lambda k: (self._uses[k], self._last_used[k]))
+            else:
+                victim = candidates[0]
+            self._remove(victim)
+            self.evictions += 1
+            evicted.append(victim)
+        return evicted
+
+    def _remove(self, key: str) -> pd.DataFrame:
+        df = self._entries.pop(key)
+        self.total_bytes -= self._sizes.pop(key)
+        self._uses.pop(key, None)
+        self._last_used.pop(key, None)
+        return df
+
+    def __delitem__(self, key: str):
+        with self._lock:
+            self._remove(key)
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            return iter(list(self._entries))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key) -> bool:
+        return key in self._entries
+
+    def get(self, key, default=None):
+        return self._entries.get(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._uses.clear()
+            self._last_used.clear()
+            self.total_bytes = 0
+
+    def pin(self, key: str):
+        """Never evict this dataset"""
+        with self._lock:
+            self.pinned.add(key)
+
+    def unpin(self, key: str):
+        with self._lock:
+            self.pinned.discard(key)
+            evicted = self._evict_over_budget(protect=None)
+        self._notify(evicted)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get cache counters for sizing the budget"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'policy': self.policy,
+                'entries': len(self._entries),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else None,
+                'evictions': self.evictions,
+                'pinned': sorted(self.pinned),
+                'datasets': {key: self._sizes[key] for key in self._entries}
+            }
@@ -0,0 +1,58 @@
+"""
+Vectorized date parsing for rainfall data files
+"""
+import warnings
+
+import numpy as np
+import pandas as pd
+
+
+# 支持 '2024年1月1日'、'2024-01-01'、'2024/1/1' 等格式，日期后允许附带时间等内容
+DATE_PATTERN = r'^(?P<year>\d{4})[年\-/](?P<month>\d{1,2})[月\-/](?P<day>\d{1,2})'
+
+
+def parse_dates(date_series: pd.Series) -> pd.Series:
+    """Parse a column of Chinese, ISO or slash formatted dates to datetime64
+
+    All rows are parsed with bulk string operations. Values that do not
+    match a known pattern fall back to pandas' generic parser, and
+    anything unparseable (including invalid calendar dates) becomes NaT.
+    """
+    if pd.api.types.is_datetime64_any_dtype(date_series.dtype):
+        return date_series
+
+    values = np.full(len(date_series), np.datetime64('NaT'), dtype='datetime64[ns]')
+    present = date_series.notna().to_numpy()
+
+    if present.any():
+        text = date_series[present].astype(str).str.strip().reset_index(drop=True)
+        positions = np.flatnonzero(present)
+
+        parts = text.str.extract(DATE_PATTERN)
+        matched = parts['year'].notna().to_numpy()
+
+        if matched.any():
+            components = parts[matched].astype('int64')
+            parsed = pd.to_datetime(components, errors='coerce')
+            values[positions[matched]] = parsed.to_numpy(dtype='datetime64[ns]')
+
+        if not matched.all():
+            # 仅对无法识别的少量值使用逐个解析的兜底逻辑
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', UserWarning)
+                fallback = [_parse_single(v) for v in text[~matched]]
+            values[positions[~matched]] = np.array(fallback, dtype='datetime64[ns]')
+
+    return pd.Series(values, index=date_series.index, name=date_series.name)
+
+
+def _parse_single(date_str: str):
+    try:
+        parsed = pd.to_datetime(date_str, errors='coerce')
+    except (ValueError, TypeError, OverflowError):
+        return np.datetime64('NaT')
+    if pd.isna(parsed):
+        return np.datetime64('NaT')
+    if parsed.tzinfo is not None:
+        parsed = parsed.tz_convert(None)
+    return parsed.to_datetime64()
@@ -0,0 +1,148 @@
+"""
+In-memory indexes over loaded rainfall datasets
+"""
+import re
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+def _to_datetime64(value) -> np.datetime64:
+    return pd.Timestamp(value).to_datetime64().astype('datetime64[ns]')
+
+
+class DateIndex:
+    """Sorted date index supporting binary-search range lookups
+
+    Rows with unparseable dates are left out of the index, so they never
+    match a date range, the same as comparing NaT against a bound.
+    """
+
+    def __init__(self, parsed_dates: pd.Series):
+        values = parsed_dates.to_numpy(dtype='datetime64[ns]')
+        valid = np.flatnonzero(~np.isnat(values))
+        order = valid[np.argsort(values[valid], kind='stable')]
+
+        self.row_count = len(values)
+        self.order = order
+        self.sorted_dates = values[order]
+        # 数据按日期有序且没有无效日期时，任意日期范围都对应一段连续的行
+        self.contiguous = len(order) == self.row_count and bool(np.all(order == np.arange(self.row_count)))
+
+    def bounds(self, start: Optional[pd.Timestamp] = None,
+               end: Optional[pd.Timestamp] = None) -> Tuple[int, int]:
+        """Get the [lo, hi) range of sorted positions within the inclusive date range"""
+        lo = 0
+        hi = len(self.sorted_dates)
+        if start is not None:
+            lo = int(np.searchsorted(self.sorted_dates, _to_datetime64(start), side='left'))
+        if end is not None:
+            hi = int(np.searchsorted(self.sorted_dates, _to_datetime64(end), side='right'))
+        return lo, max(lo, hi)
+
+    def slice(self, df: pd.DataFrame, start: Optional[pd.Timestamp] = None,
+              end: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+        """Select rows of df within the date range, keeping their original order"""
+        lo, hi = self.bounds(start, end)
+        if self.contiguous:
+            return df.iloc[lo:hi]
+        return df.iloc[np.sort(self.order[lo:hi])]
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.order.nbytes + self.sorted_dates.nbytes)
+
+    def date_range(self) -> Optional[Tuple[pd.Timestamp, pd.Timestamp]]:
+        """Get earliest and latest valid dates"""
+        if len(self.sorted_dates) == 0:
+            return None
+        return pd.Timestamp(self.sorted_dates[0]), pd.Timestamp(self.sorted_dates[-1])
+
+
+class RegionIndex:
+    """Inverted index from region names to row positions across datasets
+
+    Regions are matched against the (small) dictionary of distinct region
+    names instead of every row. Besides the names themselves, each region
+    can be found by the name of the station file it appears in, which is
+    the pinyin spelling of the station (e.g. 'Dabaini' for 大白泥).
+    """
+
+    def __init__(self):
+        # region -> {filename: 行位置数组}
+        self.postings: Dict[str, Dict[str, np.ndarray]] = {}
+        # 小写文件名别名 -> 该文件中出现的地区
+        self.aliases: Dict[str, Set[str]] = {}
+        # 已建立索引的数据集
+        self.datasets: Set[str] = set()
+
+    @staticmethod
+    def _normalize_alias(name: str) -> str:
+        return re.sub(r'\s+', '', str(name)).lower()
+
+    def add_dataset(self, filename: str, regions: pd.Series):
+        """Index the region column of a dataset, replacing any previous entry"""
+        self.remove_dataset(filename)
+
+        categorical = regions if isinstance(regions.dtype, pd.CategoricalDtype) else regions.astype('category')
+        codes = categorical.cat.codes.to_numpy()
+        categories = categorical.cat.categories
+
+        order = np.argsort(codes, kind='stable')
+        boundaries = np.searchsorted(codes[order], np.arange(len(categories) + 1), side='left')
+
+        present = set()
+        for code, region in enumerate(categories):
+            positions = order[boundaries[code]:boundaries[code + 1]]
+            if len(positions):
+                region = str(region)
+                self.postings.setdefault(region, {})[filename] = positions
+                present.add(region)
+
+        self.aliases[self._normalize_alias(filename)] = present
+        self.datasets.add(filename)
+
+    def remove_dataset(self, filename: str):
+        """Drop all entries of a dataset"""
+        for region in list(self.postings):
+            files = self.postings[region]
+            files.pop(filename, None)
+            if not files:
+                del self.postings[region]
+        self.aliases.pop(self._normalize_alias(filename), None)
+        self.datasets.discard(filename)
+
+    def dataset_bytes(self, filename: str) -> int:
+        """Bytes of row positions held for one dataset"""
+        return int(sum(files[filename].nbytes for files in self.postings.values() if filename in files))
+
+    def match_regions(self, pattern: str) -> List[str]:
+        """Get region names matching a pattern or substring, or belonging to a station alias"""
+        try:
+            regex = re.compile(pattern)
+            matched = {region for region in self.postings if regex.search(region)}
+        except re.error:
+            matched = {region for region in self.postings if pattern in region}
+
+        matched.update(self.aliases.get(self._normalize_alias(pattern), set()))
+
+        return sorted(matched)
+
+    def lookup(self, regions: Iterable[str]) -> Dict[str, np.ndarray]:
+        """Get sorted row positions per dataset for the given region names"""
+        per_file: Dict[str, List[np.ndarray]] = {}
+        for region in regions:
+            for filename, positions in self.postings.get(region, {}).items():
+                per_file.setdefault(filename, []).append(positions)
+
+        return {
+            filename: np.sort(np.concatenate(chunks)) if len(chunks) > 1 else chunks[0]
+            for filename, chunks in per_file.items()
+        }
+
+    def clear(self):
+        """Remove all indexed datasets"""
+        self.postings.clear()
+        self.aliases.clear()
+        self.datasets.clear()
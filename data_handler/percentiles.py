@@ -0,0 +1,42 @@
+"""
+Percentile computation for rainfall statistics
+"""
+from typing import Iterable, Sequence
+
+import numpy as np
+
+from .aggregates import QuantileSketch
+
+
+# 超过此数量的数据改用近似草图计算分位数
+EXACT_QUANTILE_LIMIT = 5_000_000
+SKETCH_K = 1024
+SKETCH_CHUNK_SIZE = 1_000_000
+
+
+def exact_quantiles(values: np.ndarray, qs: Sequence[float]) -> np.ndarray:
+    """Compute several quantiles with one partition pass (linear interpolation, like pandas)"""
+    return np.quantile(values, np.asarray(qs, dtype='float64'))
+
+
+def sketch_quantiles(chunks: Iterable[np.ndarray], qs: Sequence[float], k: int = SKETCH_K) -> np.ndarray:
+    """Estimate quantiles from a stream of value chunks with bounded memory
+
+    Chunks can come from anything iterable, e.g. ``pd.read_csv(..., chunksize=...)``
+    over an archive that does not fit in memory.
+    """
+    sketch = QuantileSketch(k)
+    for chunk in chunks:
+        sketch.update(chunk)
+    return sketch.quantiles(qs)
+
+
+def compute_quantiles(values: np.ndarray, qs: Sequence[float],
+                      exact_limit: int = EXACT_QUANTILE_LIMIT) -> np.ndarray:
+    """Compute quantiles, choosing exact or sketch mode based on data size"""
+    values = np.asarray(values, dtype='float64')
+    if len(values) <= exact_limit:
+        return exact_quantiles(values, qs)
+
+    chunks = (values[i:i + SKETCH_CHUNK_SIZE] for i in range(0, len(values), SKETCH_CHUNK_SIZE))
+    return sketch_quantiles(chunks, qs)
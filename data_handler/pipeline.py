@@ -0,0 +1,49 @@
+"""
+Shared normalization step for rainfall analyses
+"""
+from functools import cached_property
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from .dates import parse_dates
+from .schema import rainfall_series
+
+
+class NormalizedRainfall:
+    """Typed, read-only view of a rainfall DataFrame shared by all analyses
+
+    Numeric conversion, date parsing and sorting each happen at most once
+    per instance, however many analyses consume it. The source frame is
+    never modified, so cached frames stay clean.
+    """
+
+    def __init__(self, df: pd.DataFrame, parsed_dates: Optional[pd.Series] = None):
+        self.df = df
+        self._parsed_dates = parsed_dates
+
+    @cached_property
+    def rainfall(self) -> np.ndarray:
+        """Rainfall as float64 with NaN for missing or non-numeric values"""
+        if 'rainfall' not in self.df.columns:
+            return np.empty(0)
+        return rainfall_series(self.df['rainfall']).to_numpy()
+
+    @cached_property
+    def valid(self) -> np.ndarray:
+        return ~np.isnan(self.rainfall)
+
+    @cached_property
+    def valid_values(self) -> np.ndarray:
+        return self.rainfall[self.valid]
+
+    @cached_property
+    def sorted_values(self) -> np.ndarray:
+        return np.sort(self.valid_values)
+
+    @property
+    def parsed_dates(self) -> pd.Series:
+        if self._parsed_dates is None:
+            self._parsed_dates = parse_dates(self.df['date'])
+        return self._parsed_dates
@@ -1,46 +1,60 @@
 """
 Data processor for rainfall data analysis and statistics
 """
+import numpy as np
 import pandas as pd
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 import logging
-from datetime import datetime, timedelta
+
+from .percentiles import EXACT_QUANTILE_LIMIT, compute_quantiles
+from .pipeline import NormalizedRainfall
+from .rollups import StationRollup
+from .schema import format_dates
 
 
 class RainfallDataProcessor:
     """Process rainfall data for analysis and statistics"""
 
-    def __init__(self):
+    def __init__(self, exact_quantile_limit: int = EXACT_QUANTILE_LIMIT):
+        self.exact_quantile_limit = exact_quantile_limit
         self.logger = logging.getLogger(__name__)
 
-    def calculate_basic_stats(self, df: pd.DataFrame) -> Dict[str, Any]:
+    def calculate_basic_stats(self, df: pd.DataFrame,
+                              data: Optional[NormalizedRainfall] = None) -> Dict[str, Any]:
         """Calculate basic rainfall statistics"""
         if df.empty or 'rainfall' not in df.columns:
             return {}
 
         try:
-            rainfall_col = pd.to_numeric(df['rainfall'], errors='coerce')
-            valid_data = rainfall_col.dropna()
+            data = data or NormalizedRainfall(df)
+            valid_data = data.valid_values
 
-            if valid_data.empty:
+            if len(valid_data) == 0:
                 return {}
 
+            # 中位数和所有百分位数一次性计算，大数据量时自动改用近似草图
+            quantile_keys = ['median', 'q25', 'q75', 'p10', 'p90', 'p95', 'p99']
+            quantile_values = compute_quantiles(
+                data.sorted_values if len(valid_data) <= self.exact_quantile_limit else valid_data,
+                [0.5, 0.25, 0.75, 0.10, 0.90, 0.95, 0.99], self.exact_quantile_limit
+            )
+            quantiles = dict(zip(quantile_keys, quantile_values))
+
             stats = {
                 'count': int(len(valid_data)),
                 'sum': float(valid_data.sum()),
                 'mean': float(valid_data.mean()),
-                'median': float(valid_data.median()),
-                'std': float(valid_data.std()),
+                'median': float(quantiles['median']),
+                'std': float(valid_data.std(ddof=1)) if len(valid_data) > 1 else float('nan'),
                 'min': float(valid_data.min()),
                 'max': float(valid_data.max()),
-                'q25': float(valid_data.quantile(0.25)),
-                'q75': float(valid_data.quantile(0.75))
+                'q25': float(quantiles['q25']),
+                'q75': float(quantiles['q75'])
             }
 
             # 计算百分位数
-            percentiles = [10, 90, 95, 99]
-            for p in percentiles:
-                stats[f'p{p}'] = float(valid_data.quantile(p/100))
+            for p in [10, 90, 95, 99]:
+                stats[f'p{p}'] = float(quantiles[f'p{p}'])
 
             return stats
 
@@ -48,27 +62,30 @@ class RainfallDataProcessor:
             self.logger.error(f"Error calculating basic stats: {e}")
             return {}
 
-    def analyze_by_region(self, df: pd.DataFrame) -> Dict[str, Dict[str, Any]]:
+    def analyze_by_region(self, df: pd.DataFrame,
+                          data: Optional[NormalizedRainfall] = None) -> Dict[str, Dict[str, Any]]:
         """Analyze rainfall data grouped by region"""
         if df.empty or 'region' not in df.columns or 'rainfall' not in df.columns:
             return {}
 
         try:
             region_stats = {}
-            grouped = df.groupby('region')
-
-            for region, group in grouped:
-                rainfall_col = pd.to_numeric(group['rainfall'], errors='coerce')
-                valid_data = rainfall_col.dropna()
-
-                if not valid_data.empty:
+            data = data or NormalizedRainfall(df)
+            rainfall_col = pd.Series(data.rainfall, index=df.index)
+            # 地区为分类类型时按整数编码分组，只保留实际出现的地区
+            grouped = rainfall_col.groupby(df['region'], observed=True).agg(
+                ['count', 'sum', 'mean', 'max', 'min', 'std']
+            )
+
+            for region, row in grouped.iterrows():
+                if row['count'] > 0:
                     region_stats[str(region)] = {
-                        'count': int(len(valid_data)),
-                        'total': float(valid_data.sum()),
-                        'average': float(valid_data.mean()),
-                        'max': float(valid_data.max()),
-                        'min': float(valid_data.min()),
-                        'std': float(valid_data.std())
+                        'count': int(row['count']),
+                        'total': float(row['sum']),
+                        'average': float(row['mean']),
+                        'max': float(row['max']),
+                        'min': float(row['min']),
+                        'std': float(row['std'])
                     }
 
             return region_stats
@@ -77,187 +94,133 @@ class RainfallDataProcessor:
             self.logger.error(f"Error analyzing by region: {e}")
             return {}
 
-    def analyze_by_time_period(self, df: pd.DataFrame, period: str = 'month') -> Dict[str, Any]:
+    def analyze_by_time_period(self, df: pd.DataFrame, period: str = 'month',
+                               rollup: Optional[StationRollup] = None,
+                               data: Optional[NormalizedRainfall] = None) -> Dict[str, Any]:
         """Analyze rainfall data by time period (month, season, year)"""
         if df.empty or 'date' not in df.columns or 'rainfall' not in df.columns:
             return {}
 
         try:
-            # 转换日期列
-            df['date_parsed'] = pd.to_datetime(df['date'], errors='coerce')
-            df_with_dates = df.dropna(subset=['date_parsed'])
-
-            if df_with_dates.empty:
-                return {}
-
-            rainfall_col = pd.to_numeric(df_with_dates['rainfall'], errors='coerce')
-            df_with_dates = df_with_dates.assign(rainfall_numeric=rainfall_col)
-            df_clean = df_with_dates.dropna(subset=['rainfall_numeric'])
-
-            if df_clean.empty:
-                return {}
-
-            time_stats = {}
-
-            if period == 'month':
-                grouped = df_clean.groupby(df_clean['date_parsed'].dt.to_period('M'))
-                for period_key, group in grouped:
-                    time_stats[str(period_key)] = {
-                        'total': float(group['rainfall_numeric'].sum()),
-                        'average': float(group['rainfall_numeric'].mean()),
-                        'count': int(len(group))
-                    }
-
-            elif period == 'year':
-                grouped = df_clean.groupby(df_clean['date_parsed'].dt.year)
-                for year, group in grouped:
-                    time_stats[str(year)] = {
-                        'total': float(group['rainfall_numeric'].sum()),
-                        'average': float(group['rainfall_numeric'].mean()),
-                        'count': int(len(group))
-                    }
-
-            elif period == 'season':
-                df_clean['season'] = df_clean['date_parsed'].dt.month.map({
-                    12: '冬季', 1: '冬季', 2: '冬季',
-                    3: '春季', 4: '春季', 5: '春季',
-                    6: '夏季', 7: '夏季', 8: '夏季',
-                    9: '秋季', 10: '秋季', 11: '秋季'
-                })
-                grouped = df_clean.groupby('season')
-                for season, group in grouped:
-                    time_stats[season] = {
-                        'total': float(group['rainfall_numeric'].sum()),
-                        'average': float(group['rainfall_numeric'].mean()),
-                        'count': int(len(group))
-                    }
-
-            return time_stats
+            # 优先使用预先汇总的时间表，避免重新分组原始记录
+            if rollup is None:
+                rollup = self._build_rollup(df, data)
+            return rollup.by_period(period)
 
         except Exception as e:
             self.logger.error(f"Error analyzing by time period: {e}")
             return {}
 
-    def detect_extreme_events(self, df: pd.DataFrame, threshold_percentile: float = 95) -> List[Dict[str, Any]]:
+    def detect_extreme_events(self, df: pd.DataFrame, threshold_percentile: float = 95,
+                              limit: Optional[int] = None,
+                              data: Optional[NormalizedRainfall] = None) -> List[Dict[str, Any]]:
         """Detect extreme rainfall events"""
+        return self.find_extreme_events(df, threshold_percentile, limit, data)[1]
+
+    def find_extreme_events(self, df: pd.DataFrame, threshold_percentile: float = 95,
+                            limit: Optional[int] = None,
+                            data: Optional[NormalizedRainfall] = None) -> Tuple[int, List[Dict[str, Any]]]:
+        """Detect extreme rainfall events, returning total count and the top `limit` events"""
         if df.empty or 'rainfall' not in df.columns:
-            return []
+            return 0, []
 
         try:
-            rainfall_col = pd.to_numeric(df['rainfall'], errors='coerce')
-            valid_data = df[rainfall_col.notna()].copy()
-
-            if valid_data.empty:
-                return []
-
-            # 计算阈值
-            threshold = rainfall_col.quantile(threshold_percentile / 100)
-            extreme_events = valid_data[rainfall_col >= threshold]
-
-            events = []
-            for idx, row in extreme_events.iterrows():
-                event = {
-                    'index': int(idx),
-                    'rainfall': float(row['rainfall']),
-                    'percentile': float((rainfall_col < row['rainfall']).mean() * 100)
+            data = data or NormalizedRainfall(df)
+            values = data.rainfall
+            valid = data.valid
+
+            if not valid.any():
+                return 0, []
+
+            # 阈值和所有事件的百分位都基于同一份排序结果
+            sorted_values = data.sorted_values
+            threshold = np.quantile(sorted_values, threshold_percentile / 100)
+            candidates = np.flatnonzero(valid & (values >= threshold))
+            total = len(candidates)
+
+            # 只对前limit个事件做部分选择，并列值按原始行顺序保留
+            if limit is not None and 0 <= limit < total:
+                candidate_values = values[candidates]
+                if limit == 0:
+                    candidates = candidates[:0]
+                else:
+                    cutoff = np.partition(candidate_values, total - limit)[total - limit]
+                    above = candidates[candidate_values > cutoff]
+                    tied = candidates[candidate_values == cutoff][:limit - len(above)]
+                    candidates = np.sort(np.concatenate([above, tied]))
+
+            # 按降雨量降序排列（稳定排序）
+            selected = candidates[np.argsort(-values[candidates], kind='stable')]
+            selected_values = values[selected]
+            # 百分位 = 小于该值的记录占全部记录（含缺失值）的比例
+            percentiles = np.searchsorted(sorted_values, selected_values, side='left') / len(values) * 100
+
+            columns = {
+                'index': df.index[selected],
+                'rainfall': selected_values,
+                'percentile': percentiles
+            }
+            if 'date' in df.columns:
+                columns['date'] = format_dates(df['date'].iloc[selected])
+            if 'region' in df.columns:
+                columns['region'] = df['region'].iloc[selected].astype(str).to_numpy()
+
+            events = [
+                {
+                    'index': int(columns['index'][i]),
+                    'rainfall': float(columns['rainfall'][i]),
+                    'percentile': float(columns['percentile'][i]),
+                    **{key: columns[key][i] for key in ('date', 'region') if key in columns}
                 }
+                for i in range(len(selected))
+            ]
 
-                # 添加日期信息（如果有）
-                if 'date' in row:
-                    event['date'] = str(row['date'])
-
-                # 添加地区信息（如果有）
-                if 'region' in row:
-                    event['region'] = str(row['region'])
-
-                events.append(event)
-
-            # 按降雨量排序
-            events.sort(key=lambda x: x['rainfall'], reverse=True)
-
-            return events
+            return total, events
 
         except Exception as e:
             self.logger.error(f"Error detecting extreme events: {e}")
-            return []
+            return 0, []
 
-    def calculate_trends(self, df: pd.DataFrame) -> Dict[str, Any]:
+    def calculate_trends(self, df: pd.DataFrame, rollup: Optional[StationRollup] = None,
+                         data: Optional[NormalizedRainfall] = None) -> Dict[str, Any]:
         """Calculate rainfall trends over time"""
         if df.empty or 'date' not in df.columns or 'rainfall' not in df.columns:
             return {}
 
         try:
-            # 转换数据类型
-            df['date_parsed'] = pd.to_datetime(df['date'], errors='coerce')
-            rainfall_col = pd.to_numeric(df['rainfall'], errors='coerce')
-
-            df_clean = df.dropna(subset=['date_parsed', 'rainfall'])
-            if df_clean.empty:
-                return {}
-
-            df_clean = df_clean.assign(rainfall_numeric=rainfall_col.loc[df_clean.index])
-
-            # 按月份聚合
-            monthly_data = df_clean.groupby(df_clean['date_parsed'].dt.to_period('M')).agg({
-                'rainfall_numeric': ['sum', 'mean', 'count']
-            }).reset_index()
-
-            monthly_data.columns = ['month', 'total', 'average', 'count']
-            monthly_data = monthly_data.sort_values('month')
-
-            if len(monthly_data) < 2:
-                return {'trend': 'insufficient_data'}
-
-            # 计算简单趋势（线性回归斜率）
-            x = range(len(monthly_data))
-            y_total = monthly_data['total'].values
-            y_avg = monthly_data['average'].values
-
-            # 使用numpy风格的简单线性回归
-            n = len(x)
-            sum_x = sum(x)
-            sum_y_total = sum(y_total)
-            sum_xy_total = sum(xi * yi for xi, yi in zip(x, y_total))
-            sum_x2 = sum(xi * xi for xi in x)
-
-            # 总降雨量趋势
-            slope_total = (n * sum_xy_total - sum_x * sum_y_total) / (n * sum_x2 - sum_x * sum_x)
-
-            # 平均降雨量趋势
-            sum_y_avg = sum(y_avg)
-            sum_xy_avg = sum(xi * yi for xi, yi in zip(x, y_avg))
-            slope_avg = (n * sum_xy_avg - sum_x * sum_y_avg) / (n * sum_x2 - sum_x * sum_x)
-
-            trends = {
-                'total_rainfall_trend': float(slope_total),
-                'average_rainfall_trend': float(slope_avg),
-                'trend_direction': 'increasing' if slope_total > 0 else 'decreasing' if slope_total < 0 else 'stable',
-                'data_points': int(len(monthly_data)),
-                'analysis_period': {
-                    'start': str(monthly_data['month'].iloc[0]),
-                    'end': str(monthly_data['month'].iloc[-1])
-                }
-            }
-
-            return trends
+            # 基于月度汇总计算线性回归斜率
+            if rollup is None:
+                rollup = self._build_rollup(df, data)
+            return rollup.trend()
 
         except Exception as e:
             self.logger.error(f"Error calculating trends: {e}")
             return {'error': str(e)}
 
-    def generate_summary_report(self, df: pd.DataFrame) -> Dict[str, Any]:
+    @staticmethod
+    def _build_rollup(df: pd.DataFrame, data: Optional[NormalizedRainfall] = None) -> StationRollup:
+        data = data or NormalizedRainfall(df)
+        return StationRollup(data.parsed_dates.to_numpy(dtype='datetime64[ns]'), data.rainfall)
+
+    def generate_summary_report(self, df: pd.DataFrame,
+                                rollup: Optional[StationRollup] = None) -> Dict[str, Any]:
         """Generate comprehensive summary report"""
+        # 数值转换、日期解析和排序只做一次，所有分析共享；不修改传入的DataFrame
+        data = NormalizedRainfall(df)
+        if rollup is None and not df.empty and 'date' in df.columns and 'rainfall' in df.columns:
+            rollup = self._build_rollup(df, data)
+
         report = {
             'data_overview': {
                 'total_records': len(df),
                 'columns': list(df.columns)
             },
-            'basic_statistics': self.calculate_basic_stats(df),
-            'regional_analysis': self.analyze_by_region(df),
-            'monthly_analysis': self.analyze_by_time_period(df, 'month'),
-            'seasonal_analysis': self.analyze_by_time_period(df, 'season'),
-            'extreme_events': self.detect_extreme_events(df),
-            'trends': self.calculate_trends(df)
+            'basic_statistics': self.calculate_basic_stats(df, data),
+            'regional_analysis': self.analyze_by_region(df, data),
+            'monthly_analysis': self.analyze_by_time_period(df, 'month', rollup, data),
+            'seasonal_analysis': self.analyze_by_time_period(df, 'season', rollup, data),
+            'extreme_events': self.detect_extreme_events(df, data=data),
+            'trends': self.calculate_trends(df, rollup, data)
         }
 
-        return report
\ No newline at end of file
+        return report
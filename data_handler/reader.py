@@ -1,50 +1,171 @@
 """
 Data reader for rainfall Excel files
 """
+import numpy as np
 import pandas as pd
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Any
 import logging
-import re
+import threading
+
+from .aggregates import RainfallAggregate
+from .cache import DatasetCache
+from .dates import parse_dates
+from .index import DateIndex, RegionIndex
+from .rollups import StationRollup
+from .schema import normalize_frame, rainfall_series
+from .snapshot import SnapshotStore, source_fingerprint
+
+
+# 常见字节序标记，命中时可直接确定文本编码
+_BOM_ENCODINGS = [
+    (b'\xef\xbb\xbf', 'utf-8-sig'),
+    (b'\xff\xfe', 'utf-16'),
+    (b'\xfe\xff', 'utf-16'),
+]
 
 
 class RainfallDataReader:
     """Reader for rainfall Excel data files"""
 
-    def __init__(self, data_dir: Path):
+    def __init__(self, data_dir: Path, snapshot_dir: Optional[Path] = None, max_workers: int = 1,
+                 cache_max_bytes: Optional[int] = None, cache_policy: str = 'lru',
+                 pinned_datasets: Iterable[str] = ()):
         self.data_dir = Path(data_dir)
-        self.cache: Dict[str, pd.DataFrame] = {}
+        # 多文件加载/汇总的并行线程数，1表示顺序执行
+        self.max_workers = max(1, int(max_workers))
+        self._index_lock = threading.RLock()
+        # 每个文件一把加载锁，并发请求同一文件时只解析一次
+        self._load_locks: Dict[str, threading.Lock] = {}
+        # 按字节预算淘汰的数据集缓存，被淘汰时同时释放该数据集的派生结构
+        self.cache = DatasetCache(cache_max_bytes, cache_policy, pinned_datasets, on_evict=self._on_evict)
+        # 每个已加载数据集的解析后日期列，与缓存中的DataFrame一一对应
+        self.parsed_dates: Dict[str, pd.Series] = {}
+        self.date_indexes: Dict[str, DateIndex] = {}
+        # 所有已加载数据集共享的地区倒排索引，以及建立索引时各文件的版本
+        self.region_index = RegionIndex()
+        self.index_versions: Dict[str, str] = {}
+        # 每个站点的日/月/季/年汇总表，随数据集加载时建立
+        self.rollups: Dict[str, StationRollup] = {}
+        # 每个文件的局部汇总（按源文件指纹），用于增量计算综合摘要
+        self.file_partials: Dict[str, Any] = {}
+        # 每个缓存数据集加载时源文件的指纹，用于判断文件变化后缓存是否过期
+        self.loaded_sources: Dict[str, Dict[str, Any]] = {}
+        # 每个数据集的失效计数，加载期间文件发生变化时丢弃加载结果
+        self._generations: Dict[str, int] = {}
+        self.snapshots = SnapshotStore(snapshot_dir) if snapshot_dir else None
         self.logger = logging.getLogger(__name__)
 
     def _parse_chinese_date(self, date_series: pd.Series) -> pd.Series:
         """Parse Chinese date format like '2024年1月1日' to datetime"""
-        def parse_single_date(date_str):
-            if pd.isna(date_str):
-                return pd.NaT
-
-            try:
-                # 尝试标准格式解析
-                return pd.to_datetime(date_str, format='%Y-%m-%d', errors='raise')
-            except:
-                pass
-
-            try:
-                # 尝试中文格式解析 '2024年1月1日'
-                date_str = str(date_str).strip()
-                match = re.match(r'(\d{4})[年\-/](\d{1,2})[月\-/](\d{1,2})[日]?', date_str)
-                if match:
-                    year, month, day = match.groups()
-                    return pd.Timestamp(int(year), int(month), int(day))
-            except:
-                pass
-
-            try:
-                # 最后尝试pandas自动解析（但会产生警告）
-                return pd.to_datetime(date_str, errors='coerce')
-            except:
-                return pd.NaT
+        return parse_dates(date_series)
+
+    def get_parsed_dates(self, filename: str, df: pd.DataFrame) -> pd.Series:
+        """Get the parsed date column of a loaded dataset, parsing it only once"""
+        parsed = self.parsed_dates.get(filename)
+        if parsed is not None and self.cache.get(filename) is df:
+            return parsed
+
+        parsed = parse_dates(df['date'])
+        if self.cache.get(filename) is df:
+            self.parsed_dates[filename] = parsed
+        return parsed
+
+    def get_date_index(self, filename: str, df: pd.DataFrame) -> DateIndex:
+        """Get the sorted date index of a loaded dataset"""
+        index = self.date_indexes.get(filename)
+        if index is not None and self.cache.get(filename) is df:
+            return index
+
+        index = DateIndex(self.get_parsed_dates(filename, df))
+        if self.cache.get(filename) is df:
+            self.date_indexes[filename] = index
+        return index
+
+    def get_rollup(self, filename: str, df: Optional[pd.DataFrame] = None) -> Optional[StationRollup]:
+        """Get the time rollups of a dataset, built once per loaded frame"""
+        if df is None:
+            df = self.read_data_file(filename)
+        if df is None or 'date' not in df.columns or 'rainfall' not in df.columns:
+            return None
 
-        return date_series.apply(parse_single_date)
+        rollup = self.rollups.get(filename)
+        if rollup is not None and self.cache.get(filename) is df:
+            return rollup
+
+        rollup = StationRollup.from_frame(df, self.get_parsed_dates(filename, df))
+        if self.cache.get(filename) is df:
+            self.rollups[filename] = rollup
+        return rollup
+
+    def _publish(self, filename: str, file_path: Path, df: pd.DataFrame,
+                 source: Dict[str, Any], generation: int) -> bool:
+        """Build a frame's indexes and rollups, then cache the frame together with them
+
+        Everything is built before the frame becomes visible in the cache,
+        so a concurrent query never finds a cached frame whose region index
+        entries are still missing. Returns False if the dataset was
+        invalidated while loading.
+        """
+        parsed = parse_dates(df['date']) if 'date' in df.columns else None
+        date_index = DateIndex(parsed) if parsed is not None else None
+        rollup = StationRollup.from_frame(df, parsed) if parsed is not None and 'rainfall' in df.columns else None
+
+        # 共享索引可能被并行加载的线程同时更新
+        with self._index_lock:
+            # 加载期间数据集可能已失效
+            if self._generations.get(filename, 0) != generation:
+                return False
+            if 'region' in df.columns:
+                self.region_index.add_dataset(filename, df['region'])
+            else:
+                self.region_index.remove_dataset(filename)
+            self.index_versions[filename] = self._version_token(file_path, source)
+            for structures, value in ((self.parsed_dates, parsed), (self.date_indexes, date_index),
+                                      (self.rollups, rollup)):
+                if value is not None:
+                    structures[filename] = value
+                else:
+                    structures.pop(filename, None)
+            self.cache[filename] = df
+            self.loaded_sources[filename] = source
+        # 索引和汇总表计入该数据集的缓存大小
+        self.cache.add_derived(filename, self._derived_bytes(filename, df))
+        return True
+
+    def _derived_bytes(self, filename: str, df: pd.DataFrame) -> int:
+        """Bytes held by the indexes and rollups built for a cached frame"""
+        size = 0
+        parsed = self.parsed_dates.get(filename)
+        # 已是datetime64的日期列直接复用，不单独占用内存
+        if parsed is not None and not np.shares_memory(parsed.to_numpy(), df['date'].to_numpy()):
+            size += int(parsed.memory_usage(index=False))
+        for structure in (self.date_indexes.get(filename), self.rollups.get(filename)):
+            if structure is not None:
+                size += structure.nbytes
+        return size + self.region_index.dataset_bytes(filename)
+
+    def retained_bytes(self) -> int:
+        """Bytes kept outside the cache budget
+
+        Region postings of evicted datasets and the per-file partial
+        summaries are kept until their file changes (see ``_on_evict``)
+        and are not counted against the cache budget. They grow with the
+        number of files and rows, not with the number of cached frames.
+        """
+        with self._index_lock:
+            cached = set(self.cache)
+            postings = sum(self.region_index.dataset_bytes(filename)
+                           for filename in self.region_index.datasets if filename not in cached)
+            partials = sum(partial['rainfall'].nbytes for _, partial in self.file_partials.values())
+        return postings + partials
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Get dataset cache counters plus the memory kept outside the budget"""
+        stats = self.cache.stats()
+        stats['retained_bytes'] = self.retained_bytes()
+        return stats
 
     def get_available_files(self) -> List[str]:
         """Get list of available data files (Excel, TXT, CSV)"""
@@ -56,74 +177,184 @@ class RainfallDataReader:
                     data_files.append(file_path.stem)
         return list(set(data_files))  # 去重
 
-    def read_data_file(self, filename: str, use_cache: bool = True) -> Optional[pd.DataFrame]:
-        """Read data file (Excel, TXT, or CSV) and return DataFrame"""
-        if use_cache and filename in self.cache:
-            return self.cache[filename]
-
-        # 尝试不同的文件扩展名
-        possible_extensions = ['.xlsx', '.txt', '.csv']
-        file_path = None
-
-        for ext in possible_extensions:
+    def _resolve_file(self, filename: str) -> Optional[Path]:
+        """Find the source file for a dataset name"""
+        for ext in ['.xlsx', '.txt', '.csv']:
             test_path = self.data_dir / f"{filename}{ext}"
             if test_path.exists():
-                file_path = test_path
-                break
+                return test_path
+        return None
+
+    def data_version(self, filename: str) -> Optional[str]:
+        """Get a version token for a dataset's source file, None if it does not exist
 
+        Data read with ``read_data_file`` after this call is at least as
+        new as the returned version, so results can be cached under it.
+        """
+        file_path = self._resolve_file(filename)
         if file_path is None:
-            self.logger.error(f"File not found: {filename} (tried extensions: {possible_extensions})")
             return None
+        try:
+            fingerprint = source_fingerprint(file_path)
+        except OSError:
+            return None
+        return self._version_token(file_path, fingerprint)
+
+    @staticmethod
+    def _version_token(file_path: Path, fingerprint: Dict[str, Any]) -> str:
+        return f"{file_path.name}:{fingerprint['mtime_ns']:x}:{fingerprint['size']:x}"
+
+    def count_records(self, file_path: Path) -> Optional[int]:
+        """Get the exact number of records a source file loads to
+
+        Uses the snapshot header when it matches the file, otherwise parses
+        the file once (without caching the DataFrame) and writes a snapshot.
+        """
+        file_path = Path(file_path)
+        header = self.snapshots.read_header(file_path) if self.snapshots else None
+        if header is not None:
+            return int(header['rows'])
 
         try:
-            # 根据文件扩展名选择读取方法
-            if file_path.suffix.lower() == '.xlsx':
-                df = pd.read_excel(file_path)
-            elif file_path.suffix.lower() in ['.txt', '.csv']:
-                # 尝试多种编码读取文本文件
-                encodings = ['utf-8', 'gbk', 'gb2312', 'utf-16', 'latin-1']
-                df = None
-
-                for encoding in encodings:
-                    try:
-                        df = pd.read_csv(file_path, sep='\t', encoding=encoding, on_bad_lines='skip')
-                        self.logger.info(f"Successfully read {file_path} with encoding: {encoding}")
-                        break
-                    except UnicodeDecodeError:
-                        continue
-                    except Exception as e:
-                        self.logger.warning(f"Failed to read with encoding {encoding}: {e}")
-                        continue
+            df = self._parse_source_file(file_path)
+        except Exception as e:
+            self.logger.error(f"Error counting records of {file_path.name}: {e}")
+            return None
+        if df is None:
+            return None
+        if self.snapshots:
+            self.snapshots.save(file_path, df)
+        return len(df)
 
-                if df is None:
-                    self.logger.error(f"Failed to read {file_path} with any encoding")
-                    return None
-            else:
-                self.logger.error(f"Unsupported file format: {file_path.suffix}")
+    def _detect_encodings(self, file_path: Path) -> List[str]:
+        """Get candidate text encodings, using the BOM when present"""
+        encodings = ['utf-8', 'gbk', 'gb2312', 'utf-16', 'latin-1']
+        try:
+            with open(file_path, 'rb') as f:
+                head = f.read(4)
+        except OSError:
+            return encodings
+
+        for bom, encoding in _BOM_ENCODINGS:
+            if head.startswith(bom):
+                return [encoding] + [e for e in encodings if e != encoding]
+        return encodings
+
+    def _parse_source_file(self, file_path: Path) -> Optional[pd.DataFrame]:
+        """Parse a source data file and normalize its columns"""
+        # 根据文件扩展名选择读取方法
+        if file_path.suffix.lower() == '.xlsx':
+            df = pd.read_excel(file_path)
+        elif file_path.suffix.lower() in ['.txt', '.csv']:
+            # 优先使用BOM识别的编码，失败时再尝试其他编码
+            df = None
+
+            for encoding in self._detect_encodings(file_path):
+                try:
+                    df = pd.read_csv(file_path, sep='\t', encoding=encoding, on_bad_lines='skip')
+                    self.logger.info(f"Successfully read {file_path} with encoding: {encoding}")
+                    break
+                except UnicodeDecodeError:
+                    continue
+                except Exception as e:
+                    self.logger.warning(f"Failed to read with encoding {encoding}: {e}")
+                    continue
+
+            if df is None:
+                self.logger.error(f"Failed to read {file_path} with any encoding")
                 return None
+        else:
+            self.logger.error(f"Unsupported file format: {file_path.suffix}")
+            return None
 
-            # 数据清理：删除空行和空列
-            df = df.dropna(how='all').dropna(axis=1, how='all')
-
-            # 尝试标准化列名
-            if len(df.columns) >= 3:
-                # 假设前三列是：日期、地区、降雨量
-                df.columns = df.columns.astype(str)
-                new_columns = []
-                for i, col in enumerate(df.columns):
-                    if i == 0:
-                        new_columns.append('date')
-                    elif i == 1:
-                        new_columns.append('region')
-                    elif i == 2:
-                        new_columns.append('rainfall')
-                    else:
-                        new_columns.append(col)
-                df.columns = new_columns
+        # 数据清理：删除空行和空列
+        df = df.dropna(how='all').dropna(axis=1, how='all')
+
+        # 尝试标准化列名
+        if len(df.columns) >= 3:
+            # 假设前三列是：日期、地区、降雨量
+            df.columns = df.columns.astype(str)
+            new_columns = []
+            for i, col in enumerate(df.columns):
+                if i == 0:
+                    new_columns.append('date')
+                elif i == 1:
+                    new_columns.append('region')
+                elif i == 2:
+                    new_columns.append('rainfall')
+                else:
+                    new_columns.append(col)
+            df.columns = new_columns
+
+        # 加载时统一转换为紧凑类型：日期datetime64、地区字典编码、降雨量float64
+        # 过滤和分组都直接基于这些类型完成，无需再次转换
+        return normalize_frame(df)
+
+    def read_data_file(self, filename: str, use_cache: bool = True) -> Optional[pd.DataFrame]:
+        """Read data file (Excel, TXT, or CSV) and return DataFrame
+
+        A cached frame is only returned while its source file is unchanged,
+        so data read after ``data_version`` is never older than that version.
+        """
+        if use_cache:
+            df = self.cache.lookup(filename)
+            if df is not None and self._is_current(filename, df):
+                return df
+        else:
+            return self._load_data_file(filename, use_cache)
+
+        with self._file_lock(filename):
+            # 等待锁期间其他线程可能已完成加载；只取一次，避免检查后被其他线程淘汰
+            df = self.cache.get(filename)
+            if df is not None and self._is_current(filename, df):
+                return df
+            return self._load_data_file(filename, use_cache)
+
+    def _is_current(self, filename: str, df: pd.DataFrame) -> bool:
+        """Check a cached frame against its source file, invalidating it if the file changed"""
+        with self._index_lock:
+            source = self.loaded_sources.get(filename)
+        try:
+            current = source_fingerprint(Path(source['path'])) if source else None
+        except OSError:
+            current = None
+        if current is not None and current == source:
+            return True
+
+        # 文件已变化但监控尚未扫描到：立即失效，不等下一次扫描
+        with self._index_lock:
+            if self.cache.get(filename) is df:
+                self.invalidate(filename)
+        return False
+
+    def _file_lock(self, filename: str) -> threading.Lock:
+        with self._index_lock:
+            return self._load_locks.setdefault(filename, threading.Lock())
+
+    def _load_data_file(self, filename: str, use_cache: bool) -> Optional[pd.DataFrame]:
+        file_path = self._resolve_file(filename)
+        if file_path is None:
+            self.logger.error(f"File not found: {filename} (tried extensions: ['.xlsx', '.txt', '.csv'])")
+            return None
+
+        try:
+            # 在读取前记录指纹和失效计数，读取期间文件被修改时不会把旧数据当作最新版本
+            with self._index_lock:
+                generation = self._generations.get(filename, 0)
+            source = source_fingerprint(file_path)
+            df = self.snapshots.load(file_path) if self.snapshots else None
+
+            if df is None:
+                df = self._parse_source_file(file_path)
+                if df is None:
+                    return None
+                # 源文件解析后写入快照，下次启动直接按列读取，无需重新解析
+                if self.snapshots:
+                    self.snapshots.save(file_path, df)
 
             # 缓存数据
-            if use_cache:
-                self.cache[filename] = df
+            if use_cache and not self._publish(filename, file_path, df, source, generation):
+                self.logger.info(f"{filename} changed while loading, result not cached")
 
             self.logger.info(f"Successfully loaded {filename}{file_path.suffix} with {len(df)} records")
             return df
@@ -154,12 +385,11 @@ class RainfallDataReader:
         try:
             # 尝试分析日期范围
             if 'date' in df.columns:
-                date_col = self._parse_chinese_date(df['date'])
-                valid_dates = date_col.dropna()
-                if not valid_dates.empty:
+                date_range = self.get_date_index(filename, df).date_range()
+                if date_range:
                     summary['date_range'] = {
-                        'start': valid_dates.min().strftime('%Y-%m-%d'),
-                        'end': valid_dates.max().strftime('%Y-%m-%d')
+                        'start': date_range[0].strftime('%Y-%m-%d'),
+                        'end': date_range[1].strftime('%Y-%m-%d')
                     }
 
             # 分析地区信息
@@ -169,7 +399,7 @@ class RainfallDataReader:
 
             # 分析降雨量统计
             if 'rainfall' in df.columns:
-                rainfall_col = pd.to_numeric(df['rainfall'], errors='coerce')
+                rainfall_col = rainfall_series(df['rainfall'])
                 valid_rainfall = rainfall_col.dropna()
                 if not valid_rainfall.empty:
                     summary['rainfall_stats'] = {
@@ -194,32 +424,29 @@ class RainfallDataReader:
         if not filters:
             return df
 
-        filtered_df = df.copy()
+        filtered_df = df
 
         try:
-            # 按日期过滤
+            # 按日期过滤：通过有序日期索引二分查找定位范围
             if 'start_date' in filters or 'end_date' in filters:
                 if 'date' in df.columns:
-                    date_col = self._parse_chinese_date(filtered_df['date'])
-                    if 'start_date' in filters:
-                        start_date = pd.to_datetime(filters['start_date'])
-                        filtered_df = filtered_df[date_col >= start_date]
-                    if 'end_date' in filters:
-                        end_date = pd.to_datetime(filters['end_date'])
-                        filtered_df = filtered_df[date_col <= end_date]
-
-            # 按地区过滤
+                    start_date = pd.to_datetime(filters['start_date']) if 'start_date' in filters else None
+                    end_date = pd.to_datetime(filters['end_date']) if 'end_date' in filters else None
+                    filtered_df = self.get_date_index(filename, df).slice(df, start_date, end_date)
+
+            # 按地区过滤：在地区字典上匹配，再按整数编码筛选行
             if 'region' in filters and 'region' in df.columns:
                 region_filter = filters['region']
                 if isinstance(region_filter, str):
-                    filtered_df = filtered_df[filtered_df['region'].str.contains(region_filter, na=False)]
+                    regions = self._match_regions(filename, df, region_filter)
+                    filtered_df = filtered_df[self._region_mask(filtered_df['region'], regions)]
                 elif isinstance(region_filter, list):
-                    filtered_df = filtered_df[filtered_df['region'].isin(region_filter)]
+                    filtered_df = filtered_df[self._region_mask(filtered_df['region'], region_filter)]
 
             # 按降雨量范围过滤
             if 'min_rainfall' in filters or 'max_rainfall' in filters:
                 if 'rainfall' in df.columns:
-                    rainfall_col = pd.to_numeric(filtered_df['rainfall'], errors='coerce')
+                    rainfall_col = rainfall_series(filtered_df['rainfall'])
                     if 'min_rainfall' in filters:
                         filtered_df = filtered_df[rainfall_col >= filters['min_rainfall']]
                     if 'max_rainfall' in filters:
@@ -231,13 +458,70 @@ class RainfallDataReader:
 
         return filtered_df
 
+    def _match_regions(self, filename: str, df: pd.DataFrame, pattern: str) -> List[str]:
+        """Match a region pattern against the region dictionary"""
+        if self.cache.get(filename) is not df:
+            # 未缓存的数据集不在共享索引中，临时建立索引匹配
+            index = RegionIndex()
+            index.add_dataset(filename, df['region'])
+            return index.match_regions(pattern)
+        with self._index_lock:
+            return self.region_index.match_regions(pattern)
+
+    @staticmethod
+    def _region_mask(region_col: pd.Series, regions: List[str]) -> np.ndarray:
+        """Build a row mask for region names using category codes"""
+        if not isinstance(region_col.dtype, pd.CategoricalDtype):
+            return region_col.isin(regions).to_numpy()
+        wanted = region_col.cat.categories.get_indexer(regions)
+        return np.isin(region_col.cat.codes.to_numpy(), wanted[wanted >= 0])
+
+    def query_region(self, region_filter: str) -> Dict[str, pd.DataFrame]:
+        """Query one region pattern across all datasets using the shared region index"""
+        available = self.get_available_files()
+        with self._index_lock:
+            indexed = dict(self.index_versions)
+        # 索引中已删除的文件
+        for filename in set(indexed) - set(available):
+            self.invalidate(filename)
+
+        # 确保所有数据集都以当前文件版本建立地区索引，之后的匹配只访问索引
+        for filename in available:
+            version = indexed.get(filename)
+            if version is not None and version != self.data_version(filename):
+                # 未启动监控时文件变化不会自动失效，这里按版本检查
+                self.invalidate(filename)
+                version = None
+            if version is None:
+                self.read_data_file(filename)
+
+        with self._index_lock:
+            regions = self.region_index.match_regions(region_filter)
+            matches = self.region_index.lookup(regions)
+        results = {}
+        for filename, positions in matches.items():
+            # 已被缓存淘汰的数据集按需重新加载，索引中的行位置对未变化的文件仍然有效
+            df = self.read_data_file(filename)
+            if df is not None:
+                results[filename] = df.iloc[positions]
+        return results
+
+    def _map_files(self, func, filenames: List[str]) -> List[Any]:
+        """Apply func to every file, in parallel when more than one worker is configured"""
+        workers = min(self.max_workers, len(filenames))
+        if workers <= 1:
+            return [func(filename) for filename in filenames]
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='rainfall-loader') as executor:
+            return list(executor.map(func, filenames))
+
     def read_all_files(self) -> Dict[str, pd.DataFrame]:
         """Read all available data files and return as dict"""
         all_data = {}
         available_files = self.get_available_files()
 
-        for filename in available_files:
-            df = self.read_data_file(filename)
+        loaded = self._map_files(self.read_data_file, available_files)
+        for filename, df in zip(available_files, loaded):
             if df is not None:
                 all_data[filename] = df
                 self.logger.info(f"Successfully loaded {filename}: {len(df)} records")
@@ -246,77 +530,97 @@ class RainfallDataReader:
 
         return all_data
 
+    def _summarize_file(self, filename: str) -> Optional[Dict[str, Any]]:
+        """Load one data file and compute its partial aggregates for the combined summary"""
+        # 文件未变化时直接复用已计算的局部汇总（数据集被缓存淘汰后仍然有效）
+        file_path = self._resolve_file(filename)
+        cached = self.file_partials.get(filename)
+        if cached is not None and file_path is not None:
+            try:
+                if cached[0] == source_fingerprint(file_path):
+                    return cached[1]
+            except OSError:
+                pass
+
+        df = self.read_data_file(filename)
+        if df is None:
+            self.logger.warning(f"Failed to load {filename}")
+            return None
+
+        partial = {
+            'records': len(df),
+            'regions': list(df['region'].dropna().unique()) if 'region' in df.columns else [],
+            'date_range': None,
+            'rainfall': RainfallAggregate()
+        }
+
+        # 收集日期范围
+        if 'date' in df.columns:
+            partial['date_range'] = self.get_date_index(filename, df).date_range()
+
+        # 收集降雨量数据
+        if 'rainfall' in df.columns:
+            partial['rainfall'] = RainfallAggregate.from_values(rainfall_series(df['rainfall']).to_numpy())
+
+        with self._index_lock:
+            source = self.loaded_sources.get(filename)
+            if self.cache.get(filename) is df and source is not None:
+                self.file_partials[filename] = (source, partial)
+        return partial
+
     def get_combined_data_summary(self) -> Dict[str, Any]:
         """Get summary of all available data files combined"""
-        all_data = self.read_all_files()
-        if not all_data:
+        available_files = self.get_available_files()
+        # 各文件并行加载并计算局部汇总，随后合并
+        partials = [
+            (filename, partial)
+            for filename, partial in zip(available_files, self._map_files(self._summarize_file, available_files))
+            if partial is not None
+        ]
+        if not partials:
             return {}
 
         total_records = 0
         all_regions = set()
         min_date = None
         max_date = None
-        total_rainfall = 0
-        all_rainfall_values = []
         file_summaries = {}
 
-        for filename, df in all_data.items():
-            file_records = len(df)
-            total_records += file_records
+        for filename, partial in partials:
+            total_records += partial['records']
+            all_regions.update(partial['regions'])
 
-            # 收集地区信息
-            if 'region' in df.columns:
-                all_regions.update(df['region'].dropna().unique())
+            date_range = partial['date_range']
+            if date_range:
+                if min_date is None or date_range[0] < min_date:
+                    min_date = date_range[0]
+                if max_date is None or date_range[1] > max_date:
+                    max_date = date_range[1]
 
-            # 收集日期范围
-            if 'date' in df.columns:
-                date_col = self._parse_chinese_date(df['date']).dropna()
-                if not date_col.empty:
-                    file_min_date = date_col.min()
-                    file_max_date = date_col.max()
-                    if min_date is None or file_min_date < min_date:
-                        min_date = file_min_date
-                    if max_date is None or file_max_date > max_date:
-                        max_date = file_max_date
-
-            # 收集降雨量数据
-            if 'rainfall' in df.columns:
-                rainfall_col = pd.to_numeric(df['rainfall'], errors='coerce').dropna()
-                if not rainfall_col.empty:
-                    total_rainfall += rainfall_col.sum()
-                    all_rainfall_values.extend(rainfall_col.tolist())
+            rainfall = partial['rainfall']
 
             # 记录每个文件的摘要
             file_summaries[filename] = {
-                'records': file_records,
-                'regions': list(df['region'].dropna().unique()) if 'region' in df.columns else [],
+                'records': partial['records'],
+                'regions': partial['regions'],
                 'date_range': {
-                    'start': date_col.min().strftime('%Y-%m-%d') if not date_col.empty else None,
-                    'end': date_col.max().strftime('%Y-%m-%d') if not date_col.empty else None
-                } if 'date' in df.columns and not date_col.empty else None,
+                    'start': date_range[0].strftime('%Y-%m-%d'),
+                    'end': date_range[1].strftime('%Y-%m-%d')
+                } if date_range else None,
                 'rainfall_summary': {
-                    'total': float(rainfall_col.sum()),
-                    'mean': float(rainfall_col.mean()),
-                    'max': float(rainfall_col.max()),
-                    'min': float(rainfall_col.min())
-                } if 'rainfall' in df.columns and not rainfall_col.empty else None
+                    'total': float(rainfall.total),
+                    'mean': float(rainfall.mean),
+                    'max': float(rainfall.maximum),
+                    'min': float(rainfall.minimum)
+                } if rainfall.count else None
             }
 
-        # 计算综合统计
-        rainfall_stats = {}
-        if all_rainfall_values:
-            rainfall_series = pd.Series(all_rainfall_values)
-            rainfall_stats = {
-                'total': float(rainfall_series.sum()),
-                'mean': float(rainfall_series.mean()),
-                'median': float(rainfall_series.median()),
-                'min': float(rainfall_series.min()),
-                'max': float(rainfall_series.max()),
-                'std': float(rainfall_series.std())
-            }
+        # 合并各文件的聚合结果得到综合统计，内存只与文件数有关
+        combined = RainfallAggregate.combine(partial['rainfall'] for _, partial in partials)
+        rainfall_stats = combined.to_stats() or {}
 
         return {
-            'total_files': len(all_data),
+            'total_files': len(partials),
             'total_records': total_records,
             'all_regions': list(all_regions),
             'date_range': {
@@ -327,7 +631,92 @@ class RainfallDataReader:
             'file_summaries': file_summaries
         }
 
+    def _on_evict(self, filename: str):
+        """Release per-frame structures of a dataset evicted from the cache
+
+        Region index entries and the combined-summary partial are kept:
+        they stay valid for the unchanged file, so cross-dataset region
+        lookups stay complete and combined summaries need no reload. They
+        are dropped by invalidate() once the file changes. Once evicted
+        they no longer count against the cache budget; ``retained_bytes``
+        reports their size.
+        """
+        with self._index_lock:
+            self.loaded_sources.pop(filename, None)
+            self.parsed_dates.pop(filename, None)
+            self.date_indexes.pop(filename, None)
+            self.rollups.pop(filename, None)
+
+    def invalidate(self, filename: str) -> bool:
+        """Drop one dataset's cached frame, indexes, rollups and partial summary
+
+        Returns True if the dataset was loaded.
+        """
+        with self._index_lock:
+            self._generations[filename] = self._generations.get(filename, 0) + 1
+            was_cached = self.cache.pop(filename, None) is not None
+            self.loaded_sources.pop(filename, None)
+            self.parsed_dates.pop(filename, None)
+            self.date_indexes.pop(filename, None)
+            self.rollups.pop(filename, None)
+            self.file_partials.pop(filename, None)
+            self.region_index.remove_dataset(filename)
+            self.index_versions.pop(filename, None)
+
+        if was_cached:
+            self.logger.info(f"Invalidated cached data of {filename}")
+        return was_cached
+
+    def apply_changes(self, changes) -> List[str]:
+        """Invalidate datasets whose source files were added, modified or deleted
+
+        ``changes`` are (event, path) pairs from DataDirectoryWatcher. A
+        dataset whose cached copy still matches its file is kept. Returns
+        the names of datasets that were loaded and are now stale.
+        """
+        stale = []
+        for event, path in changes:
+            filename = path.stem
+            current = None
+            if event != 'deleted':
+                try:
+                    current = source_fingerprint(path)
+                except OSError:
+                    pass
+
+            with self._index_lock:
+                loaded = self.loaded_sources.get(filename)
+            if loaded is None and event == 'added':
+                # 新文件（包括监控启动时的首次扫描）没有需要失效的缓存
+                continue
+            if loaded is not None and current is not None and loaded == current:
+                continue
+
+            # 先释放缓存的数据集，再删除其快照文件
+            if self.invalidate(filename):
+                stale.append(filename)
+            if event == 'deleted' and self.snapshots:
+                self.snapshots.remove(path)
+
+        return stale
+
+    def rewarm(self, filenames: List[str]):
+        """Reload datasets and rebuild their indexes and rollups"""
+        for filename in filenames:
+            if self._resolve_file(filename) is not None and self.read_data_file(filename) is not None:
+                self.logger.info(f"Re-warmed {filename}")
+
     def clear_cache(self):
         """Clear data cache"""
+        with self._index_lock:
+            for filename in self.cache:
+                self._generations[filename] = self._generations.get(filename, 0) + 1
         self.cache.clear()
+        self.loaded_sources.clear()
+        self.parsed_dates.clear()
+        self.date_indexes.clear()
+        self.region_index.clear()
+        self.index_versions.clear()
+        self.file_partials.clear()
+        self.rollups.clear()
         self.logger.info("Data cache cleared")
\ No newline at end of file
@@ -0,0 +1,133 @@
+"""
+Pre-aggregated time rollups for rainfall stations
+"""
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from .dates import parse_dates
+from .schema import rainfall_series
+
+
+SEASONS = {
+    12: '冬季', 1: '冬季', 2: '冬季',
+    3: '春季', 4: '春季', 5: '春季',
+    6: '夏季', 7: '夏季', 8: '夏季',
+    9: '秋季', 10: '秋季', 11: '秋季'
+}
+
+
+def _group_sums(keys: np.ndarray, totals: np.ndarray, counts: np.ndarray):
+    """Sum totals and counts per sorted unique key"""
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    return (
+        unique_keys,
+        np.bincount(inverse, weights=totals, minlength=len(unique_keys)),
+        np.bincount(inverse, weights=counts, minlength=len(unique_keys)).astype('int64')
+    )
+
+
+class StationRollup:
+    """Daily, monthly, seasonal and yearly rainfall aggregates of one station
+
+    Built once from the raw rows (those with a valid date and numeric
+    rainfall). Every coarser level is derived from the daily table, so
+    period analyses and trend fits never touch the raw rows again.
+    """
+
+    def __init__(self, days: np.ndarray, rainfall: np.ndarray):
+        valid = ~np.isnat(days) & ~np.isnan(rainfall)
+        self.record_count = int(valid.sum())
+
+        self.days, self.daily_total, self.daily_count = _group_sums(
+            days[valid].astype('datetime64[D]'), rainfall[valid], np.ones(self.record_count)
+        )
+        self.months, self.monthly_total, self.monthly_count = _group_sums(
+            self.days.astype('datetime64[M]'), self.daily_total, self.daily_count
+        )
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, parsed_dates: Optional[pd.Series] = None) -> 'StationRollup':
+        """Build rollups from a frame with date and rainfall columns"""
+        if parsed_dates is None:
+            parsed_dates = parse_dates(df['date'])
+        return cls(
+            parsed_dates.to_numpy(dtype='datetime64[ns]'),
+            rainfall_series(df['rainfall']).to_numpy()
+        )
+
+    @property
+    def nbytes(self) -> int:
+        return int(sum(value.nbytes for value in vars(self).values() if isinstance(value, np.ndarray)))
+
+    def between(self, start=None, end=None) -> 'StationRollup':
+        """Get rollups restricted to an inclusive date range, computed from the daily table"""
+        lo = 0 if start is None else int(np.searchsorted(
+            self.days, pd.Timestamp(start).to_datetime64().astype('datetime64[D]'), side='left'))
+        hi = len(self.days) if end is None else int(np.searchsorted(
+            self.days, pd.Timestamp(end).to_datetime64().astype('datetime64[D]'), side='right'))
+
+        subset = StationRollup.__new__(StationRollup)
+        subset.days = self.days[lo:hi]
+        subset.daily_total = self.daily_total[lo:hi]
+        subset.daily_count = self.daily_count[lo:hi]
+        subset.record_count = int(subset.daily_count.sum())
+        subset.months, subset.monthly_total, subset.monthly_count = _group_sums(
+            subset.days.astype('datetime64[M]'), subset.daily_total, subset.daily_count
+        )
+        return subset
+
+    def by_period(self, period: str = 'month') -> Dict[str, Dict[str, Any]]:
+        """Get total, average and count per month, season or year"""
+        if period == 'month':
+            keys = [str(month) for month in self.months]
+            totals, counts = self.monthly_total, self.monthly_count
+        elif period == 'year':
+            years = self.months.astype('datetime64[Y]').astype('int64') + 1970
+            year_keys, totals, counts = _group_sums(years, self.monthly_total, self.monthly_count)
+            keys = [str(year) for year in year_keys]
+        elif period == 'season':
+            month_numbers = self.months.astype('int64') % 12 + 1
+            seasons = np.array([SEASONS[m] for m in month_numbers], dtype=object)
+            season_keys, totals, counts = _group_sums(seasons.astype(str), self.monthly_total, self.monthly_count)
+            keys = [str(season) for season in season_keys]
+        else:
+            return {}
+
+        return {
+            key: {
+                'total': float(total),
+                'average': float(total / count),
+                'count': int(count)
+            }
+            for key, total, count in zip(keys, totals, counts)
+            if count > 0
+        }
+
+    def trend(self) -> Dict[str, Any]:
+        """Fit linear trends of monthly total and average rainfall"""
+        n = len(self.months)
+        if n == 0:
+            return {}
+        if n < 2:
+            return {'trend': 'insufficient_data'}
+
+        x = np.arange(n, dtype='float64')
+        y_total = self.monthly_total
+        y_avg = self.monthly_total / self.monthly_count
+
+        denominator = n * (x * x).sum() - x.sum() ** 2
+        slope_total = (n * (x * y_total).sum() - x.sum() * y_total.sum()) / denominator
+        slope_avg = (n * (x * y_avg).sum() - x.sum() * y_avg.sum()) / denominator
+
+        return {
+            'total_rainfall_trend': float(slope_total),
+            'average_rainfall_trend': float(slope_avg),
+            'trend_direction': 'increasing' if slope_total > 0 else 'decreasing' if slope_total < 0 else 'stable',
+            'data_points': int(n),
+            'analysis_period': {
+                'start': str(self.months[0]),
+                'end': str(self.months[-1])
+            }
+        }
@@ -0,0 +1,53 @@
+"""
+Normalized column schema for loaded rainfall data
+"""
+import numpy as np
+import pandas as pd
+
+from .dates import parse_dates
+
+
+def normalize_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Convert the standard columns to their compact typed form
+
+    ``date`` becomes datetime64 (NaT when unparseable), ``region`` a
+    categorical of stripped names and ``rainfall`` float64 (NaN when
+    missing or non-numeric). Values are parsed once at load time, so
+    analyses can use the columns directly.
+    """
+    if 'date' in df.columns:
+        df['date'] = parse_dates(df['date'])
+
+    if 'region' in df.columns:
+        region = df['region']
+        if not isinstance(region.dtype, pd.CategoricalDtype):
+            if pd.api.types.is_object_dtype(region.dtype) or pd.api.types.is_string_dtype(region.dtype):
+                region = region.str.strip()
+            region = region.astype('category')
+        # 去除首尾空白后可能出现重复或未使用的类别
+        df['region'] = region.cat.remove_unused_categories()
+
+    if 'rainfall' in df.columns:
+        df['rainfall'] = rainfall_series(df['rainfall'])
+
+    return df
+
+
+def rainfall_series(series: pd.Series) -> pd.Series:
+    """Get rainfall values as float64, converting only columns that are not numeric yet"""
+    if series.dtype == np.float64:
+        return series
+    if pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+        return series.astype('float64')
+    if pd.api.types.is_object_dtype(series.dtype) or pd.api.types.is_string_dtype(series.dtype):
+        series = series.astype(str).str.strip()
+    return pd.to_numeric(series, errors='coerce').astype('float64')
+
+
+def format_dates(series: pd.Series) -> np.ndarray:
+    """Format a date column as 'YYYY-MM-DD' strings, None for missing dates"""
+    if not pd.api.types.is_datetime64_any_dtype(series.dtype):
+        return series.astype(str).to_numpy()
+    text = series.dt.strftime('%Y-%m-%d').to_numpy(dtype=object)
+    text[series.isna().to_numpy()] = None
+    return text
@@ -0,0 +1,241 @@
+"""
+Binary columnar snapshots for parsed rainfall data files
+"""
+import json
+import os
+import struct
+import threading
+from pathlib import Path
+from typing import Dict, Any, Optional
+import logging
+
+import numpy as np
+import pandas as pd
+
+
+SNAPSHOT_MAGIC = b'RFSNAP01'
+SNAPSHOT_VERSION = 3
+SNAPSHOT_SUFFIX = '.rfsnap'
+# 每个列块按64字节对齐，可直接按类型整块读取或内存映射
+BLOCK_ALIGNMENT = 64
+
+_HEADER_PREFIX = struct.Struct('<8sI')
+
+
+def _align(offset: int) -> int:
+    return (offset + BLOCK_ALIGNMENT - 1) // BLOCK_ALIGNMENT * BLOCK_ALIGNMENT
+
+
+def _read_block(f, offset: int, dtype: str, rows: int) -> np.ndarray:
+    """Read one column block of ``rows`` values at a byte offset"""
+    f.seek(offset)
+    values = np.fromfile(f, dtype=np.dtype(dtype), count=rows)
+    if len(values) != rows:
+        raise ValueError(f"truncated column block at offset {offset}")
+    return values
+
+
+def source_fingerprint(file_path: Path) -> Dict[str, Any]:
+    """Identify a source file by path, modification time and size"""
+    stat = file_path.stat()
+    return {
+        'path': str(file_path.resolve()),
+        'mtime_ns': stat.st_mtime_ns,
+        'size': stat.st_size
+    }
+
+
+class SnapshotStore:
+    """Persist parsed DataFrames as binary columnar snapshots
+
+    Layout of a snapshot file::
+
+        magic (8 bytes) | header length (uint32) | JSON header | column blocks
+
+    The header records the source fingerprint, row count and, for every
+    column, its kind, dtype and byte offset. Numeric and datetime64 columns
+    are stored as raw little-endian arrays; string and categorical columns
+    are dictionary encoded as int32 codes with the dictionary kept in the
+    header.
+    """
+
+    def __init__(self, snapshot_dir: Path):
+        self.snapshot_dir = Path(snapshot_dir)
+        self.logger = logging.getLogger(__name__)
+
+    def snapshot_path(self, source_path: Path) -> Path:
+        """Get snapshot file location for a source file"""
+        return self.snapshot_dir / f"{source_path.name}{SNAPSHOT_SUFFIX}"
+
+    def read_header(self, source_path: Path) -> Optional[Dict[str, Any]]:
+        """Read snapshot header if the snapshot matches the current source file"""
+        snap_path = self.snapshot_path(source_path)
+        if not snap_path.exists():
+            return None
+
+        try:
+            with open(snap_path, 'rb') as f:
+                magic, header_len = _HEADER_PREFIX.unpack(f.read(_HEADER_PREFIX.size))
+                if magic != SNAPSHOT_MAGIC:
+                    return None
+                header = json.loads(f.read(header_len).decode('utf-8'))
+        except (OSError, ValueError, struct.error) as e:
+            self.logger.warning(f"Invalid snapshot {snap_path}: {e}")
+            return None
+
+        if header.get('version') != SNAPSHOT_VERSION:
+            return None
+        if header.get('source') != source_fingerprint(source_path):
+            return None
+
+        return header
+
+    def load(self, source_path: Path) -> Optional[pd.DataFrame]:
+        """Load a DataFrame from a valid snapshot, or None if missing or stale"""
+        header = self.read_header(source_path)
+        if header is None:
+            return None
+
+        snap_path = self.snapshot_path(source_path)
+        rows = header['rows']
+        columns = {}
+        index = pd.RangeIndex(rows)
+
+        try:
+            # 列块直接读入内存而不保留内存映射，缓存中的数据集不会占用快照文件，
+            # Windows下快照仍可被覆盖或删除
+            with open(snap_path, 'rb') as f:
+                for col in header['columns']:
+                    if col['kind'] == 'numeric':
+                        values = _read_block(f, col['offset'], col['dtype'], rows)
+                        if col.get('is_index'):
+                            index = pd.Index(values)
+                        else:
+                            columns[col['name']] = values
+                    elif col['kind'] == 'strings':
+                        codes = _read_block(f, col['offset'], '<i4', rows)
+                        if col.get('pandas_dtype') == 'category':
+                            columns[col['name']] = pd.Categorical.from_codes(codes, col['dictionary'])
+                            continue
+                        # 末尾追加None，使缺失值编码-1直接映射为空值
+                        dictionary = np.array(col['dictionary'] + [None], dtype=object)
+                        columns[col['name']] = pd.Series(dictionary[codes], dtype=col.get('pandas_dtype'))
+                    else:
+                        self.logger.warning(f"Unknown column kind in snapshot {snap_path}: {col['kind']}")
+                        return None
+        except (OSError, ValueError, TypeError) as e:
+            self.logger.warning(f"Failed to read snapshot {snap_path}: {e}")
+            return None
+
+        df = pd.DataFrame(columns, copy=False)
+        df.index = index
+        return df
+
+    def save(self, source_path: Path, df: pd.DataFrame) -> bool:
+        """Write a snapshot for the given source file, returns False if unsupported"""
+        columns = []
+        blocks = []
+
+        # 清理空行后索引可能不连续，此时单独保存索引以保持行标签一致
+        if not df.index.equals(pd.RangeIndex(len(df))):
+            if not pd.api.types.is_integer_dtype(df.index.dtype):
+                return False
+            index_values = np.ascontiguousarray(df.index.to_numpy(), dtype='<i8')
+            columns.append({'name': '__index__', 'kind': 'numeric', 'dtype': '<i8', 'is_index': True})
+            blocks.append(index_values.tobytes())
+
+        for name in df.columns:
+            series = df[name]
+            if pd.api.types.is_bool_dtype(series.dtype) or pd.api.types.is_numeric_dtype(series.dtype) \
+                    or pd.api.types.is_datetime64_dtype(series.dtype):
+                values = np.ascontiguousarray(series.to_numpy())
+                values = values.astype(values.dtype.newbyteorder('<'), copy=False)
+                columns.append({'name': str(name), 'kind': 'numeric', 'dtype': values.dtype.str})
+                blocks.append(values.tobytes())
+            elif isinstance(series.dtype, pd.CategoricalDtype):
+                categories = series.cat.categories
+                if not all(isinstance(v, str) for v in categories):
+                    return False
+                columns.append({
+                    'name': str(name),
+                    'kind': 'strings',
+                    'pandas_dtype': 'category',
+                    'dictionary': list(categories)
+                })
+                blocks.append(series.cat.codes.to_numpy().astype('<i4').tobytes())
+            elif self._is_string_column(series):
+                codes, uniques = pd.factorize(series, use_na_sentinel=True)
+                columns.append({
+                    'name': str(name),
+                    'kind': 'strings',
+                    'pandas_dtype': str(series.dtype),
+                    'dictionary': [str(v) for v in uniques]
+                })
+                blocks.append(codes.astype('<i4').tobytes())
+            else:
+                self.logger.debug(f"Column {name} of {source_path.name} cannot be snapshotted")
+                return False
+
+        header = {
+            'version': SNAPSHOT_VERSION,
+            'source': source_fingerprint(source_path),
+            'rows': int(len(df)),
+            'columns': columns
+        }
+
+        # 偏移量依赖头部长度，而头部又包含偏移量，迭代直到稳定
+        offsets = [0] * len(blocks)
+        while True:
+            for col, offset in zip(columns, offsets):
+                col['offset'] = offset
+            header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+            position = _align(_HEADER_PREFIX.size + len(header_bytes))
+            new_offsets = []
+            for block in blocks:
+                new_offsets.append(position)
+                position = _align(position + len(block))
+            if new_offsets == offsets:
+                break
+            offsets = new_offsets
+
+        snap_path = self.snapshot_path(source_path)
+        tmp_path = snap_path.with_name(f"{snap_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+        try:
+            self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                f.write(_HEADER_PREFIX.pack(SNAPSHOT_MAGIC, len(header_bytes)))
+                f.write(header_bytes)
+                for offset, block in zip(offsets, blocks):
+                    f.write(b'\0' * (offset - f.tell()))
+                    f.write(block)
+            os.replace(tmp_path, snap_path)
+        except OSError as e:
+            self.logger.warning(f"Failed to write snapshot {snap_path}: {e}")
+            try:
+                tmp_path.unlink()
+            except OSError:
+                pass
+            return False
+
+        self.logger.info(f"Wrote snapshot {snap_path.name} ({len(df)} records)")
+        return True
+
+    def remove(self, source_path: Path):
+        """Delete the snapshot of a source file if present"""
+        snap_path = self.snapshot_path(source_path)
+        try:
+            snap_path.unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            # 文件仍被占用（如Windows下被其他进程打开）时保留，源文件指纹不匹配时不会再被加载
+            self.logger.warning(f"Failed to remove snapshot {snap_path}: {e}")
+
+    @staticmethod
+    def _is_string_column(series: pd.Series) -> bool:
+        if pd.api.types.is_string_dtype(series.dtype) and not pd.api.types.is_object_dtype(series.dtype):
+            return True
+        if pd.api.types.is_object_dtype(series.dtype):
+            return all(isinstance(v, str) for v in series.dropna())
+        return False
@@ -0,0 +1,82 @@
+"""
+In-memory status of the rainfall data directory
+"""
+import logging
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List
+
+from .watcher import DataDirectoryWatcher, FileChange
+
+
+class DataStatusTracker:
+    """Exact per-file record counts, sizes and modification times
+
+    Kept current by a DataDirectoryWatcher: only added or modified files
+    are recounted (from their snapshot header when it is fresh), so
+    reading the status never touches the filesystem while the watcher is
+    running.
+    """
+
+    def __init__(self, reader, watcher: DataDirectoryWatcher):
+        self.reader = reader
+        self.watcher = watcher
+        # 文件路径 -> 文件状态
+        self.files: Dict[Path, Dict[str, Any]] = {}
+        self.last_updated = None
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+        watcher.subscribe(self.apply_changes)
+
+    def _describe(self, path: Path) -> Dict[str, Any]:
+        stat = path.stat()
+        return {
+            'name': path.stem,
+            'type': path.suffix,
+            'records': self.reader.count_records(path),
+            'size': stat.st_size,
+            'modified': datetime.fromtimestamp(stat.st_mtime).isoformat(timespec='seconds')
+        }
+
+    def apply_changes(self, changes: List[FileChange]):
+        """Update the status of changed files"""
+        for event, path in changes:
+            if event == 'deleted':
+                with self._lock:
+                    self.files.pop(path, None)
+                continue
+
+            try:
+                info = self._describe(path)
+            except OSError as e:
+                # 文件在扫描后被删除，等待下一次扫描的删除事件
+                self.logger.warning(f"Cannot read status of {path.name}: {e}")
+                continue
+            with self._lock:
+                self.files[path] = info
+
+        with self._lock:
+            self.last_updated = time.time()
+
+    def summary(self) -> Dict[str, Any]:
+        """Get directory totals and per-file details"""
+        if not self.watcher.running:
+            # 未启动后台监控时按需扫描一次（只重新统计有变化的文件）
+            self.watcher.scan()
+
+        with self._lock:
+            details = sorted((dict(info) for info in self.files.values()), key=lambda info: info['name'])
+            last_updated = self.last_updated
+
+        return {
+            'files_found': len(details),
+            'files': [info['name'] for info in details],
+            'total_records': sum(info['records'] or 0 for info in details),
+            'total_size': sum(info['size'] for info in details),
+            'file_types': sorted({info['type'] for info in details}),
+            'file_details': details,
+            'last_updated': datetime.fromtimestamp(last_updated).isoformat(timespec='seconds') if last_updated else None,
+            'watching': self.watcher.running
+        }
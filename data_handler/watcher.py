@@ -0,0 +1,165 @@
+"""
+Change detection for the rainfall data directory
+"""
+import logging
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+
+DATA_SUFFIXES = ('.xlsx', '.txt', '.csv')
+
+# (事件类型, 文件路径)，事件类型为 'added' / 'modified' / 'deleted'
+FileChange = Tuple[str, Path]
+
+
+class _WakeHandler(FileSystemEventHandler):
+    def __init__(self, wake: threading.Event):
+        super().__init__()
+        self.wake = wake
+
+    def on_any_event(self, event):
+        self.wake.set()
+
+
+class DataDirectoryWatcher:
+    """Detect added, modified and deleted data files
+
+    Changes are found by comparing each file's modification time and size
+    with the previous scan. Scans run in a background thread every
+    ``interval`` seconds; when the optional ``watchdog`` package is
+    installed, native filesystem events (inotify etc.) trigger a scan
+    right away and polling only serves as a safety net.
+    """
+
+    def __init__(self, data_dir: Path, interval: float = 2.0, suffixes=DATA_SUFFIXES,
+                 debounce: float = 0.2):
+        self.data_dir = Path(data_dir)
+        self.interval = max(0.1, float(interval))
+        self.suffixes = tuple(s.lower() for s in suffixes)
+        self.debounce = debounce
+        # 路径 -> (mtime_ns, size)
+        self.files: Dict[Path, Tuple[int, int]] = {}
+        self._subscribers: List[Callable[[List[FileChange]], None]] = []
+        self._scan_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._observer = None
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def native(self) -> bool:
+        """Whether native filesystem events are in use"""
+        return self._observer is not None
+
+    def subscribe(self, callback: Callable[[List[FileChange]], None]):
+        """Register a callback receiving the list of changes of each scan"""
+        self._subscribers.append(callback)
+
+    def _list_files(self) -> Dict[Path, Tuple[int, int]]:
+        files = {}
+        try:
+            entries = list(self.data_dir.iterdir())
+        except OSError:
+            return files
+
+        for path in entries:
+            if path.suffix.lower() not in self.suffixes:
+                continue
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            if path.is_file():
+                files[path] = (stat.st_mtime_ns, stat.st_size)
+        return files
+
+    def scan(self) -> List[FileChange]:
+        """Compare the directory with the previous scan and notify subscribers"""
+        with self._scan_lock:
+            current = self._list_files()
+            changes: List[FileChange] = []
+
+            for path, signature in current.items():
+                previous = self.files.get(path)
+                if previous is None:
+                    changes.append(('added', path))
+                elif previous != signature:
+                    changes.append(('modified', path))
+            for path in self.files:
+                if path not in current:
+                    changes.append(('deleted', path))
+
+            self.files = current
+
+            if changes:
+                changes.sort(key=lambda change: change[1].name)
+                for callback in self._subscribers:
+                    try:
+                        callback(changes)
+                    except Exception as e:
+                        self.logger.error(f"Error in data change callback: {e}")
+
+            return changes
+
+    def start(self):
+        """Run the initial scan and start watching in the background (idempotent)"""
+        if self.running:
+            return
+
+        self._stopped.clear()
+        if Observer is not None and self.data_dir.exists():
+            try:
+                self._observer = Observer()
+                self._observer.schedule(_WakeHandler(self._wake), str(self.data_dir), recursive=False)
+                self._observer.start()
+            except Exception as e:
+                self.logger.warning(f"Native file watching unavailable, polling instead: {e}")
+                self._observer = None
+
+        self._thread = threading.Thread(target=self._run, name='rainfall-data-watcher', daemon=True)
+        self._thread.start()
+        self.logger.info(f"Watching {self.data_dir} ({'native events' if self.native else 'polling'})")
+
+    def _run(self):
+        # 有原生事件时轮询只作兜底，间隔放宽
+        timeout = self.interval * 15 if self.native else self.interval
+        while not self._stopped.is_set():
+            try:
+                self.scan()
+            except Exception as e:
+                self.logger.error(f"Error scanning data directory: {e}")
+
+            woke = self._wake.wait(timeout)
+            if woke:
+                # 合并同一次写入产生的多个事件
+                self._stopped.wait(self.debounce)
+                self._wake.clear()
+
+    def stop(self):
+        """Stop background watching"""
+        self._stopped.set()
+        self._wake.set()
+        if self._observer is not None:
+            try:
+                self._observer.stop()
+                self._observer.join(timeout=5)
+            except Exception:
+                pass
+            self._observer = None
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self._wake.clear()
@@ -36,7 +36,9 @@ except ImportError:
     sys.exit(1)
 
 from config.settings import settings
+from ai_service.clients import client_registry
 from mcp_server.tools import rainfall_tools
+from mcp_server.progress import STREAMING_TOOLS, make_progress_callback
 
 
 class RainfallMCPServer:
@@ -91,6 +93,9 @@ class RainfallMCPServer:
             if name == tool_func.__name__:
                 try:
                     self.logger.info(f"Executing tool: {name} with arguments: {arguments}")
+                    if name in STREAMING_TOOLS:
+                        # 客户端请求了进度时，AI分析文本边生成边推送
+                        arguments = {**arguments, 'progress': make_progress_callback(self.server)}
                     result = await tool_func(**arguments)
                     return result
                 except Exception as e:
@@ -124,6 +129,9 @@ class RainfallMCPServer:
         else:
             self.logger.warning("DeepSeek API key not found")
 
+        # 监控数据目录，站点文件更新后自动失效对应缓存
+        self.tools.start_watching()
+
         try:
             async with stdio_server() as streams:
                 await self.server.run(
@@ -136,6 +144,10 @@ class RainfallMCPServer:
         except Exception as e:
             self.logger.error(f"Server error: {e}")
             raise
+        finally:
+            self.tools.stop_watching()
+            # 关闭共享的AI客户端连接池
+            await client_registry.aclose()
 
     async def run_network(self, host: str = "0.0.0.0", port: int = 8080):
         """Run server with network transport (for LAN access)"""
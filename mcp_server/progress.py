@@ -0,0 +1,56 @@
+"""
+MCP progress notifications for streamed AI analyses
+"""
+import logging
+from typing import Any, Awaitable, Callable, Optional
+
+
+# 以文本片段作为进度消息推送的工具
+STREAMING_TOOLS = {'analyze_rainfall', 'analyze_all_rainfall_data'}
+
+logger = logging.getLogger(__name__)
+
+
+def _progress_token(meta: Any):
+    if meta is None:
+        return None
+    if isinstance(meta, dict):
+        return meta.get('progressToken', meta.get('progress_token'))
+    return getattr(meta, 'progressToken', None) or getattr(meta, 'progress_token', None)
+
+
+def make_progress_callback(server) -> Optional[Callable[[str], Awaitable[None]]]:
+    """Build a callback sending AI text deltas as progress notifications
+
+    Returns None when the current request carries no progress token, so
+    the tool then runs without streaming. Progress is the number of
+    characters generated so far and each notification's message is the
+    new text; MCP versions without a message field only get the count.
+    """
+    try:
+        context = server.request_context
+    except (LookupError, AttributeError):
+        return None
+
+    token = _progress_token(getattr(context, 'meta', None))
+    if token is None:
+        return None
+
+    session = context.session
+    state = {'received': 0, 'with_message': True}
+
+    async def report(delta: str):
+        state['received'] += len(delta)
+        try:
+            if state['with_message']:
+                try:
+                    await session.send_progress_notification(token, state['received'], message=delta)
+                    return
+                except TypeError:
+                    state['with_message'] = False
+            await session.send_progress_notification(token, state['received'])
+        except Exception as e:
+            # 进度通知失败不影响分析本身
+            logger.debug(f"Failed to send progress notification: {e}")
+
+    return report
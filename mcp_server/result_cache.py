@@ -0,0 +1,99 @@
+"""
+Cache of serialized MCP tool results
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class ToolResultCache:
+    """LRU cache of tool outputs validated against data file versions
+
+    Entries are keyed by the tool name and its normalized arguments, and
+    remember the versions of the data files they were computed from. A
+    lookup only hits when the entry is younger than ``ttl`` seconds and
+    the caller's current versions still match, so changed data files are
+    never served from the cache. Least recently used entries are dropped
+    beyond ``max_entries`` or ``max_bytes`` of serialized text.
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 32 * 1024 * 1024, ttl: float = 300.0):
+        self.max_entries = max(0, int(max_entries))
+        self.max_bytes = max(0, int(max_bytes))
+        self.ttl = ttl
+        # 键 -> (过期时间, 数据版本, 结果, 字节数)
+        self._entries: 'OrderedDict[Hashable, Tuple[float, Any, Any, int]]' = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl > 0
+
+    @staticmethod
+    def make_key(tool: str, **arguments) -> Tuple[str, str]:
+        """Build a cache key from a tool name and its arguments
+
+        Arguments are serialized with sorted keys, so the same call made
+        with keywords in any order maps to one entry, while values that
+        would be echoed differently in the output (95 vs 95.0) do not.
+        """
+        return tool, json.dumps(arguments, sort_keys=True, ensure_ascii=False, default=str)
+
+    def get(self, key: Hashable, versions: Any) -> Optional[Any]:
+        """Get a cached result computed from the given data versions"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, cached_versions, result, _ = entry
+            if expires_at < time.monotonic() or cached_versions != versions:
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key: Hashable, versions: Any, result: Any, size: int = 0):
+        """Store a result, ``size`` being its serialized length in bytes"""
+        if not self.enabled or size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, versions, result, size)
+            self.total_bytes += size
+            while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: Hashable):
+        entry = self._entries.pop(key)
+        self.total_bytes -= entry[3]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Get cache counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.total_bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else None
+            }
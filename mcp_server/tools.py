@@ -2,27 +2,92 @@
 MCP tools for rainfall data query and analysis
 """
 import asyncio
+import functools
 import json
 import logging
-from typing import Dict, Any, List, Optional
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 
+import pandas as pd
 from mcp.types import TextContent
 
 from config.settings import settings
 from data_handler.reader import RainfallDataReader
 from data_handler.processor import RainfallDataProcessor
+from data_handler.schema import format_dates
+from data_handler.status import DataStatusTracker
+from data_handler.watcher import DataDirectoryWatcher
 from ai_service.analyzer import get_analyzer
+from .result_cache import ToolResultCache
+
+
+# 接收AI分析文本片段的异步回调
+ProgressCallback = Optional[Callable[[str], Awaitable[None]]]
+
+# 全数据分析未提供问题时使用的默认问题
+ALL_DATA_QUESTIONS = {
+    'general': "请对所有降雨监测数据进行综合分析，包括整体趋势、地区差异、季节性变化等",
+    'regional': "请分析不同地区的降雨模式和差异",
+    'comparison': "请比较分析各个监测站点的降雨数据特征和差异",
+    'trends': "请分析整体降雨趋势并预测未来几个月的变化",
+    'summary': "请生成所有监测数据的综合摘要报告"
+}
+
+# 分站点分析时各分析类型关注的重点
+STATION_FOCUS = {
+    'general': "降雨总量、季节分布、极端事件和异常情况",
+    'regional': "该地区的降雨模式特点",
+    'comparison': "便于与其他站点比较的关键特征（总量、强度、雨季时间）",
+    'trends': "月度变化趋势和可能的未来走势",
+    'summary': "主要统计指标和重要发现"
+}
 
 
 class RainfallTools:
     """Collection of MCP tools for rainfall data operations"""
 
     def __init__(self):
-        self.data_reader = RainfallDataReader(settings.data_dir)
-        self.data_processor = RainfallDataProcessor()
+        self.data_reader = RainfallDataReader(
+            settings.data_dir,
+            settings.snapshot_dir,
+            max_workers=settings.data_config['load_workers'],
+            cache_max_bytes=int(settings.data_config['cache_max_mb'] * 1024 * 1024),
+            cache_policy=settings.data_config['cache_policy'],
+            pinned_datasets=settings.data_config['pinned_datasets']
+        )
+        self.data_processor = RainfallDataProcessor(settings.data_config['exact_quantile_limit'])
+        # CPU密集的数据处理在线程池中执行，避免阻塞事件循环上的AI请求
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.data_config['compute_workers'],
+            thread_name_prefix='rainfall-compute'
+        )
+        # 数据目录监控，驱动数据状态（文件记录数、大小、修改时间）的增量更新
+        self.watcher = DataDirectoryWatcher(settings.data_dir, settings.data_config['watch_interval'])
+        self.data_status = DataStatusTracker(self.data_reader, self.watcher)
+        # 文件变化时只失效受影响站点的缓存、索引和汇总表
+        self.watcher.subscribe(self._on_data_change)
+        # 确定性工具输出的缓存，按参数和数据文件版本命中
+        self.result_cache = ToolResultCache(
+            max_entries=settings.data_config['result_cache_entries'],
+            max_bytes=int(settings.data_config['result_cache_max_mb'] * 1024 * 1024),
+            ttl=settings.data_config['result_cache_ttl']
+        )
         self.logger = logging.getLogger(__name__)
 
+    def _on_data_change(self, changes):
+        stale = self.data_reader.apply_changes(changes)
+        if stale and settings.data_config['rewarm_on_change']:
+            # 在后台重新加载原本已缓存的站点，下一次查询无需冷启动
+            self.executor.submit(self.data_reader.rewarm, stale)
+
+    def start_watching(self):
+        """Start background monitoring of the data directory (status and cache invalidation)"""
+        self.watcher.start()
+
+    def stop_watching(self):
+        self.watcher.stop()
+
     def get_tool_definitions(self) -> List[Dict[str, Any]]:
         """Get list of all available MCP tool definitions"""
         return [
@@ -80,6 +145,11 @@ class RainfallTools:
                             "type": "string",
                             "description": "AI model to use for analysis",
                             "default": "deepseek-chat"
+                        },
+                        "use_cache": {
+                            "type": "boolean",
+                            "description": "Reuse a cached AI response for an identical request on unchanged data",
+                            "default": True
                         }
                     },
                     "required": ["filename"]
@@ -99,6 +169,11 @@ class RainfallTools:
                             "type": "boolean",
                             "description": "Include AI-generated analysis",
                             "default": False
+                        },
+                        "use_cache": {
+                            "type": "boolean",
+                            "description": "Reuse a cached AI response for an identical request on unchanged data",
+                            "default": True
                         }
                     },
                     "required": ["filename"]
@@ -174,6 +249,11 @@ class RainfallTools:
                             "type": "boolean",
                             "description": "Include AI-powered comparison analysis",
                             "default": True
+                        },
+                        "use_cache": {
+                            "type": "boolean",
+                            "description": "Reuse a cached AI response for an identical request on unchanged data",
+                            "default": True
                         }
                     },
                     "required": ["filename", "period1_start", "period1_end", "period2_start", "period2_end"]
@@ -199,6 +279,17 @@ class RainfallTools:
                             "type": "string",
                             "description": "AI model to use for analysis",
                             "default": "deepseek-chat"
+                        },
+                        "use_cache": {
+                            "type": "boolean",
+                            "description": "Reuse a cached AI response for an identical request on unchanged data",
+                            "default": True
+                        },
+                        "mode": {
+                            "type": "string",
+                            "enum": ["combined", "map_reduce"],
+                            "description": "combined: one prompt with all stations; map_reduce: analyze stations concurrently, then synthesize",
+                            "default": "combined"
                         }
                     },
                     "required": []
@@ -206,11 +297,65 @@ class RainfallTools:
             }
         ]
 
+    async def _run_blocking(self, func, *args):
+        """Run CPU-bound data work in the compute pool so the event loop stays free for I/O"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args))
+
+    def _cached_result(self, key, versions) -> Optional[List[TextContent]]:
+        cached = self.result_cache.get(key, versions)
+        return list(cached) if cached is not None else None
+
+    def _cache_result(self, key, versions, result: List[TextContent]) -> List[TextContent]:
+        """Store a successful tool result and return it"""
+        self.result_cache.put(key, versions, tuple(result), sum(len(item.text.encode('utf-8')) for item in result))
+        return result
+
+    def _all_data_versions(self, filenames: List[str]) -> tuple:
+        """Get the versions of several data files in a stable order"""
+        return tuple(sorted(self.data_reader.data_version(filename) or filename for filename in filenames))
+
+    def _build_data_summary(self, filename: str) -> Dict[str, Any]:
+        """Build data summary merged with the detailed statistics report"""
+        data_summary = self.data_reader.get_data_summary(filename)
+        if not data_summary:
+            return {}
+
+        df = self.data_reader.read_data_file(filename)
+        if df is not None:
+            detailed_summary = self.data_processor.generate_summary_report(
+                df, self.data_reader.get_rollup(filename, df)
+            )
+            data_summary.update(detailed_summary)
+        return data_summary
+
+    def _compare_period_statistics(self, filename: str, period1_start: str, period1_end: str,
+                                   period2_start: str, period2_end: str):
+        """Generate statistics for two periods, or None if either has no data"""
+        filters1 = {"start_date": period1_start, "end_date": period1_end}
+        filters2 = {"start_date": period2_start, "end_date": period2_end}
+
+        df1 = self.data_reader.query_data(filename, filters1)
+        df2 = self.data_reader.query_data(filename, filters2)
+
+        if df1.empty or df2.empty:
+            return None
+
+        # 时间分析从站点汇总表中截取对应日期范围
+        rollup = self.data_reader.get_rollup(filename)
+        stats1 = self.data_processor.generate_summary_report(
+            df1, rollup.between(period1_start, period1_end) if rollup else None
+        )
+        stats2 = self.data_processor.generate_summary_report(
+            df2, rollup.between(period2_start, period2_end) if rollup else None
+        )
+        return stats1, stats2
+
     async def query_rainfall(self, filename: str, filters: Dict[str, Any] = None, limit: int = 100) -> List[TextContent]:
         """Query rainfall data with optional filters"""
         try:
             # 查询数据
-            df = self.data_reader.query_data(filename, filters)
+            df = await self._run_blocking(self.data_reader.query_data, filename, filters)
 
             if df.empty:
                 return [TextContent(
@@ -229,10 +374,8 @@ class RainfallTools:
             # 转换为JSON格式，处理日期序列化
             df_copy = df.copy()
             for col in df_copy.columns:
-                if df_copy[col].dtype == 'datetime64[ns]':
-                    df_copy[col] = df_copy[col].dt.strftime('%Y-%m-%d')
-                elif 'datetime' in str(df_copy[col].dtype):
-                    df_copy[col] = df_copy[col].astype(str)
+                if pd.api.types.is_datetime64_any_dtype(df_copy[col].dtype):
+                    df_copy[col] = format_dates(df_copy[col])
 
             result_data = {
                 "filename": filename,
@@ -256,25 +399,25 @@ class RainfallTools:
             )]
 
     async def analyze_rainfall(self, filename: str, question: str = None,
-                             analysis_type: str = "general", model_name: str = "deepseek-chat") -> List[TextContent]:
-        """Perform AI-powered analysis of rainfall data"""
+                             analysis_type: str = "general", model_name: str = "deepseek-chat",
+                             use_cache: bool = True, progress: ProgressCallback = None) -> List[TextContent]:
+        """Perform AI-powered analysis of rainfall data
+
+        ``progress`` receives the analysis text as it is generated (used for
+        MCP progress notifications and the streaming web endpoint).
+        """
         try:
-            # 获取数据摘要
-            data_summary = self.data_reader.get_data_summary(filename)
+            # 获取数据摘要和处理后的统计数据
+            data_summary = await self._run_blocking(self._build_data_summary, filename)
             if not data_summary:
                 return [TextContent(
                     type="text",
                     text=f"No data found for file '{filename}'"
                 )]
 
-            # 获取处理后的统计数据
-            df = self.data_reader.read_data_file(filename)
-            if df is not None:
-                detailed_summary = self.data_processor.generate_summary_report(df)
-                data_summary.update(detailed_summary)
-
-            # 使用AI进行分析
-            async with get_analyzer(model_name) as analyzer:
+            # 使用AI进行分析，相同问题和未变化的数据直接复用缓存的回答
+            data_versions = self.data_reader.data_version(filename)
+            async with get_analyzer(model_name, use_cache, data_versions, progress) as analyzer:
                 if analysis_type == "trends":
                     result = await analyzer.predict_trends(data_summary)
                 elif analysis_type == "summary":
@@ -329,28 +472,32 @@ class RainfallTools:
                 text=json.dumps(error_response, ensure_ascii=False, indent=2)
             )]
 
-    async def rainfall_summary(self, filename: str, include_ai_analysis: bool = False) -> List[TextContent]:
+    async def rainfall_summary(self, filename: str, include_ai_analysis: bool = False,
+                               use_cache: bool = True) -> List[TextContent]:
         """Get statistical summary of rainfall data"""
+        versions = self.data_reader.data_version(filename)
+        # AI分析结果不确定，只缓存纯统计摘要
+        cache_key = None
+        if not include_ai_analysis:
+            cache_key = self.result_cache.make_key('rainfall_summary', filename=filename)
+            cached = self._cached_result(cache_key, versions)
+            if cached is not None:
+                return cached
+
         try:
-            # 获取数据摘要
-            data_summary = self.data_reader.get_data_summary(filename)
+            # 获取数据摘要和详细统计
+            data_summary = await self._run_blocking(self._build_data_summary, filename)
             if not data_summary:
                 return [TextContent(
                     type="text",
                     text=f"No data found for file '{filename}'"
                 )]
 
-            # 获取详细统计
-            df = self.data_reader.read_data_file(filename)
-            if df is not None:
-                detailed_stats = self.data_processor.generate_summary_report(df)
-                data_summary.update(detailed_stats)
-
             # 如果需要AI分析
             ai_analysis = None
             if include_ai_analysis:
                 try:
-                    async with get_analyzer() as analyzer:
+                    async with get_analyzer(use_cache=use_cache, data_versions=versions) as analyzer:
                         ai_result = await analyzer.generate_summary_report(data_summary)
                         if ai_result.get("success"):
                             ai_analysis = ai_result.get("summary")
@@ -363,10 +510,13 @@ class RainfallTools:
                 "ai_analysis": ai_analysis
             }
 
-            return [TextContent(
+            result = [TextContent(
                 type="text",
                 text=json.dumps(result_data, ensure_ascii=False, indent=2)
             )]
+            if cache_key is not None:
+                self._cache_result(cache_key, versions, result)
+            return result
 
         except Exception as e:
             self.logger.error(f"Error generating summary: {e}")
@@ -386,6 +536,12 @@ class RainfallTools:
                     text="No rainfall datasets found in the data directory."
                 )]
 
+            cache_key = self.result_cache.make_key('list_datasets', include_summary=include_summary)
+            versions = self._all_data_versions(available_files)
+            cached = self._cached_result(cache_key, versions)
+            if cached is not None:
+                return cached
+
             datasets_info = {
                 "available_datasets": len(available_files),
                 "datasets": []
@@ -395,15 +551,15 @@ class RainfallTools:
                 dataset_info = {"filename": filename}
 
                 if include_summary:
-                    summary = self.data_reader.get_data_summary(filename)
+                    summary = await self._run_blocking(self.data_reader.get_data_summary, filename)
                     dataset_info["summary"] = summary
 
                 datasets_info["datasets"].append(dataset_info)
 
-            return [TextContent(
+            return self._cache_result(cache_key, versions, [TextContent(
                 type="text",
                 text=json.dumps(datasets_info, ensure_ascii=False, indent=2)
-            )]
+            )])
 
         except Exception as e:
             self.logger.error(f"Error listing datasets: {e}")
@@ -414,37 +570,45 @@ class RainfallTools:
 
     async def extreme_events(self, filename: str, threshold_percentile: float = 95, limit: int = 10) -> List[TextContent]:
         """Detect extreme rainfall events"""
+        cache_key = self.result_cache.make_key(
+            'extreme_events', filename=filename, threshold_percentile=threshold_percentile, limit=limit
+        )
+        versions = self.data_reader.data_version(filename)
+        cached = self._cached_result(cache_key, versions)
+        if cached is not None:
+            return cached
+
         try:
-            df = self.data_reader.read_data_file(filename)
+            df = await self._run_blocking(self.data_reader.read_data_file, filename)
             if df is None or df.empty:
                 return [TextContent(
                     type="text",
                     text=f"No data found for file '{filename}'"
                 )]
 
-            events = self.data_processor.detect_extreme_events(df, threshold_percentile)
+            # 只物化前limit个事件
+            total_events, limited_events = await self._run_blocking(
+                self.data_processor.find_extreme_events, df, threshold_percentile, limit
+            )
 
-            if not events:
+            if not total_events:
                 return [TextContent(
                     type="text",
                     text=f"No extreme events found with threshold {threshold_percentile}th percentile"
                 )]
 
-            # 限制返回数量
-            limited_events = events[:limit]
-
             result_data = {
                 "filename": filename,
                 "threshold_percentile": threshold_percentile,
-                "total_extreme_events": len(events),
+                "total_extreme_events": total_events,
                 "events_returned": len(limited_events),
                 "extreme_events": limited_events
             }
 
-            return [TextContent(
+            return self._cache_result(cache_key, versions, [TextContent(
                 type="text",
                 text=json.dumps(result_data, ensure_ascii=False, indent=2)
-            )]
+            )])
 
         except Exception as e:
             self.logger.error(f"Error detecting extreme events: {e}")
@@ -454,25 +618,41 @@ class RainfallTools:
             )]
 
     async def compare_periods(self, filename: str, period1_start: str, period1_end: str,
-                            period2_start: str, period2_end: str, include_ai_analysis: bool = True) -> List[TextContent]:
+                            period2_start: str, period2_end: str, include_ai_analysis: bool = True,
+                            use_cache: bool = True) -> List[TextContent]:
         """Compare rainfall data between different time periods"""
-        try:
-            # 查询两个时期的数据
-            filters1 = {"start_date": period1_start, "end_date": period1_end}
-            filters2 = {"start_date": period2_start, "end_date": period2_end}
-
-            df1 = self.data_reader.query_data(filename, filters1)
-            df2 = self.data_reader.query_data(filename, filters2)
+        periods = dict(
+            filename=filename, period1_start=period1_start, period1_end=period1_end,
+            period2_start=period2_start, period2_end=period2_end
+        )
+        versions = self.data_reader.data_version(filename)
+        cache_key = None
+        if not include_ai_analysis:
+            cache_key = self.result_cache.make_key('compare_periods', **periods)
+            cached = self._cached_result(cache_key, versions)
+            if cached is not None:
+                return cached
 
-            if df1.empty or df2.empty:
+        try:
+            # 查询并统计两个时期的数据；带AI分析时仍复用缓存的统计部分
+            stats_key = self.result_cache.make_key('compare_periods:statistics', **periods)
+            period_stats = self.result_cache.get(stats_key, versions)
+            if period_stats is None:
+                period_stats = await self._run_blocking(
+                    self._compare_period_statistics, filename,
+                    period1_start, period1_end, period2_start, period2_end
+                )
+                if period_stats is not None:
+                    self.result_cache.put(stats_key, versions, period_stats,
+                                          len(json.dumps(period_stats, ensure_ascii=False).encode('utf-8')))
+
+            if period_stats is None:
                 return [TextContent(
                     type="text",
                     text="One or both periods contain no data"
                 )]
 
-            # 生成两个时期的统计数据
-            stats1 = self.data_processor.generate_summary_report(df1)
-            stats2 = self.data_processor.generate_summary_report(df2)
+            stats1, stats2 = period_stats
 
             comparison_data = {
                 "filename": filename,
@@ -489,7 +669,7 @@ class RainfallTools:
             # 如果需要AI分析
             if include_ai_analysis:
                 try:
-                    async with get_analyzer() as analyzer:
+                    async with get_analyzer(use_cache=use_cache, data_versions=versions) as analyzer:
                         ai_result = await analyzer.compare_periods(
                             stats1, stats2,
                             f"Period 1 ({period1_start} to {period1_end})",
@@ -500,10 +680,13 @@ class RainfallTools:
                 except Exception as e:
                     self.logger.warning(f"AI comparison failed: {e}")
 
-            return [TextContent(
+            result = [TextContent(
                 type="text",
                 text=json.dumps(comparison_data, ensure_ascii=False, indent=2)
             )]
+            if cache_key is not None:
+                self._cache_result(cache_key, versions, result)
+            return result
 
         except Exception as e:
             self.logger.error(f"Error comparing periods: {e}")
@@ -514,11 +697,19 @@ class RainfallTools:
 
     async def analyze_all_rainfall_data(self, question: str = None,
                                       analysis_type: str = "general",
-                                      model_name: str = "deepseek-chat") -> List[TextContent]:
-        """Perform AI-powered analysis on all available rainfall data files combined"""
+                                      model_name: str = "deepseek-chat",
+                                      use_cache: bool = True, progress: ProgressCallback = None,
+                                      mode: str = "combined") -> List[TextContent]:
+        """Perform AI-powered analysis on all available rainfall data files combined
+
+        ``mode="map_reduce"`` analyzes every station separately and
+        concurrently, then combines the station analyses in one synthesis
+        call; stations whose analysis fails are reported without failing
+        the whole request.
+        """
         try:
             # 获取所有数据的综合摘要
-            combined_summary = self.data_reader.get_combined_data_summary()
+            combined_summary = await self._run_blocking(self.data_reader.get_combined_data_summary)
 
             if not combined_summary or combined_summary.get('total_files', 0) == 0:
                 return [TextContent(
@@ -526,23 +717,48 @@ class RainfallTools:
                     text="No data files found for analysis"
                 )]
 
+            data_overview = {
+                "total_files": combined_summary.get("total_files", 0),
+                "total_records": combined_summary.get("total_records", 0),
+                "date_range": combined_summary.get("date_range"),
+                "regions": combined_summary.get("all_regions", []),
+                "rainfall_stats": combined_summary.get("rainfall_stats", {}),
+                "file_summaries": combined_summary.get("file_summaries", {})
+            }
+
+            if mode == "map_reduce":
+                response_data = await self._analyze_stations(
+                    combined_summary, question, analysis_type, model_name, use_cache, progress
+                )
+                response_data.update({
+                    "analysis_type": analysis_type,
+                    "model_used": model_name,
+                    "data_scope": "all_files",
+                    "data_overview": data_overview
+                })
+                return [TextContent(
+                    type="text",
+                    text=json.dumps(response_data, ensure_ascii=False, indent=2)
+                )]
+
             # 使用AI进行分析
-            async with get_analyzer(model_name) as analyzer:
+            data_versions = self._all_data_versions(self.data_reader.get_available_files())
+            async with get_analyzer(model_name, use_cache, data_versions, progress) as analyzer:
                 if analysis_type == "trends":
                     result = await analyzer.predict_trends(combined_summary)
                 elif analysis_type == "summary":
                     result = await analyzer.generate_summary_report(combined_summary)
                 elif analysis_type == "regional":
                     # 构建区域分析的问题
-                    regional_question = question or "请分析不同地区的降雨模式和差异"
+                    regional_question = question or ALL_DATA_QUESTIONS['regional']
                     result = await analyzer.analyze_data(combined_summary, regional_question)
                 elif analysis_type == "comparison":
                     # 构建比较分析的问题
-                    comparison_question = question or "请比较分析各个监测站点的降雨数据特征和差异"
+                    comparison_question = question or ALL_DATA_QUESTIONS['comparison']
                     result = await analyzer.analyze_data(combined_summary, comparison_question)
                 else:
                     # 通用分析
-                    general_question = question or "请对所有降雨监测数据进行综合分析，包括整体趋势、地区差异、季节性变化等"
+                    general_question = question or ALL_DATA_QUESTIONS['general']
                     result = await analyzer.analyze_data(combined_summary, general_question)
 
             if result.get("success"):
@@ -552,14 +768,7 @@ class RainfallTools:
                     "model_used": model_name,
                     "data_scope": "all_files",
                     "analysis": result.get("analysis") or result.get("summary") or result.get("prediction"),
-                    "data_overview": {
-                        "total_files": combined_summary.get("total_files", 0),
-                        "total_records": combined_summary.get("total_records", 0),
-                        "date_range": combined_summary.get("date_range"),
-                        "regions": combined_summary.get("all_regions", []),
-                        "rainfall_stats": combined_summary.get("rainfall_stats", {}),
-                        "file_summaries": combined_summary.get("file_summaries", {})
-                    }
+                    "data_overview": data_overview
                 }
             else:
                 response_data = {
@@ -581,6 +790,70 @@ class RainfallTools:
                 text=f"Error analyzing all rainfall data: {str(e)}"
             )]
 
+    async def _analyze_stations(self, combined_summary: Dict[str, Any], question: Optional[str],
+                                analysis_type: str, model_name: str, use_cache: bool,
+                                progress: ProgressCallback) -> Dict[str, Any]:
+        """Analyze each station concurrently, then synthesize the station analyses"""
+        filenames = self.data_reader.get_available_files()
+        focus = STATION_FOCUS.get(analysis_type, STATION_FOCUS['general'])
+        station_question = f"请简要分析该站点的{focus}，控制在300字以内。"
+        if question:
+            station_question += f"\n分析时请关注：{question}"
+
+        # 限制同时进行的站点分析数，避免突发请求触发API限流
+        limit = asyncio.Semaphore(settings.ai_service_config['map_concurrency'])
+
+        async def analyze_station(filename: str) -> Dict[str, Any]:
+            data_summary = await self._run_blocking(self._build_data_summary, filename)
+            if not data_summary:
+                return {"success": False, "error": "No data found"}
+            async with limit:
+                # 每个站点按自身的数据版本缓存，单个文件变化只需重新分析该站点
+                async with get_analyzer(model_name, use_cache, self.data_reader.data_version(filename)) as analyzer:
+                    return await analyzer.analyze_data(data_summary, station_question)
+
+        results = await asyncio.gather(*(analyze_station(filename) for filename in filenames), return_exceptions=True)
+
+        station_analyses = {}
+        failed_stations = {}
+        for filename, result in zip(filenames, results):
+            if isinstance(result, Exception):
+                failed_stations[filename] = str(result)
+            elif result.get("success"):
+                station_analyses[filename] = result["analysis"]
+            else:
+                failed_stations[filename] = result.get("error", "Analysis failed")
+        if failed_stations:
+            self.logger.warning(f"Station analyses failed: {failed_stations}")
+
+        if not station_analyses:
+            return {
+                "success": False,
+                "mode": "map_reduce",
+                "error": "All station analyses failed",
+                "failed_stations": failed_stations
+            }
+
+        # 汇总步骤：基于各站点的结论生成整体分析，失败时仍返回各站点结果
+        data_versions = self._all_data_versions(filenames)
+        async with get_analyzer(model_name, use_cache, data_versions, progress) as analyzer:
+            synthesis = await analyzer.synthesize_analyses(
+                station_analyses, combined_summary,
+                question or ALL_DATA_QUESTIONS.get(analysis_type, ALL_DATA_QUESTIONS['general']),
+                list(failed_stations)
+            )
+
+        response_data = {
+            "success": True,
+            "mode": "map_reduce",
+            "analysis": synthesis.get("analysis"),
+            "station_analyses": station_analyses,
+            "failed_stations": failed_stations
+        }
+        if not synthesis.get("success"):
+            response_data["synthesis_error"] = synthesis.get("error", "Synthesis failed")
+        return response_data
+
 
 # Global tools instance
 rainfall_tools = RainfallTools()
\ No newline at end of file
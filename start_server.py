@@ -18,7 +18,9 @@ from mcp.server.stdio import stdio_server
 from mcp.types import TextContent
 
 from config.settings import settings
+from ai_service.clients import client_registry
 from mcp_server.tools import rainfall_tools
+from mcp_server.progress import STREAMING_TOOLS, make_progress_callback
 
 
 async def main():
@@ -47,6 +49,9 @@ async def main():
         """处理工具调用"""
         try:
             logger.info(f"调用工具: {name}, 参数: {arguments}")
+            if name in STREAMING_TOOLS:
+                # 客户端请求了进度时，AI分析文本边生成边推送
+                arguments = {**arguments, 'progress': make_progress_callback(server)}
 
             if name == "query_rainfall":
                 return await rainfall_tools.query_rainfall(**arguments)
@@ -94,13 +99,21 @@ async def main():
 
     logger.info(f"注册了 {len(tools_definitions)} 个MCP工具")
 
+    # 监控数据目录，站点文件更新后自动失效对应缓存
+    rainfall_tools.start_watching()
+
     # 运行服务器
-    async with stdio_server() as streams:
-        await server.run(
-            streams[0],  # stdin
-            streams[1],  # stdout
-            server.create_initialization_options()
-        )
+    try:
+        async with stdio_server() as streams:
+            await server.run(
+                streams[0],  # stdin
+                streams[1],  # stdout
+                server.create_initialization_options()
+            )
+    finally:
+        rainfall_tools.stop_watching()
+        # 关闭共享的AI客户端连接池
+        await client_registry.aclose()
 
 
 if __name__ == "__main__":
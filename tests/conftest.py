@@ -0,0 +1,9 @@
+"""
+Shared pytest setup
+"""
+import sys
+from pathlib import Path
+
+# 测试直接导入项目根目录下的模块
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
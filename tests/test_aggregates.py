@@ -0,0 +1,166 @@
+"""
+Tests for mergeable rainfall aggregates and the quantile sketch
+"""
+import math
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_handler.aggregates import QuantileSketch, RainfallAggregate
+from data_handler.reader import RainfallDataReader
+from data_handler.schema import rainfall_series
+
+DATA_DIR = Path(__file__).resolve().parent.parent / 'data'
+
+# 近似分位数允许的最大秩误差（占总数的比例）
+RANK_TOLERANCE = 0.01
+
+
+def rainfall_values(n: int, seed: int = 0) -> np.ndarray:
+    # 降雨量偏态分布，大量零值和少量极值
+    rng = np.random.default_rng(seed)
+    values = rng.gamma(0.5, 10, n)
+    values[rng.random(n) < 0.4] = 0.0
+    return values
+
+
+def rank_error(values: np.ndarray, estimates: np.ndarray, qs: np.ndarray) -> float:
+    """Largest distance between the requested ranks and the ranks of the estimates"""
+    ordered = np.sort(values)
+    below = np.searchsorted(ordered, estimates, side='left') / len(values)
+    upto = np.searchsorted(ordered, estimates, side='right') / len(values)
+    return float(np.max(np.maximum(0, np.maximum(below - qs, qs - upto))))
+
+
+def assert_matches_pandas(aggregate: RainfallAggregate, values: np.ndarray):
+    series = pd.Series(values).dropna()
+    assert aggregate.count == len(series)
+    assert aggregate.total == pytest.approx(series.sum(), rel=1e-12)
+    assert aggregate.mean == pytest.approx(series.mean(), rel=1e-12)
+    assert aggregate.std == pytest.approx(series.std(), rel=1e-9)
+    assert aggregate.minimum == series.min()
+    assert aggregate.maximum == series.max()
+
+
+def test_small_input_quantiles_are_exact():
+    values = np.array([3.0, np.nan, 0.0, 7.5, 1.25, 0.0, 12.0])
+    sketch = QuantileSketch(64).update(values)
+
+    assert sketch.is_exact
+    qs = [0.0, 0.1, 0.25, 0.5, 0.9, 0.95, 1.0]
+    expected = pd.Series(values).dropna().quantile(qs).to_numpy()
+    np.testing.assert_allclose(sketch.quantiles(qs), expected)
+
+
+def test_empty_sketch_and_aggregate():
+    assert math.isnan(QuantileSketch().quantile(0.5))
+
+    aggregate = RainfallAggregate.from_values([np.nan])
+    assert aggregate.count == 0
+    assert aggregate.to_stats() is None
+    assert RainfallAggregate.combine([]).to_stats() is None
+
+
+@pytest.mark.parametrize('n', [1_000, 50_000])
+def test_sketch_rank_error_is_bounded(n):
+    values = rainfall_values(n)
+    sketch = QuantileSketch().update(values)
+    qs = np.linspace(0.01, 0.99, 99)
+
+    assert not sketch.is_exact
+    assert rank_error(values, sketch.quantiles(qs), qs) <= RANK_TOLERANCE
+
+
+def test_sketch_memory_is_bounded():
+    small = QuantileSketch().update(rainfall_values(10_000))
+    large = QuantileSketch().update(rainfall_values(200_000))
+
+    assert large.nbytes < 4 * small.nbytes
+    assert large.nbytes < 200_000 * 8 / 50
+
+
+def test_sketch_is_deterministic():
+    values = rainfall_values(20_000)
+    qs = [0.5, 0.9, 0.99]
+
+    np.testing.assert_array_equal(QuantileSketch().update(values).quantiles(qs),
+                                  QuantileSketch().update(values).quantiles(qs))
+
+
+def test_merged_sketch_rank_error_is_bounded():
+    values = rainfall_values(50_000)
+    parts = np.array_split(values, 9)
+    merged = QuantileSketch()
+    for part in parts:
+        merged = merged.merge(QuantileSketch().update(part))
+    qs = np.linspace(0.01, 0.99, 99)
+
+    assert merged.count == len(values)
+    assert rank_error(values, merged.quantiles(qs), qs) <= RANK_TOLERANCE
+
+
+def test_merge_of_exact_sketches_stays_exact():
+    values = rainfall_values(300)
+    left = QuantileSketch().update(values[:100])
+    right = QuantileSketch().update(values[100:])
+
+    merged = left.merge(right)
+    assert merged.is_exact
+    np.testing.assert_allclose(merged.quantiles([0.1, 0.5, 0.9]), np.quantile(values, [0.1, 0.5, 0.9]))
+
+
+@pytest.mark.parametrize('n', [7, 400, 30_000])
+def test_from_values_matches_pandas(n):
+    values = rainfall_values(n)
+    values[::11] = np.nan
+
+    assert_matches_pandas(RainfallAggregate.from_values(values), values)
+
+
+@pytest.mark.parametrize('splits', [[1], [3, 500, 501], [0, 10, 10, 20_000]])
+def test_combined_parts_match_single_pass(splits):
+    # 按文件拆分后合并（Chan公式）必须与一次性计算全部数据相同
+    values = rainfall_values(30_000) + 1000.0
+    parts = np.split(values, splits)
+    combined = RainfallAggregate.combine(RainfallAggregate.from_values(part) for part in parts)
+
+    assert_matches_pandas(combined, values)
+    single = RainfallAggregate.from_values(values)
+    assert combined.m2 == pytest.approx(single.m2, rel=1e-9)
+
+
+def test_merge_is_associative():
+    parts = [RainfallAggregate.from_values(rainfall_values(n, seed)) for seed, n in enumerate([50, 2_000, 1])]
+    left = parts[0].merge(parts[1]).merge(parts[2])
+    right = parts[0].merge(parts[1].merge(parts[2]))
+
+    for field in ('count', 'total', 'm2', 'minimum', 'maximum'):
+        assert getattr(left, field) == pytest.approx(getattr(right, field), rel=1e-12)
+
+
+def test_merge_with_empty_aggregate():
+    values = rainfall_values(100)
+    aggregate = RainfallAggregate.from_values(values)
+
+    merged = RainfallAggregate().merge(aggregate).merge(RainfallAggregate())
+    assert merged.to_stats() == aggregate.to_stats()
+
+
+def test_combined_summary_matches_pandas():
+    # 综合摘要由各文件的局部聚合合并得到，应与直接拼接所有数据计算的结果一致
+    reader = RainfallDataReader(DATA_DIR)
+    stats = reader.get_combined_data_summary()['rainfall_stats']
+
+    values = pd.concat([
+        rainfall_series(reader.read_data_file(filename)['rainfall'])
+        for filename in reader.get_available_files()
+    ]).dropna().to_numpy()
+
+    assert stats['total'] == pytest.approx(values.sum(), rel=1e-12)
+    assert stats['mean'] == pytest.approx(values.mean(), rel=1e-12)
+    assert stats['std'] == pytest.approx(values.std(ddof=1), rel=1e-9)
+    assert stats['min'] == values.min()
+    assert stats['max'] == values.max()
+    assert rank_error(values, np.array([stats['median']]), np.array([0.5])) <= RANK_TOLERANCE
@@ -0,0 +1,114 @@
+"""
+Tests for date-range lookups through the sorted date index
+"""
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_handler.index import DateIndex
+from data_handler.reader import RainfallDataReader
+
+DATA_DIR = Path(__file__).resolve().parent.parent / 'data'
+
+
+def mask_slice(df: pd.DataFrame, dates: pd.Series, start=None, end=None) -> pd.DataFrame:
+    """Reference result: the boolean-mask filtering the index replaces"""
+    mask = pd.Series(True, index=df.index)
+    if start is not None:
+        mask &= dates >= start
+    if end is not None:
+        mask &= dates <= end
+    return df[mask.to_numpy()]
+
+
+def frame_with_dates(dates) -> pd.DataFrame:
+    dates = pd.Series(pd.to_datetime(dates))
+    return pd.DataFrame({'date': dates, 'rainfall': np.arange(len(dates), dtype='float64')})
+
+
+RANGES = [
+    ('2024-01-02', None),
+    (None, '2024-01-03'),
+    ('2024-01-02', '2024-01-03'),
+    ('2024-01-03', '2024-01-03'),
+    ('2023-01-01', '2023-12-31'),
+    ('2025-01-01', None),
+    ('2024-01-04', '2024-01-02'),
+    ('2024-01-02 12:00', '2024-01-03 06:00'),
+]
+
+
+@pytest.mark.parametrize('start,end', RANGES)
+def test_sorted_dates_use_contiguous_slice(start, end):
+    df = frame_with_dates(['2024-01-01', '2024-01-02', '2024-01-02', '2024-01-03', '2024-01-04'])
+    index = DateIndex(df['date'])
+    start = pd.Timestamp(start) if start else None
+    end = pd.Timestamp(end) if end else None
+
+    assert index.contiguous
+    pd.testing.assert_frame_equal(index.slice(df, start, end), mask_slice(df, df['date'], start, end))
+
+
+@pytest.mark.parametrize('start,end', RANGES)
+def test_unsorted_dates_with_missing_values(start, end):
+    # 无效日期（NaT）不匹配任何日期范围，结果保持原有行顺序
+    df = frame_with_dates(['2024-01-03', None, '2024-01-01', '2024-01-04', '2024-01-02', None, '2024-01-02'])
+    df.index = [10, 11, 12, 15, 16, 17, 20]
+    index = DateIndex(df['date'])
+    start = pd.Timestamp(start) if start else None
+    end = pd.Timestamp(end) if end else None
+
+    assert not index.contiguous
+    pd.testing.assert_frame_equal(index.slice(df, start, end), mask_slice(df, df['date'], start, end))
+
+
+def test_unbounded_slice_keeps_rows_with_valid_dates():
+    df = frame_with_dates(['2024-01-03', None, '2024-01-01'])
+
+    pd.testing.assert_frame_equal(DateIndex(df['date']).slice(df), df.iloc[[0, 2]])
+
+
+def test_all_dates_missing():
+    df = frame_with_dates([None, None])
+    index = DateIndex(df['date'])
+
+    assert index.date_range() is None
+    assert len(index.slice(df)) == 0
+    assert len(index.slice(df, pd.Timestamp('2024-01-01'))) == 0
+
+
+def test_date_range_ignores_missing_dates():
+    df = frame_with_dates(['2024-03-01', None, '2023-12-31'])
+
+    assert DateIndex(df['date']).date_range() == (pd.Timestamp('2023-12-31'), pd.Timestamp('2024-03-01'))
+
+
+def test_random_ranges_match_mask():
+    rng = np.random.default_rng(0)
+    dates = pd.Timestamp('2020-01-01') + pd.to_timedelta(rng.integers(0, 1000, 2_000), unit='D')
+    df = frame_with_dates(dates)
+    df.loc[rng.random(len(df)) < 0.05, 'date'] = pd.NaT
+    index = DateIndex(df['date'])
+
+    for _ in range(50):
+        start, end = sorted(pd.Timestamp('2019-12-01') + pd.to_timedelta(rng.integers(0, 1100, 2), unit='D'))
+        pd.testing.assert_frame_equal(index.slice(df, start, end), mask_slice(df, df['date'], start, end))
+
+
+@pytest.mark.parametrize('filters', [
+    {'start_date': '2024-06-01', 'end_date': '2024-08-31'},
+    {'start_date': '2024-12-01'},
+    {'end_date': '2023-03-15'},
+    {'start_date': '1990-01-01', 'end_date': '1990-12-31'},
+])
+def test_query_data_matches_mask(filters):
+    reader = RainfallDataReader(DATA_DIR)
+    for filename in reader.get_available_files():
+        df = reader.read_data_file(filename)
+        dates = reader.get_parsed_dates(filename, df)
+        start = pd.to_datetime(filters['start_date']) if 'start_date' in filters else None
+        end = pd.to_datetime(filters['end_date']) if 'end_date' in filters else None
+
+        pd.testing.assert_frame_equal(reader.query_data(filename, filters), mask_slice(df, dates, start, end))
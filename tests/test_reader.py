@@ -0,0 +1,69 @@
+"""
+Tests for dataset loading and caching in the data reader
+"""
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from data_handler.reader import RainfallDataReader
+
+DATA_DIR = Path(__file__).resolve().parent.parent / 'data'
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    # 测试会修改数据文件，使用副本
+    target = tmp_path / 'data'
+    shutil.copytree(DATA_DIR, target)
+    return target
+
+
+def test_parallel_loads_under_tight_budget(data_dir):
+    # 预算小于单个数据集时，每次加载都会淘汰其他线程刚缓存的数据集
+    reader = RainfallDataReader(data_dir, max_workers=8, cache_max_bytes=1)
+    filenames = reader.get_available_files()
+    expected = {filename: len(reader.read_data_file(filename, use_cache=False)) for filename in filenames}
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        for _ in range(5):
+            results = list(executor.map(reader.read_data_file, filenames * 4))
+            assert [len(df) for df in results] == [expected[filename] for filename in filenames * 4]
+    assert reader.cache.evictions > 0
+
+
+def append_record(file_path: Path, line: str):
+    """Append one row to a UTF-16 data file"""
+    text = file_path.read_text(encoding='utf-16')
+    if not text.endswith('\n'):
+        text += '\n'
+    file_path.write_text(text + line + '\n', encoding='utf-16')
+
+
+def test_edited_file_is_reloaded_before_watcher_scan(data_dir):
+    reader = RainfallDataReader(data_dir)
+    before = reader.read_data_file('Dabaini')
+    version = reader.data_version('Dabaini')
+
+    append_record(data_dir / 'Dabaini.txt', '2026年1月1日\t大白泥\t12.50')
+
+    # 监控尚未扫描到变化时，读取也不会返回旧数据
+    assert reader.data_version('Dabaini') != version
+    after = reader.read_data_file('Dabaini')
+    assert len(after) == len(before) + 1
+    assert reader.read_data_file('Dabaini') is after
+    assert reader.get_data_summary('Dabaini')['total_records'] == len(after)
+
+    # 监控随后报告的变化与已加载的数据一致，不会再次失效
+    assert reader.apply_changes([('modified', data_dir / 'Dabaini.txt')]) == []
+    assert reader.read_data_file('Dabaini') is after
+
+
+def test_deleted_file_is_not_served_from_cache(data_dir):
+    reader = RainfallDataReader(data_dir)
+    assert reader.read_data_file('Dabaini') is not None
+
+    (data_dir / 'Dabaini.txt').unlink()
+    assert reader.read_data_file('Dabaini') is None
+    assert 'Dabaini' not in reader.cache
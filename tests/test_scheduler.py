@@ -0,0 +1,203 @@
+"""
+Tests for AI request scheduling: coalescing, concurrency limits and retries
+"""
+import asyncio
+import email.utils
+import time
+
+import httpx
+import pytest
+
+from ai_service.scheduler import AIRequestScheduler, is_retryable, parse_retry_after
+from config.models import ModelConfig, ModelProvider
+
+
+def model_config(max_retries: int = 3) -> ModelConfig:
+    return ModelConfig(provider=ModelProvider.DEEPSEEK, model_name='test-model',
+                       base_url='https://api.example.com', api_key='test', max_retries=max_retries)
+
+
+def http_error(status_code: int, retry_after: str = None) -> httpx.HTTPStatusError:
+    request = httpx.Request('POST', 'https://api.example.com/chat/completions')
+    headers = {'Retry-After': retry_after} if retry_after is not None else {}
+    response = httpx.Response(status_code, headers=headers, request=request)
+    return httpx.HTTPStatusError(f"HTTP {status_code}", request=request, response=response)
+
+
+@pytest.fixture
+def scheduler():
+    # 极短的退避时间，使重试测试快速完成
+    return AIRequestScheduler(max_concurrency=2, backoff_base=0.001, backoff_max=0.05)
+
+
+class FlakyRequest:
+    """Request callable that raises the queued errors before succeeding"""
+
+    def __init__(self, *errors: Exception, result: str = 'ok', delay: float = 0.0):
+        self.errors = list(errors)
+        self.result = result
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.errors:
+            raise self.errors.pop(0)
+        return self.result
+
+
+def test_parse_retry_after():
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('') is None
+    assert parse_retry_after('3') == 3.0
+    assert parse_retry_after(' 1.5 ') == 1.5
+    assert parse_retry_after('-4') == 0.0
+    assert parse_retry_after('soon') is None
+
+    future = email.utils.formatdate(time.time() + 120, usegmt=True)
+    assert 100 < parse_retry_after(future) <= 120
+    assert parse_retry_after(email.utils.formatdate(0, usegmt=True)) == 0.0
+
+
+@pytest.mark.parametrize('error,expected', [
+    (http_error(429), True),
+    (http_error(503), True),
+    (http_error(400), False),
+    (http_error(401), False),
+    (httpx.ConnectError('refused'), True),
+    (httpx.ReadTimeout('slow'), True),
+    (ValueError('bad response'), False),
+])
+def test_is_retryable(error, expected):
+    assert is_retryable(error) is expected
+
+
+def test_backoff_delay(scheduler):
+    for attempt in range(8):
+        assert 0 <= scheduler.backoff_delay(attempt, httpx.ConnectError('x')) \
+            <= min(scheduler.backoff_max, scheduler.backoff_base * 2 ** attempt)
+
+    assert 0.01 <= scheduler.backoff_delay(0, http_error(429, '0.01')) <= 0.01 + scheduler.backoff_base
+    # 服务端要求的等待超过上限时放弃重试
+    assert scheduler.backoff_delay(0, http_error(429, '60')) is None
+
+
+def test_overlapping_calls_with_same_key_share_one_request(scheduler):
+    request = FlakyRequest(delay=0.05)
+
+    async def main():
+        return await asyncio.gather(*(scheduler.run(model_config(), request, key='same') for _ in range(5)))
+
+    assert asyncio.run(main()) == ['ok'] * 5
+    assert request.calls == 1
+    assert scheduler.stats()['coalesced'] == 4
+    assert scheduler.stats()['inflight'] == 0
+
+
+def test_calls_are_not_coalesced_without_matching_key(scheduler):
+    request = FlakyRequest(delay=0.01)
+
+    async def main():
+        await asyncio.gather(
+            scheduler.run(model_config(), request, key='a'),
+            scheduler.run(model_config(), request, key='b'),
+            scheduler.run(model_config(), request),
+            scheduler.run(model_config(), request)
+        )
+        # 请求完成后相同的key会发起新的请求
+        await scheduler.run(model_config(), request, key='a')
+
+    asyncio.run(main())
+    assert request.calls == 5
+    assert scheduler.stats()['coalesced'] == 0
+
+
+def test_shared_failure_reaches_every_caller(scheduler):
+    request = FlakyRequest(http_error(400), delay=0.02)
+
+    async def main():
+        return await asyncio.gather(*(scheduler.run(model_config(), request, key='k') for _ in range(3)),
+                                    return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, httpx.HTTPStatusError) for r in results)
+    assert request.calls == 1
+
+
+def test_cancelled_caller_does_not_cancel_shared_request(scheduler):
+    request = FlakyRequest(delay=0.05)
+
+    async def main():
+        first = asyncio.create_task(scheduler.run(model_config(), request, key='k'))
+        second = asyncio.create_task(scheduler.run(model_config(), request, key='k'))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == 'ok'
+    assert request.calls == 1
+
+
+def test_concurrency_is_limited_per_endpoint(scheduler):
+    running = 0
+    peak = 0
+
+    async def request():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return 'ok'
+
+    other = model_config().model_copy(update={'model_name': 'other-model'})
+
+    async def main():
+        await asyncio.gather(*(scheduler.run(model_config(), request) for _ in range(8)))
+        same_peak = peak
+        await asyncio.gather(*(scheduler.run(config, request) for config in [model_config(), other] * 4))
+        return same_peak
+
+    assert asyncio.run(main()) == 2
+    # 不同模型端点各自有独立的并发额度
+    assert peak == 4
+    assert scheduler.stats()['active'] == 0
+
+
+def test_transient_errors_are_retried(scheduler):
+    request = FlakyRequest(http_error(503), httpx.ConnectError('reset'), http_error(429, '0'))
+
+    assert asyncio.run(scheduler.run(model_config(), request)) == 'ok'
+    assert request.calls == 4
+    stats = scheduler.stats()
+    assert (stats['retries'], stats['failures']) == (3, 0)
+
+
+def test_gives_up_after_max_retries(scheduler):
+    request = FlakyRequest(*[http_error(502) for _ in range(10)])
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(scheduler.run(model_config(max_retries=2), request))
+    assert request.calls == 3
+    assert scheduler.stats()['failures'] == 1
+
+
+@pytest.mark.parametrize('error', [http_error(400), http_error(429, '600'), ValueError('bad response')])
+def test_permanent_errors_are_not_retried(scheduler, error):
+    request = FlakyRequest(error)
+
+    with pytest.raises(type(error)):
+        asyncio.run(scheduler.run(model_config(), request))
+    assert request.calls == 1
+
+
+def test_can_retry_stops_retries(scheduler):
+    # 流式请求已输出部分文本后不再重试
+    request = FlakyRequest(http_error(503), http_error(503))
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(scheduler.run(model_config(), request, can_retry=lambda: request.calls < 2))
+    assert request.calls == 2
@@ -0,0 +1,122 @@
+"""
+Tests for the binary columnar snapshot store
+"""
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_handler.reader import RainfallDataReader
+from data_handler.snapshot import SnapshotStore
+
+DATA_DIR = Path(__file__).resolve().parent.parent / 'data'
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / 'rain.txt'
+    path.write_text('source data', encoding='utf-8')
+    return path
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SnapshotStore(tmp_path / 'snapshots')
+
+
+def sample_frame() -> pd.DataFrame:
+    return pd.DataFrame({
+        '站点': ['北京', '上海', None, '北京'],
+        '降雨量': [1.5, np.nan, 0.0, 12.25],
+        '记录数': np.array([1, 2, 3, 4], dtype='int32'),
+        '有效': [True, False, True, True],
+        '日期': pd.to_datetime(['2024-01-01', '2024-01-02', None, '2024-01-04']),
+        '地区': pd.Categorical(['东', '西', '东', None]),
+        '备注': pd.Series(['a', None, 'c', ''], dtype=object)
+    })
+
+
+def test_round_trip_preserves_values_and_dtypes(store, source):
+    df = sample_frame()
+    assert store.save(source, df)
+
+    loaded = store.load(source)
+    pd.testing.assert_frame_equal(loaded, df)
+
+
+def test_round_trip_keeps_non_contiguous_index(store, source):
+    # 清理空行后的索引有间隔，快照必须保留原行标签
+    df = sample_frame().iloc[[0, 1, 3]]
+    assert store.save(source, df)
+
+    loaded = store.load(source)
+    pd.testing.assert_frame_equal(loaded, df, check_index_type=False)
+    assert list(loaded.index) == [0, 1, 3]
+
+
+def test_round_trip_empty_frame(store, source):
+    df = sample_frame().iloc[0:0].reset_index(drop=True)
+    assert store.save(source, df)
+
+    loaded = store.load(source)
+    assert len(loaded) == 0
+    assert list(loaded.columns) == list(df.columns)
+
+
+@pytest.mark.parametrize('data_file', sorted(p.name for p in DATA_DIR.glob('*.txt')))
+def test_round_trip_parsed_data_file(tmp_path, data_file):
+    # 快照加载结果必须与直接解析源文件完全一致
+    reader = RainfallDataReader(DATA_DIR)
+    df = reader._parse_source_file(DATA_DIR / data_file)
+    store = SnapshotStore(tmp_path)
+    assert store.save(DATA_DIR / data_file, df)
+
+    pd.testing.assert_frame_equal(store.load(DATA_DIR / data_file), df, check_index_type=False)
+
+
+def test_loaded_frame_does_not_share_snapshot_file(store, source):
+    assert store.save(source, sample_frame())
+    loaded = store.load(source)
+
+    # 加载的数据不引用快照文件，删除或覆盖快照后仍然可用
+    store.remove(source)
+    assert not store.snapshot_path(source).exists()
+    assert loaded['降雨量'].iloc[3] == 12.25
+
+
+def test_stale_snapshot_is_ignored(store, source):
+    assert store.save(source, sample_frame())
+
+    source.write_text('changed source data', encoding='utf-8')
+    os.utime(source, ns=(0, 0))
+    assert store.read_header(source) is None
+    assert store.load(source) is None
+
+
+def test_corrupt_snapshot_is_ignored(store, source):
+    assert store.save(source, sample_frame())
+    store.snapshot_path(source).write_bytes(b'not a snapshot')
+
+    assert store.load(source) is None
+
+
+def test_truncated_snapshot_is_ignored(store, source):
+    assert store.save(source, sample_frame())
+    snap_path = store.snapshot_path(source)
+    snap_path.write_bytes(snap_path.read_bytes()[:-8])
+
+    assert store.load(source) is None
+
+
+def test_unsupported_column_is_not_saved(store, source):
+    df = pd.DataFrame({'混合': [1, 'a', None]})
+
+    assert not store.save(source, df)
+    assert not store.snapshot_path(source).exists()
+
+
+def test_remove_missing_snapshot(store, source):
+    store.remove(source)
+    assert store.load(source) is None
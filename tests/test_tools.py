@@ -0,0 +1,69 @@
+"""
+Tests for MCP tool results staying consistent with edited data files
+"""
+import asyncio
+import json
+import shutil
+from pathlib import Path
+
+import pytest
+
+from data_handler.reader import RainfallDataReader
+from mcp_server.tools import RainfallTools
+
+DATA_DIR = Path(__file__).resolve().parent.parent / 'data'
+
+
+@pytest.fixture
+def tools(tmp_path):
+    # 测试会修改数据文件，使用副本；不启动目录监控，模拟监控尚未扫描到变化
+    data_dir = tmp_path / 'data'
+    shutil.copytree(DATA_DIR, data_dir)
+    tools = RainfallTools()
+    tools.data_reader = RainfallDataReader(data_dir)
+    yield tools
+    tools.executor.shutdown(wait=True)
+
+
+def append_record(file_path: Path, line: str):
+    text = file_path.read_text(encoding='utf-16')
+    if not text.endswith('\n'):
+        text += '\n'
+    file_path.write_text(text + line + '\n', encoding='utf-16')
+
+
+def call(tool, **arguments) -> dict:
+    result = asyncio.run(tool(**arguments))
+    return json.loads(result[0].text)
+
+
+def test_edited_file_is_reflected_in_cached_tool_results(tools):
+    summary = call(tools.rainfall_summary, filename='Dabaini')['summary']
+    records = summary['total_records']
+    assert call(tools.rainfall_summary, filename='Dabaini')['summary'] == summary
+    assert tools.result_cache.hits == 1
+    events = call(tools.extreme_events, filename='Dabaini', threshold_percentile=99, limit=1)
+    assert '2026-01-01' not in json.dumps(events)
+
+    append_record(tools.data_reader.data_dir / 'Dabaini.txt', '2026年1月1日\t大白泥\t250.00')
+
+    # 编辑后的下一次调用即反映修改，监控随后失效缓存也不会回到旧结果
+    assert call(tools.rainfall_summary, filename='Dabaini')['summary']['total_records'] == records + 1
+    tools.data_reader.invalidate('Dabaini')
+    assert call(tools.rainfall_summary, filename='Dabaini')['summary']['total_records'] == records + 1
+
+    events = call(tools.extreme_events, filename='Dabaini', threshold_percentile=99, limit=1)
+    assert '2026-01-01' in json.dumps(events)
+
+
+def test_edited_file_is_reflected_in_period_comparison(tools):
+    periods = dict(filename='Dabaini', period1_start='2024-01-01', period1_end='2024-06-30',
+                   period2_start='2024-07-01', period2_end='2024-12-31', include_ai_analysis=False)
+    before = call(tools.compare_periods, **periods)
+    assert call(tools.compare_periods, **periods) == before
+
+    append_record(tools.data_reader.data_dir / 'Dabaini.txt', '2024年12月30日\t大白泥\t250.00')
+
+    after = call(tools.compare_periods, **periods)
+    assert after != before
+    assert after == call(tools.compare_periods, **periods)
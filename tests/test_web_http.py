@@ -0,0 +1,213 @@
+"""
+Tests for content negotiation, ETag validation and 304 responses
+"""
+import asyncio
+import gzip
+import json
+import shutil
+from pathlib import Path
+
+import pytest
+
+from web_http import (StaticFiles, check_not_modified, content_etag, etag_matches, finalize_response,
+                      negotiate_encoding, version_etag, MIN_COMPRESS_SIZE)
+
+DATA_DIR = Path(__file__).resolve().parent.parent / 'data'
+
+JSON_TYPE = 'application/json; charset=utf-8'
+BODY = b'{"rainfall":[' + b','.join(b'%d' % i for i in range(2 * MIN_COMPRESS_SIZE)) + b']}'
+
+
+@pytest.mark.parametrize('header,expected', [
+    (None, None),
+    ('', None),
+    ('identity', None),
+    ('gzip', 'gzip'),
+    ('gzip, deflate', 'gzip'),
+    ('gzip;q=0', None),
+    ('*', 'gzip'),
+    ('gzip;q=0.5, *;q=0.1', 'gzip'),
+    ('gzip;q=bad', None),
+])
+def test_negotiate_gzip(header, expected, monkeypatch):
+    # 不依赖是否安装了brotli
+    monkeypatch.setattr('web_http.brotli', None)
+    assert negotiate_encoding(header) == expected
+
+
+def test_version_etag_depends_on_inputs_not_key_order():
+    assert version_etag('/api/query', {'a': 1, 'b': 2}) == version_etag('/api/query', {'b': 2, 'a': 1})
+    assert version_etag('/api/query', {'a': 1}) != version_etag('/api/query', {'a': 2})
+    assert version_etag('/api/query', {'a': 1}, 'v1') != version_etag('/api/query', {'a': 1}, 'v2')
+
+
+@pytest.mark.parametrize('header,encoding,expected', [
+    (None, None, False),
+    ('*', None, True),
+    ('"abc"', None, True),
+    ('W/"abc"', None, True),
+    ('"other", "abc"', None, True),
+    ('"abc-gzip"', 'gzip', True),
+    ('"abc-gzip"', None, False),
+    ('"abc-br"', 'gzip', False),
+    ('"other"', None, False),
+])
+def test_etag_matches(header, encoding, expected):
+    assert etag_matches(header, '"abc"', encoding) is expected
+
+
+def test_finalize_response_compresses_and_tags_variant(monkeypatch):
+    monkeypatch.setattr('web_http.brotli', None)
+    etag = content_etag(BODY)
+    status, headers, body = finalize_response(200, {'Content-Type': JSON_TYPE}, BODY,
+                                              {'accept-encoding': 'gzip'}, etag=etag)
+
+    assert status == 200
+    assert gzip.decompress(body) == BODY
+    assert headers['Content-Encoding'] == 'gzip'
+    assert headers['ETag'] == etag[:-1] + '-gzip"'
+    assert headers['Vary'] == 'Accept-Encoding'
+    assert headers['Content-Length'] == str(len(body))
+
+
+def test_finalize_response_leaves_small_bodies_uncompressed():
+    status, headers, body = finalize_response(200, {'Content-Type': JSON_TYPE}, b'{}',
+                                              {'accept-encoding': 'gzip'}, etag='"x"')
+
+    assert body == b'{}'
+    assert 'Content-Encoding' not in headers
+    assert headers['ETag'] == '"x"'
+
+
+@pytest.mark.parametrize('accept_encoding', [None, 'gzip'])
+def test_revalidation_returns_empty_304(accept_encoding, monkeypatch):
+    monkeypatch.setattr('web_http.brotli', None)
+    request = {'accept-encoding': accept_encoding} if accept_encoding else {}
+    etag = content_etag(BODY)
+    _, first, _ = finalize_response(200, {'Content-Type': JSON_TYPE}, BODY, request, etag=etag)
+
+    revalidate = dict(request, **{'if-none-match': first['ETag']})
+    status, headers, body = finalize_response(200, {'Content-Type': JSON_TYPE}, BODY, revalidate, etag=etag)
+    assert (status, body) == (304, b'')
+    assert headers['ETag'] == first['ETag']
+    assert 'Content-Type' not in headers
+
+    # ETag预先可知时无需生成响应即可回答304
+    status, headers, body = check_not_modified(revalidate, etag, JSON_TYPE)
+    assert (status, body) == (304, b'')
+    assert headers['ETag'] == first['ETag']
+
+
+def test_changed_etag_is_not_revalidated():
+    request = {'if-none-match': content_etag(b'old')}
+
+    assert check_not_modified(request, content_etag(b'new'), JSON_TYPE) is None
+    status, _, body = finalize_response(200, {'Content-Type': JSON_TYPE}, b'new', request, etag=content_etag(b'new'))
+    assert (status, body) == (200, b'new')
+
+
+def test_error_responses_are_not_tagged():
+    status, headers, _ = finalize_response(404, {'Content-Type': JSON_TYPE}, b'{}',
+                                           {'if-none-match': '*'}, etag=None)
+
+    assert status == 404
+    assert 'ETag' not in headers
+
+
+@pytest.fixture
+def static_dir(tmp_path):
+    (tmp_path / 'web_interface.html').write_text('<html>雨量</html>' * 200, encoding='utf-8')
+    (tmp_path / 'secret.txt').write_text('key', encoding='utf-8')
+    (tmp_path / '.hidden').mkdir()
+    (tmp_path / '.hidden' / 'page.html').write_text('hidden', encoding='utf-8')
+    return tmp_path
+
+
+def test_static_files_revalidate_and_reload(static_dir, monkeypatch):
+    monkeypatch.setattr('web_http.brotli', None)
+    static = StaticFiles(static_dir)
+    status, headers, body = static.respond('/', {'accept-encoding': 'gzip'})
+    assert status == 200
+    assert gzip.decompress(body).decode('utf-8') == '<html>雨量</html>' * 200
+    assert headers['Content-Type'] == 'text/html; charset=utf-8'
+
+    status, _, body = static.respond('/index.html', {'accept-encoding': 'gzip', 'if-none-match': headers['ETag']})
+    assert (status, body) == (304, b'')
+
+    # 文件变化后ETag随之变化，旧ETag不再匹配
+    (static_dir / 'web_interface.html').write_text('<html>changed</html>', encoding='utf-8')
+    status, changed, body = static.respond('/', {'if-none-match': headers['ETag']})
+    assert (status, body) == (200, b'<html>changed</html>')
+    assert changed['ETag'] != headers['ETag']
+
+
+@pytest.mark.parametrize('path', ['/secret.txt', '/../web_interface.html', '/.hidden/page.html', '/missing.html'])
+def test_static_files_refuse_other_files(static_dir, path):
+    status, _, _ = StaticFiles(static_dir).respond(path, {})
+    assert status == 404
+
+
+def test_api_get_revalidation_skips_dispatch(monkeypatch):
+    from web_api import RainfallWebAPI
+
+    api = RainfallWebAPI()
+    query = 'filename=Dabaini&filters={"start_date":"2024-06-01"}&limit=5'
+    status, headers, body = asyncio.run(api.handle_http('GET', '/api/query', query, b'', {}))
+    assert status == 200
+    assert body
+
+    async def fail_dispatch(path, data):
+        raise AssertionError('unchanged result should not be recomputed')
+
+    monkeypatch.setattr(api, 'dispatch', fail_dispatch)
+    status, _, body = asyncio.run(api.handle_http('GET', '/api/query', query, b'',
+                                                  {'if-none-match': headers['ETag']}))
+    assert (status, body) == (304, b'')
+
+    # 数据文件版本变化后旧ETag失效
+    monkeypatch.setattr('web_api.rainfall_tools.data_reader.data_version', lambda filename: 'changed')
+    assert api.response_etag('/api/query', api.parse_query(query)) != headers['ETag']
+
+
+def test_api_ai_responses_are_not_cacheable():
+    from web_api import RainfallWebAPI
+
+    api = RainfallWebAPI()
+    assert api.response_etag('/api/analyze', {'filename': 'Dabaini'}) is None
+    assert api.response_etag('/api/summary', {'filename': 'Dabaini', 'include_ai_analysis': True}) is None
+    status, headers, _ = asyncio.run(api.handle_http('GET', '/api/analyze', '', b'', {}))
+    assert status == 405
+
+
+def test_api_etag_follows_edited_data_file(tmp_path, monkeypatch):
+    from data_handler.reader import RainfallDataReader
+    from mcp_server.result_cache import ToolResultCache
+    from web_api import RainfallWebAPI
+
+    data_dir = tmp_path / 'data'
+    shutil.copytree(DATA_DIR, data_dir)
+    reader = RainfallDataReader(data_dir)
+    monkeypatch.setattr('web_api.rainfall_tools.data_reader', reader)
+    monkeypatch.setattr('web_api.rainfall_tools.result_cache', ToolResultCache())
+    api = RainfallWebAPI()
+
+    def get(headers=None):
+        status, response_headers, body = asyncio.run(api.handle_http('GET', '/api/summary', 'filename=Dabaini', b'',
+                                                                     headers or {}))
+        records = json.loads(body)['summary']['total_records'] if body else None
+        return status, response_headers.get('ETag'), records
+
+    status, old_etag, records = get()
+    assert status == 200
+
+    # 修改文件后监控尚未扫描：新ETag必须对应新内容
+    file_path = data_dir / 'Dabaini.txt'
+    file_path.write_text(file_path.read_text(encoding='utf-16') + '2026年1月1日\t大白泥\t12.50\n', encoding='utf-16')
+    status, new_etag, new_records = get()
+    assert (status, new_records) == (200, records + 1)
+    assert new_etag != old_etag
+
+    reader.apply_changes([('modified', file_path)])
+    assert get({'if-none-match': old_etag})[::2] == (200, records + 1)
+    assert get({'if-none-match': new_etag})[:2] == (304, new_etag)
+    assert get() == (200, new_etag, records + 1)
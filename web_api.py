@@ -0,0 +1,453 @@
+#!/usr/bin/env python3
+"""
+HTTP API endpoints for the rainfall web interface
+
+Transport-independent: both the threaded and the asyncio web servers
+pass each /api/* request to ``RainfallWebAPI.handle_http`` and send back
+the returned status code, headers and body.
+"""
+
+import asyncio
+import json
+import logging
+import sys
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Mapping, Optional, Tuple
+from urllib.parse import parse_qs
+
+from config.settings import settings
+from web_http import Response, check_not_modified, encode_json, finalize_response, sse_event, version_etag
+from mcp_server.tools import rainfall_tools
+from ai_service.analyzer import get_analyzer
+from ai_service.clients import client_registry
+from ai_service.scheduler import request_scheduler
+from ai_service.response_cache import response_cache
+
+
+project_root = Path(__file__).parent
+
+# 结果只取决于请求参数和数据文件版本的接口，支持GET、ETag和304
+CACHEABLE_ROUTES = {'/api/query', '/api/summary', '/api/extreme'}
+
+# 接口响应格式变化时递增，使旧的ETag失效
+API_ETAG_VERSION = 2
+
+JSON_CONTENT_TYPE = 'application/json; charset=utf-8'
+
+# 查询字符串中按JSON解码的参数（对象、数字、布尔值），其余参数（文件名、日期、地区等）保持字符串
+TYPED_QUERY_PARAMS = {'filters', 'limit', 'threshold_percentile', 'include_ai_analysis', 'use_cache', 'pretty'}
+
+
+class RainfallWebAPI:
+    """Async handlers for the /api/* endpoints"""
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self.routes = {
+            '/api/status': self.handle_status_check,
+            '/api/query': self.handle_query_rainfall,
+            '/api/analyze': self.handle_analyze_rainfall,
+            '/api/summary': self.handle_rainfall_summary,
+            '/api/extreme': self.handle_extreme_events,
+            '/api/test-deepseek': self.handle_test_deepseek,
+            '/api/analyze-all': self.handle_analyze_all_data
+        }
+        # 以Server-Sent Events流式返回的接口，GET（EventSource）和POST均可
+        self.stream_routes = {
+            '/api/analyze/stream': self.stream_analyze_rainfall
+        }
+        self._tool_count = None
+
+    def open_stream(self, method: str, path: str, query: str, body: bytes) -> Optional[AsyncIterator[bytes]]:
+        """Get the event stream for a streaming endpoint, None for other paths"""
+        handler = self.stream_routes.get(path)
+        if handler is None or method not in ('GET', 'POST'):
+            return None
+        data = self.parse_query(query) if method == 'GET' else self.parse_body(body)
+        return handler(data)
+
+    async def handle_http(self, method: str, path: str, query: str, body: bytes,
+                          request_headers: Mapping[str, str]) -> Response:
+        """Handle an HTTP request to /api/*, returning (status, headers, body)
+
+        Deterministic endpoints can also be fetched with GET and query
+        parameters; their ETag is derived from the arguments and the data
+        file version, so unchanged results are answered with 304 without
+        recomputing anything.
+        """
+        params = self.parse_query(query)
+        pretty = bool(params.pop('pretty', False))
+
+        if method in ('GET', 'HEAD'):
+            if path not in CACHEABLE_ROUTES:
+                return 405, {'Allow': 'POST, OPTIONS', 'Content-Type': JSON_CONTENT_TYPE}, \
+                    encode_json({'error': 'Use POST for this endpoint'})
+            data = params
+        else:
+            data = self.parse_body(body)
+
+        # ETag取自处理请求前的文件版本；read_data_file会重新加载已变化的文件，
+        # 因此响应内容不会比ETag对应的版本旧
+        etag = self.response_etag(path, data, pretty)
+        if etag:
+            not_modified = check_not_modified(request_headers, etag, JSON_CONTENT_TYPE)
+            if not_modified:
+                return not_modified
+
+        status_code, payload = await self.dispatch(path, data)
+        headers = {'Content-Type': JSON_CONTENT_TYPE}
+        if not etag:
+            # AI分析等结果不确定的响应不允许缓存
+            headers['Cache-Control'] = 'no-store'
+        return finalize_response(
+            status_code, headers, encode_json(payload, pretty), request_headers,
+            etag=etag if status_code == 200 else None
+        )
+
+    def response_etag(self, path: str, data: Dict[str, Any], pretty: bool = False) -> Optional[str]:
+        """ETag for a deterministic API request, None when the result may vary"""
+        if path not in CACHEABLE_ROUTES:
+            return None
+        if path == '/api/summary' and data.get('include_ai_analysis'):
+            return None
+
+        version = rainfall_tools.data_reader.data_version(str(data.get('filename', 'Dabaini')))
+        if version is None:
+            return None
+        return version_etag(API_ETAG_VERSION, path, data, pretty, version)
+
+    async def dispatch(self, path: str, data: Dict[str, Any]) -> Tuple[int, Any]:
+        """Route an API request, returning (status code, JSON payload)"""
+        handler = self.routes.get(path)
+        if handler is None:
+            return 404, {'error': 'API endpoint not found'}
+
+        try:
+            return await handler(data)
+        except Exception as e:
+            self.logger.error(f"Error handling POST request: {e}")
+            return 500, {'error': str(e)}
+
+    @staticmethod
+    def parse_body(body: bytes) -> Dict[str, Any]:
+        """Decode a JSON request body, empty or invalid bodies become {}"""
+        try:
+            if body:
+                return json.loads(body.decode('utf-8'))
+            return {}
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Error parsing POST data: {e}")
+            return {}
+
+    @staticmethod
+    def parse_query(query: str) -> Dict[str, Any]:
+        """Decode query parameters, JSON values of typed parameters are parsed"""
+        params = {}
+        for key, values in parse_qs(query or '').items():
+            value = values[-1]
+            params[key] = value
+            if key in TYPED_QUERY_PARAMS:
+                try:
+                    params[key] = json.loads(value)
+                except ValueError:
+                    pass
+        return params
+
+    async def handle_status_check(self, data: Dict[str, Any]) -> Tuple[int, Any]:
+        """处理状态检查"""
+        if rainfall_tools.watcher.running:
+            # 数据状态由后台监控维护，直接读取内存中的结果
+            return 200, self._collect_status()
+        # 未启动监控时需要扫描数据目录，属于阻塞I/O
+        loop = asyncio.get_running_loop()
+        return 200, await loop.run_in_executor(None, self._collect_status)
+
+    def _tools_count(self) -> int:
+        # 工具定义是静态的，只统计一次
+        if self._tool_count is None:
+            self._tool_count = len(rainfall_tools.get_tool_definitions())
+        return self._tool_count
+
+    def _collect_status(self) -> Dict[str, Any]:
+        try:
+            # 1. 数据文件状态（每个文件的准确记录数、大小和修改时间）
+            data_status = rainfall_tools.data_status.summary()
+
+            # 2. 检查API配置
+            try:
+                api_configured = bool(settings.deepseek_config.get('api_key'))
+            except:
+                api_configured = False
+
+            # 3. 检查MCP工具状态
+            try:
+                tools_count = self._tools_count()
+            except:
+                tools_count = 0
+            mcp_tools_available = tools_count > 0
+
+            # 4. 组装状态信息
+            return {
+                'server': {
+                    'running': True,
+                    'version': '1.0.0',
+                    'port': settings.web_config['port'],
+                    'name': 'rainfall-query-server'
+                },
+                'ai': {
+                    'configured': api_configured,
+                    'provider': 'DeepSeek',
+                    'model': 'deepseek-chat',
+                    'api_key_present': api_configured,
+                    'base_url': 'https://api.deepseek.com'
+                },
+                'data': data_status,
+                # 数据集缓存的命中/未命中/淘汰计数，用于调整内存预算
+                'cache': rainfall_tools.data_reader.cache_stats(),
+                'result_cache': rainfall_tools.result_cache.stats(),
+                'ai_response_cache': response_cache.stats(),
+                'ai_clients': client_registry.stats(),
+                'ai_scheduler': request_scheduler.stats(),
+                'mcp': {
+                    'tools_available': mcp_tools_available,
+                    'tools_count': tools_count,
+                    'status': 'ready' if mcp_tools_available else 'unavailable'
+                },
+                'system': {
+                    'platform': 'Windows',
+                    'python_version': f"{sys.version_info.major}.{sys.version_info.minor}",
+                    'mcp_version': '0.5.x'
+                }
+            }
+
+        except Exception as e:
+            # 如果出错，返回基本状态
+            return {
+                'server': {
+                    'running': True,
+                    'version': '1.0.0',
+                    'port': settings.web_config['port'],
+                    'name': 'rainfall-query-server'
+                },
+                'ai': {
+                    'configured': False,
+                    'provider': 'DeepSeek',
+                    'model': 'deepseek-chat',
+                    'api_key_present': False,
+                    'base_url': 'https://api.deepseek.com'
+                },
+                'data': {
+                    'files_found': 0,
+                    'files': [],
+                    'total_records': 0
+                },
+                'system': {
+                    'platform': 'Windows',
+                    'python_version': f"{sys.version_info.major}.{sys.version_info.minor}",
+                    'mcp_version': '0.5.x',
+                    'error': str(e)
+                }
+            }
+
+    async def handle_query_rainfall(self, data: Dict[str, Any]) -> Tuple[int, Any]:
+        """处理降雨数据查询"""
+        try:
+            filename = data.get('filename', 'Dabaini')
+            limit = data.get('limit', 10)
+            filters = data.get('filters', {})
+
+            result = await rainfall_tools.query_rainfall(filename, filters, limit)
+            if result and len(result) > 0 and hasattr(result[0], 'text'):
+                try:
+                    return 200, json.loads(result[0].text)
+                except json.JSONDecodeError as e:
+                    self.logger.error(f"JSON decode error: {e}, text: {result[0].text[:500]}")
+                    return 500, {'error': '数据解析失败', 'raw_text': result[0].text[:500]}
+            else:
+                self.logger.error(f"Invalid result format: {result}")
+                return 500, {'error': '查询返回格式错误'}
+
+        except Exception as e:
+            self.logger.error(f"Error in query rainfall: {e}")
+            return 500, {'error': str(e), 'details': f'查询失败: {str(e)}'}
+
+    async def handle_analyze_rainfall(self, data: Dict[str, Any]) -> Tuple[int, Any]:
+        """处理AI分析请求"""
+        try:
+            filename = data.get('filename', 'Dabaini')
+            question = data.get('question', '')
+
+            if not question:
+                return 400, {'error': 'Question is required', 'message': '请输入分析问题'}
+
+            use_cache = data.get('use_cache', True)
+
+            result = await rainfall_tools.analyze_rainfall(filename, question, use_cache=use_cache)
+            if result and len(result) > 0 and hasattr(result[0], 'text'):
+                try:
+                    return 200, json.loads(result[0].text)
+                except json.JSONDecodeError as e:
+                    self.logger.error(f"JSON decode error in analysis: {e}")
+                    return 500, {'error': '分析结果解析失败', 'raw_text': result[0].text[:500]}
+            else:
+                return 500, {'error': 'AI分析返回格式错误'}
+
+        except Exception as e:
+            self.logger.error(f"Error in analyze rainfall: {e}")
+            return 500, {'error': str(e), 'details': f'AI分析失败: {str(e)}'}
+
+    async def stream_analyze_rainfall(self, data: Dict[str, Any]) -> AsyncIterator[bytes]:
+        """Stream an AI analysis as Server-Sent Events
+
+        Emits ``delta`` events ({"text": ...}) while the answer is being
+        generated, then one ``done`` event with the same payload as
+        /api/analyze, or an ``error`` event.
+        """
+        filename = data.get('filename', 'Dabaini')
+        question = data.get('question', '')
+        if not question:
+            yield sse_event('error', {'error': 'Question is required', 'message': '请输入分析问题'})
+            return
+
+        deltas = asyncio.Queue()
+
+        async def on_delta(text: str):
+            await deltas.put(text)
+
+        task = asyncio.ensure_future(rainfall_tools.analyze_rainfall(
+            filename, question, use_cache=data.get('use_cache', True), progress=on_delta
+        ))
+        # 分析结束（包括失败）时放入结束标记
+        task.add_done_callback(lambda _: deltas.put_nowait(None))
+
+        try:
+            while True:
+                text = await deltas.get()
+                if text is None:
+                    break
+                yield sse_event('delta', {'text': text})
+
+            try:
+                text = task.result()[0].text
+            except Exception as e:
+                self.logger.error(f"Error in streamed analysis: {e}")
+                yield sse_event('error', {'error': str(e), 'details': f'AI分析失败: {str(e)}'})
+                return
+            try:
+                result = json.loads(text)
+            except ValueError:
+                # 如文件不存在等情况，工具返回的是纯文本说明
+                yield sse_event('error', {'error': text})
+                return
+            yield sse_event('done' if result.get('success') else 'error', result)
+        finally:
+            # 客户端提前断开时取消分析
+            if not task.done():
+                task.cancel()
+
+    async def handle_rainfall_summary(self, data: Dict[str, Any]) -> Tuple[int, Any]:
+        """处理统计摘要请求"""
+        try:
+            filename = data.get('filename', 'Dabaini')
+            include_ai = data.get('include_ai_analysis', False)
+            use_cache = data.get('use_cache', True)
+
+            result = await rainfall_tools.rainfall_summary(filename, include_ai, use_cache)
+            return 200, json.loads(result[0].text)
+
+        except Exception as e:
+            self.logger.error(f"Error in rainfall summary: {e}")
+            return 500, {'error': str(e), 'details': f'摘要生成失败: {str(e)}'}
+
+    async def handle_extreme_events(self, data: Dict[str, Any]) -> Tuple[int, Any]:
+        """处理极端事件检测"""
+        try:
+            filename = data.get('filename', 'Dabaini')
+            threshold = data.get('threshold_percentile', 95)
+            limit = data.get('limit', 10)
+
+            result = await rainfall_tools.extreme_events(filename, threshold, limit)
+            return 200, json.loads(result[0].text)
+
+        except Exception as e:
+            self.logger.error(f"Error in extreme events: {e}")
+            return 500, {'error': str(e), 'details': f'极端事件检测失败: {str(e)}'}
+
+    async def handle_test_deepseek(self, data: Dict[str, Any]) -> Tuple[int, Any]:
+        """处理DeepSeek API测试"""
+        try:
+            test_result = await self._test_deepseek_api()
+
+            if test_result.get('success'):
+                response = {
+                    'status': 'success',
+                    'message': 'DeepSeek API 连接正常',
+                    'model': 'deepseek-chat',
+                    'test_response': str(test_result.get('analysis', '测试成功'))[:200] + '...'
+                }
+            else:
+                response = {
+                    'status': 'error',
+                    'message': 'DeepSeek API 连接失败',
+                    'error': test_result.get('error', 'Unknown error')
+                }
+
+            return 200, response
+
+        except Exception as e:
+            self.logger.error(f"Error testing DeepSeek: {e}")
+            return 500, {
+                'status': 'error',
+                'message': 'API测试失败',
+                'error': str(e),
+                'details': f'DeepSeek测试失败: {str(e)}'
+            }
+
+    async def _test_deepseek_api(self):
+        """发送一次简短的DeepSeek测试请求"""
+        analyzer = None
+        try:
+            # 连接测试必须真正请求API，不使用响应缓存
+            analyzer = get_analyzer(use_cache=False)
+
+            # 测试数据
+            test_data = {
+                "filename": "test",
+                "basic_statistics": {
+                    "count": 100,
+                    "mean": 5.5,
+                    "max": 25.0
+                }
+            }
+
+            # 发送测试请求
+            return await analyzer.analyze_data(test_data, "这是一个API连接测试，请简短回复确认连接正常")
+
+        except Exception as e:
+            self.logger.error(f"DeepSeek test error: {e}")
+            return {"success": False, "error": str(e)}
+        finally:
+            if analyzer:
+                try:
+                    await analyzer.close()
+                except:
+                    pass
+
+    async def handle_analyze_all_data(self, data: Dict[str, Any]) -> Tuple[int, Any]:
+        """处理全数据综合分析请求"""
+        try:
+            analysis_type = data.get('analysis_type', 'general')
+            question = data.get('question', None)
+            use_cache = data.get('use_cache', True)
+            mode = data.get('mode', 'combined')
+
+            result = await rainfall_tools.analyze_all_rainfall_data(question, analysis_type, use_cache=use_cache, mode=mode)
+            return 200, json.loads(result[0].text)
+
+        except Exception as e:
+            self.logger.error(f"Error in analyze all data: {e}")
+            return 500, {'error': str(e), 'details': f'全数据分析失败: {str(e)}'}
+
+
+# 全局API实例，两种Web服务器模式共享
+web_api = RainfallWebAPI()
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+HTTP response helpers shared by the web servers
+
+Compact JSON encoding, gzip/brotli content negotiation, strong ETags with
+If-None-Match handling, Server-Sent Events framing and a static file cache.
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import threading
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# 允许作为静态资源返回的文件类型，避免暴露密钥等项目文件
+STATIC_SUFFIXES = {'.html', '.htm', '.css', '.js', '.png', '.jpg', '.jpeg', '.gif', '.svg', '.ico'}
+
+# 小于此大小的响应压缩收益很小，直接原样发送
+MIN_COMPRESS_SIZE = 1024
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
+
+Response = Tuple[int, Dict[str, str], bytes]
+
+# 流式（Server-Sent Events）响应头；不设置Content-Length，发送完毕后关闭连接
+SSE_HEADERS = {
+    'Content-Type': 'text/event-stream; charset=utf-8',
+    'Cache-Control': 'no-store',
+    'X-Accel-Buffering': 'no'
+}
+
+
+def encode_json(payload: Any, pretty: bool = False) -> bytes:
+    """Serialize a payload, compact unless pretty output is requested"""
+    if pretty:
+        return json.dumps(payload, ensure_ascii=False, indent=2).encode('utf-8')
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def sse_event(event: str, payload: Any) -> bytes:
+    """Frame one Server-Sent Event with a compact JSON data line"""
+    return f"event: {event}\ndata: ".encode('utf-8') + encode_json(payload) + b"\n\n"
+
+
+def content_etag(body: bytes) -> str:
+    """Strong ETag derived from the response bytes"""
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def version_etag(*parts: Any) -> str:
+    """Strong ETag derived from the inputs that fully determine a response"""
+    key = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str).encode('utf-8')
+    return content_etag(key)
+
+
+def _variant_etag(etag: str, encoding: Optional[str]) -> str:
+    # 不同压缩编码的字节不同，强ETag需要区分
+    return f'{etag[:-1]}-{encoding}"' if encoding else etag
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick br or gzip from an Accept-Encoding header, None for identity"""
+    if not accept_encoding:
+        return None
+
+    accepted = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    wildcard = accepted.get('*', 0.0)
+    candidates = (['br'] if brotli is not None else []) + ['gzip']
+    for encoding in candidates:
+        if accepted.get(encoding, wildcard) > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str, encoding: Optional[str] = None) -> bool:
+    """Check an If-None-Match header against an ETag or its encoded variant"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+
+    candidates = {etag, _variant_etag(etag, encoding)}
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        # If-None-Match使用弱比较
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag in candidates:
+            return True
+    return False
+
+
+def _is_compressible(content_type: str) -> bool:
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def check_not_modified(request_headers: Mapping[str, str], etag: str,
+                       content_type: str, cache_control: str = 'no-cache') -> Optional[Response]:
+    """Answer 304 before building a response whose ETag is known in advance"""
+    if_none_match = request_headers.get('if-none-match')
+    encoding = negotiate_encoding(request_headers.get('accept-encoding')) if _is_compressible(content_type) else None
+    if not etag_matches(if_none_match, etag, encoding):
+        return None
+
+    # 回传客户端持有的那个版本（压缩或未压缩）的ETag
+    variant = _variant_etag(etag, encoding)
+    matched = variant if encoding and variant in if_none_match else etag
+    headers = {'ETag': matched, 'Cache-Control': cache_control}
+    if _is_compressible(content_type):
+        headers['Vary'] = 'Accept-Encoding'
+    return 304, headers, b''
+
+
+def finalize_response(status_code: int, headers: Dict[str, str], body: bytes,
+                      request_headers: Mapping[str, str], etag: Optional[str] = None,
+                      cache_control: str = 'no-cache',
+                      compressed_cache: Optional[Dict] = None) -> Response:
+    """Apply ETag validation and content encoding to a response
+
+    ``etag`` identifies the uncompressed body; the compressed variant gets
+    its own tag. A matching If-None-Match turns a 200 into an empty 304.
+    ``compressed_cache`` lets callers reuse compressed bytes per ETag.
+    """
+    headers = dict(headers)
+    content_type = headers.get('Content-Type', '')
+    compressible = _is_compressible(content_type)
+    encoding = negotiate_encoding(request_headers.get('accept-encoding')) if compressible else None
+    if len(body) < MIN_COMPRESS_SIZE:
+        encoding = None
+
+    if compressible:
+        headers['Vary'] = 'Accept-Encoding'
+
+    if status_code == 200 and etag:
+        headers['ETag'] = _variant_etag(etag, encoding)
+        headers['Cache-Control'] = cache_control
+        if etag_matches(request_headers.get('if-none-match'), etag, encoding):
+            headers.pop('Content-Type', None)
+            return 304, headers, b''
+
+    if encoding:
+        key = (etag, encoding)
+        cached = compressed_cache.get(key) if compressed_cache is not None and etag else None
+        if cached is None:
+            cached = compress(body, encoding)
+            if compressed_cache is not None and etag:
+                compressed_cache[key] = cached
+        body = cached
+        headers['Content-Encoding'] = encoding
+
+    headers['Content-Length'] = str(len(body))
+    return status_code, headers, body
+
+
+class StaticFiles:
+    """Serve web assets from a directory with strong ETags
+
+    File contents, their ETags and compressed variants are cached and
+    reloaded when the file's modification time or size changes.
+    """
+
+    def __init__(self, static_dir: Path):
+        self.static_dir = Path(static_dir).resolve()
+        # 路径 -> (mtime_ns, size, 内容, ETag)
+        self._files: Dict[Path, Tuple[int, int, bytes, str]] = {}
+        self._compressed: Dict[Tuple[str, str], bytes] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, path: str) -> Optional[Path]:
+        """Map a URL path to a servable file, None for anything outside the asset set"""
+        if path in ('/', '/index.html'):
+            path = '/web_interface.html'
+
+        file_path = (self.static_dir / path.lstrip('/')).resolve()
+        if not file_path.is_relative_to(self.static_dir):
+            return None
+        if file_path.suffix.lower() not in STATIC_SUFFIXES:
+            return None
+        if any(part.startswith('.') for part in file_path.relative_to(self.static_dir).parts):
+            return None
+        return file_path
+
+    def load(self, file_path: Path) -> Optional[Tuple[bytes, str]]:
+        """Get file content and ETag, reading the file only when it changed"""
+        try:
+            stat = file_path.stat()
+        except OSError:
+            return None
+        if not file_path.is_file():
+            return None
+
+        with self._lock:
+            cached = self._files.get(file_path)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2], cached[3]
+
+        content = file_path.read_bytes()
+        etag = content_etag(content)
+        with self._lock:
+            if cached:
+                self._compressed.pop((cached[3], 'gzip'), None)
+                self._compressed.pop((cached[3], 'br'), None)
+            self._files[file_path] = (stat.st_mtime_ns, stat.st_size, content, etag)
+        return content, etag
+
+    def respond(self, path: str, request_headers: Mapping[str, str]) -> Response:
+        """Build the response for a GET of a static file (blocking file I/O)"""
+        file_path = self.resolve(path)
+        loaded = self.load(file_path) if file_path else None
+        if loaded is None:
+            return 404, {'Content-Type': 'text/plain; charset=utf-8'}, b'File not found'
+
+        content, etag = loaded
+        content_type = mimetypes.guess_type(file_path.name)[0] or 'application/octet-stream'
+        if content_type.startswith('text/'):
+            content_type += '; charset=utf-8'
+
+        return finalize_response(
+            200, {'Content-Type': content_type}, content, request_headers,
+            etag=etag, compressed_cache=self._compressed
+        )